@@ -1,17 +1,26 @@
 import os
+import time
 import logging
 import json
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, session, send_file, send_from_directory, redirect, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-from services.ai_service import analyze_image_and_generate_story, regenerate_story
-from services.image_service import process_image, validate_image
-from services.tts_service import generate_speech
-from utils.file_utils import save_temp_file, remove_temp_file, save_base64_image, get_base64_image
-import base64
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from services.ai_service import parse_fused_option
+from services.image_service import validate_image
+from services.encoding_service import get_encoding_policy, image_mime_type, TILE_SIZE
+from services.job_service import get_job_queue, JobQueueFull
+from services.metrics_service import observe_request, observe_payload, render_metrics, begin_request_stages
+from services.tts_service import get_speech_synthesis, AUDIO_DIR
+from services.story_service import (create_story, store_upload, stream_story, load_regeneration_source,
+                                    regenerate_from_image, start_narration, narrate, StoryPipelineError,
+                                    UPLOAD_STAGES)
+from services.storage_service import get_image_store, IMAGE_ID_PATTERN
+from utils.logging_utils import configure_logging, log_request
+from utils.http_utils import compress_response
+import io
+
+# Configure logging (LOG_LEVEL, LOG_FORMAT and REQUEST_LOG environment variables)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Check if Google API Key is set
@@ -29,23 +38,77 @@ db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 
+# Connection pool configuration (SQLite does not use a sized pool)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 300))  # Seconds before a connection is replaced
+# Test every connection on checkout; costs a round trip per checkout, which DB_POOL_RECYCLE mostly makes unnecessary
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
 # Configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
 }
+if not (app.config["SQLALCHEMY_DATABASE_URI"] or "").startswith("sqlite"):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    })
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# Largest request body accepted; bigger uploads are rejected with 413 before they are read
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 100 * 1024 * 1024))
+
 # Initialize the app with the database extension
 db.init_app(app)
 
+# Endpoints whose request bodies are image uploads
+UPLOAD_ENDPOINTS = {'upload', 'upload_async', 'upload_stream', 'upload_batch'}
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_stages = begin_request_stages()
+
+@app.after_request
+def record_request_metrics(response):
+    # For streamed responses this measures the time until the stream starts
+    start = g.pop('request_start', None)
+    if start is not None:
+        duration = time.perf_counter() - start
+        observe_request(request.endpoint, request.method, response.status_code, duration)
+        log_request(request.method, request.path, request.endpoint, response.status_code, duration,
+                    g.pop('request_stages', None), response.content_length)
+    if request.endpoint in UPLOAD_ENDPOINTS and request.content_length:
+        observe_payload('upload', request.content_length)
+    return response
+
+@app.after_request
+def compress(response):
+    # Registered after the metrics hook, so it runs first and the logged size is the compressed one
+    return compress_response(response, request.accept_encodings)
+
+@app.errorhandler(413)
+def request_too_large(error):
+    """Reject request bodies larger than MAX_CONTENT_LENGTH."""
+    return jsonify({'success': False, 'error': 'The upload is too large.'}), 413
+
+@app.route('/metrics')
+def metrics():
+    """Expose request, stage, payload, cache and error metrics in Prometheus text format."""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     """Render the main page of the application."""
     # Get the preferred language from the session or default to English
     language = session.get('language', 'en')
-    return render_template('index.html', language=language)
+    return render_template('index.html', language=language, image_policy=get_encoding_policy(),
+                           tile_size=TILE_SIZE)
 
 @app.route('/set-language/<lang>')
 def set_language(lang):
@@ -57,29 +120,113 @@ def set_language(lang):
 
 @app.route('/stories')
 def list_stories():
-    """Display a list of all stored stories."""
-    from services.db_service import get_all_stories
-    stories = get_all_stories()
+    """Display a page of stored stories, newest first."""
+    from services.db_service import get_stories_page
+    from services.page_cache_service import make_etag, utc
+    # ?image=<id> lists the versions of one image's story
+    image_id = request.args.get('image')
+    try:
+        stories, next_cursor = get_stories_page(request.args.get('cursor'), image_id=image_id)
+    except ValueError:
+        return render_template('error.html', error="Invalid page"), 400
     # Get the preferred language from the session or default to English
     language = session.get('language', 'en')
-    return render_template('stories.html', stories=stories, language=language)
+
+    # Listed columns never change after a story is saved, so the page changes only when its stories do
+    etag = make_etag('stories', [(story.id, story.created_at.isoformat() if story.created_at else None)
+                                 for story in stories], next_cursor, language, image_id)
+    response = Response(mimetype='text/html')
+    if not request.if_none_match.contains_weak(etag):
+        # Only render when the client's copy is out of date
+        response.set_data(render_template('stories.html', stories=stories, next_cursor=next_cursor,
+                                          language=language, image_id=image_id))
+    response.set_etag(etag)
+    response.last_modified = max((utc(story.created_at) for story in stories if story.created_at), default=None)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/api/stories')
+def api_list_stories():
+    """Return a page of stories as JSON, for infinite scrolling."""
+    from services.db_service import get_stories_page, STORIES_PAGE_SIZE
+    try:
+        stories, next_cursor = get_stories_page(request.args.get('cursor'),
+                                                request.args.get('limit', STORIES_PAGE_SIZE, type=int),
+                                                image_id=request.args.get('image'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'stories': [{
+            'id': story.id,
+            'title': story.title,
+            'excerpt': story.excerpt,
+            'created_at': story.created_at.isoformat() if story.created_at else None
+        } for story in stories],
+        'nextCursor': next_cursor
+    })
+
+@app.route('/search')
+def search():
+    """Display stories matching a search query, best matches first."""
+    from services.search_service import search_stories
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    stories, has_more = search_stories(query, page) if query else ([], False)
+    # Get the preferred language from the session or default to English
+    language = session.get('language', 'en')
+    return render_template('stories.html', stories=stories, next_cursor=None, query=query,
+                           next_page=page + 1 if has_more else None, language=language)
+
+@app.route('/api/search')
+def api_search():
+    """Return a page of stories matching a search query as JSON."""
+    from services.search_service import search_stories, SEARCH_PAGE_SIZE
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'No search query provided'}), 400
+
+    page = max(1, request.args.get('page', 1, type=int))
+    stories, has_more = search_stories(query, page, request.args.get('limit', SEARCH_PAGE_SIZE, type=int))
+    return jsonify({
+        'success': True,
+        'query': query,
+        'stories': [{
+            'id': story.id,
+            'title': story.title,
+            'excerpt': story.excerpt,
+            'created_at': story.created_at.isoformat() if story.created_at else None
+        } for story in stories],
+        'nextPage': page + 1 if has_more else None
+    })
 
 @app.route('/stories/<int:story_id>')
 def view_story(story_id):
-    """Display a single story."""
+    """Display a single story, from the rendered page cache when possible."""
     from services.db_service import get_story_by_id
-    story = get_story_by_id(story_id)
-    if not story:
-        return render_template('error.html', error="Story not found"), 404
+    from services.page_cache_service import get_story_page, cache_story_page
     # Get the preferred language from the session or default to English
     language = session.get('language', 'en')
-    return render_template('view_story.html', story=story, language=language)
+    page = get_story_page(story_id, language)
+    if page is None:
+        story = get_story_by_id(story_id)
+        if not story:
+            return render_template('error.html', error="Story not found"), 404
+        page = cache_story_page(story, language, render_template('view_story.html', story=story, language=language))
+
+    response = Response(page.html, mimetype='text/html')
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    # Revalidate every time: the page changes when narration is added
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/upload', methods=['POST'])
 def upload():
     """Handle image upload and story generation."""
     try:
-        logger.info("Received upload request")
+        logger.debug("Received upload request")
 
         # Check if an image file was sent
         if 'image' not in request.files:
@@ -87,86 +234,230 @@ def upload():
             return jsonify({'success': False, 'error': 'No image uploaded'}), 400
 
         image_file = request.files['image']
-        logger.info(f"Received image: {image_file.filename}, Content type: {image_file.content_type}")
+        logger.debug("Received image: %s, Content type: %s", image_file.filename, image_file.content_type)
 
         # Validate the image
         if not validate_image(image_file):
-            logger.warning(f"Invalid image format: {image_file.filename}")
+            logger.warning("Invalid image format: %s", image_file.filename)
             return jsonify({'success': False, 'error': 'Invalid image format. Please upload a JPEG, PNG, or GIF.'}), 400
 
-        # Save file temporarily
-        logger.info("Saving image to temporary file")
-        temp_path = save_temp_file(image_file)
-        logger.info(f"Image saved to: {temp_path}")
-
-        # Process image for Gemini
-        logger.info("Processing image for Gemini API")
+        # Process the image straight from the upload stream, then analyze it and write and save its story
+        language = session.get('language', 'en')
         try:
-            base64_image = process_image(temp_path)
-            logger.info("Image successfully processed and converted to base64")
+            result = create_story(image_file.stream, language,
+                                  refresh_analysis=request.form.get('refresh_analysis') in ('1', 'true'),
+                                  fused=parse_fused_option(request.form.get('fused')))
+        except StoryPipelineError as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
 
-            # Save the base64 image to a file instead of session
-            logger.info("Saving base64 image to file")
-            image_id, image_path = save_base64_image(base64_image)
-            logger.info(f"Image saved with ID: {image_id}")
+        # Store only the IDs in the session; the client loads the image from its cacheable URL
+        session['image_id'] = result['imageId']
+        session['current_story_id'] = result['storyId']
+        return jsonify({'success': True, **result})
 
-            # Store only the image ID in session
-            session['image_id'] = image_id
-            logger.info("Image ID stored in session")
-        except Exception as img_error:
-            logger.error(f"Error processing image: {str(img_error)}", exc_info=True)
-            return jsonify({'success': False, 'error': f"Error processing image: {str(img_error)}"}), 500
+    except Exception as e:
+        logger.exception("Unhandled error in upload: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Get the preferred language from the session
-        language = session.get('language', 'en')
-        logger.info(f"Using language: {language}")
+def _run_upload_job(job, upload_bytes, language, refresh_analysis, fused=None):
+    """Run the upload pipeline for a background job and return the upload response data."""
+    with app.app_context():
+        return create_story(upload_bytes, language, refresh_analysis=refresh_analysis, fused=fused, job=job)
 
-        # Generate a story based on the image and language
-        logger.info("Generating story from image")
-        try:
-            image_analysis, story = analyze_image_and_generate_story(base64_image, language=language)
-            logger.info("Successfully generated story and image analysis")
-        except Exception as ai_error:
-            logger.error(f"Error in AI processing: {str(ai_error)}", exc_info=True)
-            return jsonify({'success': False, 'error': f"Error generating story: {str(ai_error)}"}), 500
-
-        # Save the story to the database
-        logger.info("Saving story to database")
-        try:
-            from services.db_service import save_story
-            saved_story = save_story(content=story, image_analysis=image_analysis)
-            logger.info(f"Story saved with ID: {saved_story.id}")
-        except Exception as db_error:
-            logger.error(f"Database error: {str(db_error)}", exc_info=True)
-            return jsonify({'success': False, 'error': f"Error saving to database: {str(db_error)}"}), 500
-
-        # Store the story ID in the session for later use
-        session['current_story_id'] = saved_story.id
-
-        # Clean up the temporary file
-        logger.info(f"Cleaning up temporary file: {temp_path}")
-        remove_temp_file(temp_path)
-
-        # Prepare response
-        logger.info("Preparing successful response")
-        response_data = {
-            'success': True,
-            'imageAnalysis': image_analysis,
-            'story': story,
-            'storyId': saved_story.id,
-            'imageData': f"data:image/jpeg;base64,{base64_image}"
-        }
+@app.route('/upload/async', methods=['POST'])
+def upload_async():
+    """Queue an image upload for background story generation and return the job ID."""
+    if 'image' not in request.files:
+        logger.warning("No image file in request")
+        return jsonify({'success': False, 'error': 'No image uploaded'}), 400
+
+    image_file = request.files['image']
+    if not validate_image(image_file):
+        logger.warning("Invalid image format: %s", image_file.filename)
+        return jsonify({'success': False, 'error': 'Invalid image format. Please upload a JPEG, PNG, or GIF.'}), 400
+
+    # The request stream is closed once the request ends, so hand the job the raw upload bytes
+    upload_bytes = image_file.read()
 
-        # Log response size
-        response_size_kb = (len(json.dumps(response_data)) - len(base64_image)) / 1024
-        logger.info(f"Response size (excluding base64 image): {response_size_kb:.2f} KB")
+    language = session.get('language', 'en')
+    refresh_analysis = request.form.get('refresh_analysis') in ('1', 'true')
 
-        return jsonify(response_data)
+    try:
+        job = get_job_queue().submit(_run_upload_job, upload_bytes, language, refresh_analysis,
+                                     parse_fused_option(request.form.get('fused')),
+                                     stages=UPLOAD_STAGES)
+    except JobQueueFull:
+        logger.warning("Job queue is full, rejecting upload")
+        return jsonify({'success': False, 'error': 'The server is busy. Please try again shortly.'}), 503
+
+    return jsonify({
+        'success': True,
+        'jobId': job.id,
+        'statusUrl': url_for('get_job', job_id=job.id),
+        'eventsUrl': url_for('job_events', job_id=job.id)
+    }), 202
+
+def _run_batch_job(job, items, language):
+    """Run a batch upload job inside an application context."""
+    from services.batch_service import run_batch
+    with app.app_context():
+        return run_batch(job, items, language)
+
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """Queue many images (or zip archives of images) for story generation as one background job."""
+    from services.batch_service import collect_batch_items, BatchError
+
+    uploads = request.files.getlist('images')
+    try:
+        items = collect_batch_items([(upload.filename, upload.stream) for upload in uploads])
+    except BatchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
+    language = session.get('language', 'en')
+    try:
+        job = get_job_queue().submit(_run_batch_job, items, language, stages=('process', 'generate', 'save'))
+    except JobQueueFull:
+        logger.warning("Job queue is full, rejecting batch upload")
+        return jsonify({'success': False, 'error': 'The server is busy. Please try again shortly.'}), 503
+
+    return jsonify({
+        'success': True,
+        'jobId': job.id,
+        'itemCount': len(items),
+        'statusUrl': url_for('get_job', job_id=job.id),
+        'eventsUrl': url_for('job_events', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Return the current state of a background job."""
+    job = get_job_queue().get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    # The image ID is only known once an upload job has processed the image
+    snapshot = job.to_dict()
+    if snapshot['status'] == 'completed' and 'imageId' in snapshot['result']:
+        session['image_id'] = snapshot['result']['imageId']
+        session['current_story_id'] = snapshot['result']['storyId']
+
+    return jsonify({'success': True, 'job': snapshot})
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """
+    Stream job progress as Server-Sent Events until the job finishes.
+
+    Each event holds a job snapshot. The stream holds its worker open, so
+    sync-worker deployments should prefer polling /jobs/<job_id>.
+    """
+    queue = get_job_queue()
+    if not queue.get(job_id):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+    def stream():
+        version = None
+        while True:
+            snapshot = queue.wait_for_update(job_id, version)
+            if snapshot is None:
+                break
+            if snapshot['version'] == version:
+                # Keep idle connections from being closed by proxies
+                yield ": keepalive\n\n"
+                continue
+
+            version = snapshot['version']
+            yield f"data: {json.dumps(snapshot)}\n\n"
+            if snapshot['status'] in ('completed', 'failed'):
+                break
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _stream_story(image_id, image_bytes, language, custom_prompt="", refresh_analysis=False,
+                  include_analysis=True, image_analysis=None):
+    """
+    Yield the analysis and then the story as Server-Sent Events, saving the story once complete.
+
+    Events are 'analysis' ({text}), 'token' ({text}), 'done' ({storyId, imageUrl}) and 'error' ({error}).
+    A stored image_analysis is used as is; otherwise the image bytes are analyzed.
+    """
+    try:
+        for event, data in stream_story(image_id, image_bytes, language, custom_prompt,
+                                        refresh_analysis=refresh_analysis, image_analysis=image_analysis):
+            if event == 'analysis':
+                if include_analysis:
+                    yield _sse_event('analysis', {'text': data})
+            elif event == 'token':
+                yield _sse_event('token', {'text': data})
+            else:
+                yield _sse_event('done', {'storyId': data['storyId'], 'imageUrl': data['imageUrl']})
     except Exception as e:
-        logger.exception(f"Unhandled error in upload: {str(e)}")
+        logger.error("Error streaming story: %s", e, exc_info=True)
+        yield _sse_event('error', {'error': str(e)})
+
+def _event_stream_response(events):
+    """Wrap an event generator in a streaming text/event-stream response."""
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/upload/stream', methods=['POST'])
+def upload_stream():
+    """
+    Handle image upload and stream the analysis and story as they are generated.
+
+    The stream holds its worker until the story is saved, so the browser
+    uploads through /upload/async and polls the job instead.
+    """
+    if 'image' not in request.files:
+        logger.warning("No image file in request")
+        return jsonify({'success': False, 'error': 'No image uploaded'}), 400
+
+    image_file = request.files['image']
+    if not validate_image(image_file):
+        logger.warning("Invalid image format: %s", image_file.filename)
+        return jsonify({'success': False, 'error': 'Invalid image format. Please upload a JPEG, PNG, or GIF.'}), 400
+
+    try:
+        image_id, image_bytes = store_upload(image_file.stream)
+    except Exception as img_error:
+        logger.error("Error processing image: %s", img_error, exc_info=True)
+        return jsonify({'success': False, 'error': f"Error processing image: {str(img_error)}"}), 500
+
+    # The session cookie is sent with the response headers, before streaming starts
+    session['image_id'] = image_id
+    language = session.get('language', 'en')
+    refresh_analysis = request.form.get('refresh_analysis') in ('1', 'true')
+
+    return _event_stream_response(_stream_story(image_id, image_bytes, language, refresh_analysis=refresh_analysis))
+
+@app.route('/regenerate/stream', methods=['POST'])
+def regenerate_stream():
+    """Regenerate a story for the previously uploaded image, streaming it as it is generated."""
+    data = request.json
+    custom_prompt = data.get('prompt', '')
+    refresh_analysis = bool(data.get('refreshAnalysis', False))
+
+    if 'image_id' not in session:
+        logger.warning("No image ID found in session")
+        return jsonify({'success': False, 'error': 'No image found. Please upload an image first.'}), 400
+
+    image_id = session['image_id']
+    language = session.get('language', 'en')
+    try:
+        image_analysis, image_bytes = load_regeneration_source(image_id, language, refresh_analysis)
+    except StoryPipelineError as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+    return _event_stream_response(_stream_story(image_id, image_bytes, language, custom_prompt,
+                                                refresh_analysis=refresh_analysis, include_analysis=False,
+                                                image_analysis=image_analysis))
+
 @app.route('/regenerate', methods=['POST'])
 def regenerate():
     """Regenerate a story based on the previously uploaded image."""
@@ -174,43 +465,24 @@ def regenerate():
         # Get data from request
         data = request.json
         custom_prompt = data.get('prompt', '')
+        refresh_analysis = bool(data.get('refreshAnalysis', False))
 
         # Check if we have an image ID in the session
         if 'image_id' not in session:
             logger.warning("No image ID found in session")
             return jsonify({'success': False, 'error': 'No image found. Please upload an image first.'}), 400
 
-        # Get the image ID from session
-        image_id = session['image_id']
-        logger.info(f"Retrieved image ID from session: {image_id}")
-
-        # Get the base64 image from file
+        # Write a new version of the image's story in the preferred language and save it
         try:
-            logger.info(f"Loading image with ID: {image_id}")
-            base64_image = get_base64_image(image_id)
-            logger.info("Successfully loaded image from file")
-        except Exception as img_error:
-            logger.error(f"Error loading image: {str(img_error)}", exc_info=True)
-            return jsonify({'success': False, 'error': f"Error loading image: {str(img_error)}"}), 500
-
-        # Get the preferred language from the session
-        language = session.get('language', 'en')
-
-        # Regenerate story with language preference
-        story = regenerate_story(base64_image, custom_prompt, language=language)
-
-        # Save the regenerated story to the database
-        from services.db_service import save_story
-        saved_story = save_story(content=story, prompt=custom_prompt)
+            result = regenerate_from_image(session['image_id'], session.get('language', 'en'), custom_prompt,
+                                           refresh_analysis=refresh_analysis,
+                                           fused=parse_fused_option(data.get('fused')))
+        except StoryPipelineError as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
 
         # Update the story ID in the session
-        session['current_story_id'] = saved_story.id
-
-        return jsonify({
-            'success': True,
-            'story': story,
-            'storyId': saved_story.id
-        })
+        session['current_story_id'] = result['storyId']
+        return jsonify({'success': True, **result})
 
     except Exception as e:
         logger.exception("Error regenerating story")
@@ -231,16 +503,20 @@ def text_to_speech():
         # Get the preferred language from the session
         language = session.get('language', 'en')
 
-        # Map our language codes to gTTS language codes
-        tts_lang = 'zh-CN' if language == 'zh' else 'en'
-
-        # Generate speech with proper language
-        audio_path = generate_speech(text, lang=tts_lang)
-
-        # If we have a story ID, update the story with the audio path
-        if story_id:
-            from services.db_service import update_story_audio
-            update_story_audio(story_id, audio_path)
+        if data.get('stream'):
+            # Start synthesis in the background and let the client play it while it is produced
+            audio_path, synthesis = start_narration(text, language, story_id)
+            response_data = {
+                'success': True,
+                'audioPath': audio_path,
+                'storyId': story_id
+            }
+            if synthesis is not None:
+                response_data['streamUrl'] = url_for('stream_audio', audio_key=synthesis.key)
+            return jsonify(response_data)
+
+        # Generate speech with proper language, recording it on the story
+        audio_path = narrate(text, language, story_id)
 
         return jsonify({
             'success': True,
@@ -252,10 +528,59 @@ def text_to_speech():
         logger.exception("Error generating speech")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/audio/stream/<audio_key>')
+def stream_audio(audio_key):
+    """Stream MP3 audio in order while its segments are still being synthesized."""
+    synthesis = get_speech_synthesis(audio_key)
+    if synthesis is None:
+        # Already finished (or never started): fall back to the cached file
+        if os.path.exists(os.path.join(AUDIO_DIR, f"{audio_key}.mp3")):
+            return redirect(url_for('serve_audio', filename=f"{audio_key}.mp3"))
+        return jsonify({'success': False, 'error': 'Audio not found'}), 404
+
+    def stream():
+        try:
+            yield from synthesis.iter_audio()
+        except Exception as e:
+            logger.error("Error streaming audio %s: %s", audio_key, e)
+
+    return Response(stream(), mimetype='audio/mpeg', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/images/<image_id>.jpg')
+def serve_image(image_id):
+    """Serve a processed image. Images are content-addressed, so they never change and can be cached forever."""
+    if not IMAGE_ID_PATTERN.match(image_id):
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+
+    store = get_image_store()
+    image_path = store.path(image_id)
+    if image_path is not None:
+        # Local files are sent straight from disk
+        image_path = os.path.abspath(image_path)
+        if not os.path.exists(image_path):
+            return jsonify({'success': False, 'error': 'Image not found'}), 404
+        source = image_path
+        with open(image_path, 'rb') as f:
+            mimetype = image_mime_type(f.read(12))
+    else:
+        image_bytes = store.get(image_id)
+        if image_bytes is None:
+            return jsonify({'success': False, 'error': 'Image not found'}), 404
+        source = io.BytesIO(image_bytes)
+        mimetype = image_mime_type(image_bytes)
+
+    response = send_file(source, mimetype=mimetype, etag=image_id, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/static/audio/<filename>')
 def serve_audio(filename):
-    """Serve audio files."""
-    return send_from_directory('static/audio', filename)
+    """Serve audio files. Their names are hashes of the narrated text, so they never change and can be cached forever."""
+    response = send_from_directory(os.path.abspath(AUDIO_DIR), filename, conditional=True, max_age=31536000)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,254 @@
+"""
+ASGI entry point for serving many concurrent generations from one process.
+
+Run with an ASGI server, for example:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:app
+
+after migrating the database with `flask --app main migrate` (gunicorn
+does that itself through gunicorn.conf.py).
+
+The routes that spend their time waiting on Gemini and gTTS (/upload,
+/regenerate and /generate-speech) run as coroutines on the event loop:
+Gemini is called through its async API, speech synthesis is awaited
+without holding a thread, and short blocking steps (image processing,
+file and database access) run in the default thread pool. Every other
+route is dispatched to the regular Flask view in a worker thread, and
+streamed responses (SSE, audio, files) are produced in their own thread.
+
+Each request runs inside a normal Flask request context, so sessions,
+before/after_request hooks and metrics behave exactly as under WSGI.
+"""
+import io
+import sys
+import asyncio
+import logging
+import threading
+from flask import request, session, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from main import app as flask_app, start_background_services
+from services.ai_service import parse_fused_option
+from services.image_service import validate_image
+from services.story_service import (create_story_async, regenerate_from_image_async, narrate_async,
+                                    StoryPipelineError)
+
+logger = logging.getLogger(__name__)
+
+async def upload():
+    """Handle image upload and story generation."""
+    if 'image' not in request.files:
+        return jsonify({'success': False, 'error': 'No image uploaded'}), 400
+
+    image_file = request.files['image']
+    if not validate_image(image_file):
+        return jsonify({'success': False, 'error': 'Invalid image format. Please upload a JPEG, PNG, or GIF.'}), 400
+
+    try:
+        result = await create_story_async(image_file.stream, session.get('language', 'en'),
+                                          refresh_analysis=request.form.get('refresh_analysis') in ('1', 'true'),
+                                          fused=parse_fused_option(request.form.get('fused')))
+    except StoryPipelineError as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    session['image_id'] = result['imageId']
+    session['current_story_id'] = result['storyId']
+    return jsonify({'success': True, **result})
+
+async def regenerate():
+    """Regenerate a story based on the previously uploaded image."""
+    try:
+        data = request.json
+        if 'image_id' not in session:
+            return jsonify({'success': False, 'error': 'No image found. Please upload an image first.'}), 400
+
+        try:
+            result = await regenerate_from_image_async(session['image_id'], session.get('language', 'en'),
+                                                       data.get('prompt', ''),
+                                                       refresh_analysis=bool(data.get('refreshAnalysis', False)),
+                                                       fused=parse_fused_option(data.get('fused')))
+        except StoryPipelineError as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+        session['current_story_id'] = result['storyId']
+        return jsonify({'success': True, **result})
+
+    except Exception as e:
+        logger.exception("Error regenerating story")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+async def text_to_speech():
+    """Generate speech from text."""
+    try:
+        data = request.json
+        if data.get('stream'):
+            # Streaming synthesis returns immediately, so the regular view is fine
+            return await asyncio.to_thread(flask_app.dispatch_request)
+
+        text = data.get('text', '')
+        story_id = data.get('storyId') or session.get('current_story_id')
+        if not text:
+            return jsonify({'success': False, 'error': 'No text provided'}), 400
+
+        audio_path = await narrate_async(text, session.get('language', 'en'), story_id)
+        return jsonify({
+            'success': True,
+            'audioPath': audio_path,
+            'storyId': story_id
+        })
+
+    except Exception as e:
+        logger.exception("Error generating speech")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Flask endpoints served by the coroutines above instead of their sync views
+ASYNC_VIEWS = {
+    'upload': upload,
+    'regenerate': regenerate,
+    'text_to_speech': text_to_speech,
+}
+
+def _build_environ(scope, body):
+    """Translate an ASGI HTTP scope and its body into a WSGI environ."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _read_body(receive, limit=None):
+    # Stops reading as soon as the body is larger than limit, so oversized uploads are never held in memory
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if limit is not None and size > limit:
+            raise RequestEntityTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            break
+    return b''.join(chunks)
+
+def _error_response(environ, error):
+    """Render an HTTP error through the Flask app's error handlers."""
+    with flask_app.request_context(environ):
+        return flask_app.finalize_request(flask_app.handle_user_exception(error))
+
+async def _dispatch(environ):
+    """Run a request through Flask, using the async view when there is one."""
+    with flask_app.request_context(environ):
+        view = ASYNC_VIEWS.get(request.endpoint)
+        if view is None:
+            return await asyncio.to_thread(flask_app.full_dispatch_request)
+
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = await view()
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+        return flask_app.finalize_request(rv)
+
+def _drain_response(response, environ, loop, queue):
+    # Runs in its own thread: produces the WSGI body and hands chunks to the event loop
+    def start_response(status, headers, exc_info=None):
+        loop.call_soon_threadsafe(queue.put_nowait, ('start', (status, headers)))
+
+    body = response(environ, start_response)
+    try:
+        for chunk in body:
+            if chunk:
+                loop.call_soon_threadsafe(queue.put_nowait, ('body', chunk))
+    except Exception as e:
+        logger.error("Error while streaming response: %s", e, exc_info=True)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+        loop.call_soon_threadsafe(queue.put_nowait, ('end', None))
+
+def _start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+async def _send_response(response, environ, send):
+    if not response.is_streamed:
+        # Buffered bodies (JSON, rendered pages) are already in memory
+        started = []
+        body = b''.join(response(environ, lambda status, headers, exc_info=None: started.append((status, headers))))
+        await send(_start_message(*started[0]))
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+        return
+
+    # Generators (SSE, audio streams) and files may block, so produce them in a separate thread
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    threading.Thread(target=_drain_response, args=(response, environ, loop, queue), daemon=True).start()
+    while True:
+        kind, payload = await queue.get()
+        if kind == 'start':
+            await send(_start_message(*payload))
+        elif kind == 'body':
+            await send({'type': 'http.response.body', 'body': payload, 'more_body': True})
+        else:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_background_services()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                from services.db_service import flush_writes
+                # Commit queued writes before the server reports it has stopped
+                await asyncio.to_thread(flush_writes)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    try:
+        body = await _read_body(receive, flask_app.config.get('MAX_CONTENT_LENGTH'))
+    except RequestEntityTooLarge as e:
+        environ = _build_environ(scope, b'')
+        await _send_response(_error_response(environ, e), environ, send)
+        return
+
+    environ = _build_environ(scope, body)
+    response = await _dispatch(environ)
+    await _send_response(response, environ, send)
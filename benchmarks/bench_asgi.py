@@ -0,0 +1,246 @@
+"""
+Load test comparing the sync WSGI app with the ASGI entry point (asgi.py).
+
+In-process mode (the default) uses the fake Gemini transport and fake
+gTTS backend and compares, for /upload and /generate-speech:
+
+  - wsgi: a number of sync workers (--workers), each handling one request
+    at a time, like gunicorn's sync worker class
+  - asgi: a single process and event loop with --concurrency requests
+    in flight at once
+
+Each mode runs in a fresh child process so peak RSS is comparable. With
+--url the same requests are sent over HTTP to a running server instead,
+so a real gunicorn deployment can be compared with a real uvicorn one.
+Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_asgi [--concurrency 200] [--requests 400] [--workers 1] [--gemini-latency 1.0]
+    python -m benchmarks.bench_asgi --url http://localhost:5000 [--concurrency 200] [--requests 400]
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import itertools
+import multiprocessing
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from werkzeug.test import encode_multipart
+from werkzeug.datastructures import FileStorage
+from benchmarks.bench_image_processing import make_test_jpeg, reset_peak_rss, peak_rss_kb
+from benchmarks.bench_pipeline import summarize, STORY_TEXT, _fake_synthesize_segment
+
+ROUTES = ('upload', 'generate-speech')
+
+def _request_body(route, upload_bytes, counter):
+    """Return (path, content type, body) for one request."""
+    if route == 'upload':
+        boundary, body = encode_multipart({'image': FileStorage(io.BytesIO(upload_bytes), filename='bench.jpg',
+                                                                content_type='image/jpeg')})
+        return '/upload', f'multipart/form-data; boundary={boundary}', body
+    # Unique text so every request synthesizes instead of hitting the audio cache
+    body = json.dumps({'text': f"{STORY_TEXT} Request {next(counter)}."}).encode('utf-8')
+    return '/generate-speech', 'application/json', body
+
+async def _asgi_request(app, path, content_type, body):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode()),
+                    (b'host', b'localhost')],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    sent = [False]
+    status = []
+
+    async def receive():
+        if not sent[0]:
+            sent[0] = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await app(scope, receive, send)
+    return status[0]
+
+def _run_asgi(route, upload_bytes, requests_total, concurrency):
+    import asgi
+
+    async def run():
+        counter = itertools.count()
+        semaphore = asyncio.Semaphore(concurrency)
+        durations, errors = [], []
+
+        async def one():
+            async with semaphore:
+                path, content_type, body = _request_body(route, upload_bytes, counter)
+                start = time.perf_counter()
+                status = await _asgi_request(asgi.app, path, content_type, body)
+                durations.append(time.perf_counter() - start)
+                if status >= 400:
+                    errors.append(status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests_total)))
+        return durations, errors, time.perf_counter() - start
+
+    return asyncio.run(run())
+
+def _run_wsgi(route, upload_bytes, requests_total, workers):
+    import main
+
+    counter = itertools.count()
+    lock = threading.Lock()
+    durations, errors = [], []
+
+    def one(client):
+        path, content_type, body = _request_body(route, upload_bytes, counter)
+        start = time.perf_counter()
+        response = client.post(path, data=body, content_type=content_type)
+        with lock:
+            durations.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    # Each worker serves one request at a time, like a gunicorn sync worker
+    remaining = iter(range(requests_total))
+    def worker():
+        client = main.app.test_client()
+        while next(remaining, None) is not None:
+            one(client)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations, errors, time.perf_counter() - start
+
+def _run_mode(config, queue):
+    workdir = config['workdir']
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+    os.environ['ANALYSIS_CACHE_BACKEND'] = 'none'
+    os.environ['TTS_WORKERS'] = str(config['tts_workers'])
+
+    import logging
+    from services.gemini_client import set_transport, FakeTransport
+    set_transport(FakeTransport(latency=config['gemini_latency'], jitter=config['gemini_jitter']))
+    import main
+    main.migrate()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    import services.tts_service as tts_service
+    tts_service.synthesize_segment = _fake_synthesize_segment(config['tts_latency'])
+
+    upload_bytes = make_test_jpeg(1920, 1080)
+    reset_peak_rss()
+    if config['mode'] == 'asgi':
+        durations, errors, wall = _run_asgi(config['route'], upload_bytes, config['requests'], config['concurrency'])
+    else:
+        durations, errors, wall = _run_wsgi(config['route'], upload_bytes, config['requests'], config['workers'])
+
+    queue.put({
+        'mode': config['mode'],
+        'route': config['route'],
+        'in_flight': config['concurrency'] if config['mode'] == 'asgi' else config['workers'],
+        'latency': summarize(durations),
+        'throughput_rps': round(len(durations) / wall, 2),
+        'errors': len(errors),
+        'peak_rss_kb': peak_rss_kb(),
+    })
+
+def run_in_process(routes, requests_total, concurrency, workers, gemini_latency, gemini_jitter, tts_latency,
+                   tts_workers):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for route in routes:
+        for mode in ('wsgi', 'asgi'):
+            with tempfile.TemporaryDirectory() as workdir:
+                config = {
+                    'workdir': workdir, 'mode': mode, 'route': route, 'requests': requests_total,
+                    'concurrency': concurrency, 'workers': workers, 'gemini_latency': gemini_latency,
+                    'gemini_jitter': gemini_jitter, 'tts_latency': tts_latency, 'tts_workers': tts_workers,
+                }
+                queue = context.Queue()
+                process = context.Process(target=_run_mode, args=(config, queue))
+                process.start()
+                results.append(queue.get())
+                process.join()
+    return results
+
+def run_http(url, routes, requests_total, concurrency):
+    upload_bytes = make_test_jpeg(1920, 1080)
+    counter = itertools.count()
+    results = []
+    for route in routes:
+        def one(_):
+            path, content_type, body = _request_body(route, upload_bytes, counter)
+            request = urllib.request.Request(f"{url.rstrip('/')}{path}", data=body,
+                                             headers={'Content-Type': content_type}, method='POST')
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=300) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            outcomes = list(executor.map(one, range(requests_total)))
+        wall = time.perf_counter() - start
+        results.append({
+            'mode': 'http',
+            'route': route,
+            'in_flight': concurrency,
+            'latency': summarize([duration for duration, _ in outcomes]),
+            'throughput_rps': round(len(outcomes) / wall, 2),
+            'errors': sum(1 for _, status in outcomes if status >= 400),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200, help='Requests in flight at once (ASGI / HTTP)')
+    parser.add_argument('--workers', type=int, default=1, help='Sync workers for the WSGI baseline')
+    parser.add_argument('--gemini-latency', type=float, default=1.0, help='Seconds per fake Gemini call')
+    parser.add_argument('--gemini-jitter', type=float, default=0.2)
+    parser.add_argument('--tts-latency', type=float, default=0.5, help='Seconds per fake gTTS segment')
+    parser.add_argument('--tts-workers', type=int, default=64,
+                        help='Threads for fake gTTS calls; in production gTTS blocks a TTS_WORKERS thread per segment')
+    parser.add_argument('--url', help='Load test a running server over HTTP instead')
+    args = parser.parse_args()
+
+    routes = [route for route in args.routes.split(',') if route]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        results = run_http(args.url, routes, args.requests, args.concurrency)
+    else:
+        results = run_in_process(routes, args.requests, args.concurrency, args.workers,
+                                 args.gemini_latency, args.gemini_jitter, args.tts_latency, args.tts_workers)
+    print(json.dumps({'benchmark': 'asgi', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
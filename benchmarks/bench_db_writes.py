@@ -0,0 +1,127 @@
+"""
+Measure story write throughput with and without the write-behind queue.
+
+Fills a throwaway database (SQLite, or --database-url, e.g. an empty
+Postgres scratch database) from several threads at once, first with every
+write committing on its own and then through the write-behind queue in
+services.db_service. For every mode, operation (save_story,
+update_story_audio) and concurrency level it reports writes per second,
+transactions committed, and per-call latency. Both operations return
+once their write has been committed.
+
+Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_db_writes [--concurrency 1,8,32] [--writes 2000]
+        [--database-url postgresql://localhost/scratch]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_pipeline import summarize
+
+STORY_TEXT = ("The little dog watched the red kite climb into the sky. It barked twice and ran after it. "
+              "All afternoon it chased the shadow across the meadow, until the wind fell quiet.")
+
+def run_threads(app, concurrency, writes, fn):
+    """Call fn(index) writes times from concurrency threads; returns per-call durations."""
+    durations = []
+    lock = threading.Lock()
+    counter = iter(range(writes))
+
+    def worker():
+        with app.app_context():
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                start = time.perf_counter()
+                fn(index)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    durations.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return durations
+
+def measure(app, db_service, commits, operation, concurrency, writes, story_ids):
+    if operation == 'save_story':
+        def fn(index):
+            db_service.save_story(content=f"{STORY_TEXT} Story {index}.", image_path='images/bench.jpg')
+    else:
+        def fn(index):
+            db_service.update_story_audio(story_ids[index % len(story_ids)], f"audio/{index:064x}.mp3")
+
+    commits_before = commits[0]
+    start = time.perf_counter()
+    durations = run_threads(app, concurrency, writes, fn)
+    with app.app_context():
+        db_service.flush_writes()
+    elapsed = time.perf_counter() - start
+    return dict(summarize(durations),
+                writes_per_s=round(writes / elapsed, 1),
+                transactions=commits[0] - commits_before)
+
+def run(concurrency_levels, writes, database_url):
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ.setdefault('SESSION_SECRET', 'benchmark')
+        os.environ['IMAGE_GC_INTERVAL'] = '0'
+        # Start with direct commits; the write-behind queue is started for the second pass
+        os.environ['DB_WRITE_BEHIND'] = 'false'
+
+        import logging
+        from sqlalchemy import event
+        import main
+        from app import db
+        from services import db_service
+        logging.getLogger().setLevel(logging.WARNING)
+        main.migrate()
+
+        commits = [0]
+        with main.app.app_context():
+            def count_commit(connection):
+                commits[0] += 1
+            event.listen(db.engine, 'commit', count_commit)
+            story_ids = [story.id for story in db_service.save_stories(
+                [{'content': f"{STORY_TEXT} Seed {index}."} for index in range(100)])]
+
+        results = {'database': os.environ['DATABASE_URL'].split(':', 1)[0], 'scenarios': []}
+        for mode in ('direct', 'write_behind'):
+            if mode == 'write_behind':
+                db_service.DB_WRITE_BEHIND = True
+                db_service.start_write_behind(main.app)
+            for operation in ('save_story', 'update_story_audio'):
+                for concurrency in concurrency_levels:
+                    result = measure(main.app, db_service, commits, operation, concurrency, writes, story_ids)
+                    result.update({'mode': mode, 'operation': operation, 'concurrency': concurrency})
+                    results['scenarios'].append(result)
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--writes', type=int, default=2000, help='Writes per scenario')
+    parser.add_argument('--database-url', help='Empty scratch database to use instead of a temporary SQLite file')
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    results = run(concurrency_levels, args.writes, args.database_url)
+    print(json.dumps({'benchmark': 'db_writes', 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Compare the image encoding policies in services.encoding_service.
+
+For every policy and test image the harness reports the bytes sent to the
+vision model, the image tokens it is billed for, encode time and image
+fidelity: the PSNR of the processed image against the original, both
+scaled to a common size, and its difference from the most detailed
+policy. Test images are synthetic (a photo-like JPEG, a screenshot-like
+PNG and an animated GIF) unless --images is given.
+
+With --live, each processed image is also described by Gemini
+(GOOGLE_API_KEY must be set), and the word overlap of every description
+with the most detailed policy's shows how much of the analysis survives.
+
+Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_image_encoding [--policies detail,balanced,economy,minimal]
+        [--images photo1.jpg,photo2.png] [--runs 5] [--compare-size 1024] [--live]
+"""
+import os
+import io
+import re
+import sys
+import json
+import math
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageChops, ImageDraw, ImageOps, ImageStat
+
+from benchmarks.bench_image_processing import make_test_jpeg
+from benchmarks.bench_pipeline import summarize
+
+def make_screenshot_png(width=1920, height=1080):
+    """Create a screenshot-like PNG: flat panels with rows of text-like marks."""
+    img = Image.new('RGB', (width, height), (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, width, 60), fill=(40, 60, 90))
+    draw.rectangle((0, 60, 300, height), fill=(225, 228, 232))
+    for row, y in enumerate(range(100, height - 40, 28)):
+        x = 340
+        while x < width - 80:
+            word = 20 + (x * 7 + row * 13) % 70
+            draw.rectangle((x, y, x + word, y + 12), fill=(60, 60, 60))
+            x += word + 10
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def make_animated_gif(width=480, height=360, frames=24):
+    """Create an animated GIF of a ball moving across a gradient."""
+    background = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    images = []
+    for frame in range(frames):
+        img = background.copy()
+        x = int((width - 80) * frame / max(1, frames - 1))
+        ImageDraw.Draw(img).ellipse((x, height // 2 - 40, x + 80, height // 2 + 40), fill=(220, 40, 40))
+        images.append(img)
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:], duration=80, loop=0)
+    return buffer.getvalue()
+
+def make_test_images():
+    return {
+        'photo_4032x3024.jpg': make_test_jpeg(4032, 3024),
+        'screenshot_1920x1080.png': make_screenshot_png(),
+        'animation_480x360.gif': make_animated_gif(),
+    }
+
+def reference_image(upload_bytes):
+    """The upload as the processing pipeline sees it: representative frame, oriented, RGB."""
+    from services.encoding_service import select_frame
+    with Image.open(io.BytesIO(upload_bytes)) as img:
+        select_frame(img)
+        return ImageOps.exif_transpose(img).convert('RGB')
+
+def psnr(reference, processed, compare_size):
+    """PSNR in dB of a processed image against the original, both scaled to fit compare_size."""
+    scale = min(1.0, compare_size / max(reference.size))
+    size = (max(1, round(reference.width * scale)), max(1, round(reference.height * scale)))
+    expected = reference.resize(size, Image.LANCZOS)
+    actual = processed.convert('RGB').resize(size, Image.LANCZOS)
+    mse = sum(value ** 2 for value in ImageStat.Stat(ImageChops.difference(expected, actual)).rms) / 3
+    if mse == 0:
+        return None
+    return round(10 * math.log10(255 ** 2 / mse), 2)
+
+def word_overlap(text, reference):
+    """Fraction of a reference text's distinct words that also appear in a text."""
+    words = set(re.findall(r'\w+', reference.lower()))
+    if not words:
+        return None
+    return round(len(words & set(re.findall(r'\w+', text.lower()))) / len(words), 3)
+
+def measure(upload_bytes, policy, runs, compare_size):
+    from services.image_service import process_image
+    from services.encoding_service import estimate_image_tokens
+
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        image_bytes = process_image(io.BytesIO(upload_bytes), policy=policy)
+        durations.append(time.perf_counter() - start)
+
+    with Image.open(io.BytesIO(image_bytes)) as processed:
+        processed.load()
+    return image_bytes, dict(summarize(durations),
+                             format=policy.format,
+                             size=f"{processed.width}x{processed.height}",
+                             bytes=len(image_bytes),
+                             tokens=estimate_image_tokens(processed.width, processed.height),
+                             psnr_db=psnr(reference_image(upload_bytes), processed, compare_size))
+
+def describe(image_bytes, language):
+    from services.ai_service import analyze_image
+    start = time.perf_counter()
+    analysis = analyze_image(image_bytes, language, force_refresh=True)
+    return analysis, round(time.perf_counter() - start, 2)
+
+def run(policy_names, images, runs, compare_size, live, language):
+    import logging
+    from services.encoding_service import get_encoding_policy
+    logging.getLogger().setLevel(logging.WARNING)
+
+    policies = [get_encoding_policy(name) for name in policy_names]
+    results = []
+    for image_name, upload_bytes in images.items():
+        baseline = None
+        for policy in policies:
+            image_bytes, result = measure(upload_bytes, policy, runs, compare_size)
+            result.update({'image': image_name, 'policy': policy.name, 'upload_bytes': len(upload_bytes)})
+            if live:
+                result['analysis'], result['analysis_s'] = describe(image_bytes, language)
+            if baseline is None:
+                baseline = result
+            else:
+                if result['psnr_db'] is not None and baseline['psnr_db'] is not None:
+                    result['psnr_delta_db'] = round(result['psnr_db'] - baseline['psnr_db'], 2)
+                result['bytes_ratio'] = round(result['bytes'] / baseline['bytes'], 3)
+                result['tokens_ratio'] = round(result['tokens'] / baseline['tokens'], 3)
+                if live:
+                    result['analysis_overlap'] = word_overlap(result['analysis'], baseline['analysis'])
+            results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--policies', default='detail,balanced,economy,minimal',
+                        help='Policies to compare; deltas are against the first')
+    parser.add_argument('--images', help='Comma-separated image files to use instead of synthetic ones')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--compare-size', type=int, default=1024, help='Size images are compared at for PSNR')
+    parser.add_argument('--live', action='store_true', help='Also describe each image with Gemini')
+    parser.add_argument('--language', default='en')
+    args = parser.parse_args()
+
+    if args.images:
+        images = {}
+        for path in args.images.split(','):
+            with open(path, 'rb') as f:
+                images[os.path.basename(path)] = f.read()
+    else:
+        images = make_test_images()
+
+    results = run(args.policies.split(','), images, args.runs, args.compare_size, args.live, args.language)
+    print(json.dumps({'benchmark': 'image_encoding', 'results': results}, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark the image upload path: legacy temp-file/base64 round trips
+versus the in-memory pipeline in services.image_service.process_image.
+
+Each variant runs in a fresh child process so peak RSS reflects only that
+variant. Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_image_processing [--sizes 4032x3024,1920x1080] [--runs 5]
+"""
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import base64
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+def make_test_jpeg(width, height):
+    """Create a photo-like JPEG of the given dimensions."""
+    noise = Image.effect_noise((width, height), 48).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+def legacy_pipeline(upload_bytes, workdir, max_size=1024):
+    """The original path: temp file, full decode, base64 encode, decode to disk, re-read and re-encode."""
+    temp_path = os.path.join(workdir, f"{uuid.uuid4().hex}.jpg")
+    with open(temp_path, 'wb') as f:
+        f.write(upload_bytes)
+
+    with Image.open(temp_path) as img:
+        img = img.convert('RGB')
+        width, height = img.size
+        if width > max_size or height > max_size:
+            if width > height:
+                new_size = (max_size, int(height * (max_size / width)))
+            else:
+                new_size = (int(width * (max_size / height)), max_size)
+            img = img.resize(new_size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=85)
+        base64_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+    image_path = os.path.join(workdir, f"img_{uuid.uuid4().hex}.jpg")
+    with open(image_path, 'wb') as f:
+        f.write(base64.b64decode(base64_data))
+    with open(image_path, 'rb') as f:
+        regenerate_data = base64.b64encode(f.read()).decode('utf-8')
+
+    os.remove(temp_path)
+    os.remove(image_path)
+    return len(base64_data) + len(regenerate_data)
+
+def in_memory_pipeline(upload_bytes, workdir, max_size=1024):
+    """The current path: decode from the upload stream and keep raw bytes."""
+    from services.image_service import process_image
+
+    image_bytes = process_image(io.BytesIO(upload_bytes), max_size=max_size)
+    image_path = os.path.join(workdir, f"img_{uuid.uuid4().hex}.jpg")
+    with open(image_path, 'wb') as f:
+        f.write(image_bytes)
+    os.remove(image_path)
+    return len(image_bytes)
+
+VARIANTS = {
+    'legacy': legacy_pipeline,
+    'in_memory': in_memory_pipeline,
+}
+
+def reset_peak_rss():
+    # Linux resets the VmHWM high-water mark when '5' is written to clear_refs
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _run_variant(variant, upload_bytes, runs, queue):
+    pipeline = VARIANTS[variant]
+    if variant == 'in_memory':
+        # Import outside the measured region so both variants start from the same baseline
+        import services.image_service  # noqa: F401
+    reset_peak_rss()
+    baseline_rss_kb = peak_rss_kb()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        timings = []
+        tracemalloc.start()
+        for _ in range(runs):
+            start = time.perf_counter()
+            pipeline(upload_bytes, workdir)
+            timings.append(time.perf_counter() - start)
+        _, python_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    timings.sort()
+    queue.put({
+        'variant': variant,
+        'runs': runs,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'min_ms': round(timings[0] * 1000, 2),
+        'python_peak_kb': round(python_peak / 1024, 1),
+        'rss_growth_kb': peak_rss_kb() - baseline_rss_kb,
+    })
+
+def run(sizes, runs):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for width, height in sizes:
+        upload_bytes = make_test_jpeg(width, height)
+        for variant in VARIANTS:
+            queue = context.Queue()
+            process = context.Process(target=_run_variant, args=(variant, upload_bytes, runs, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            result.update({'size': f"{width}x{height}", 'upload_kb': round(len(upload_bytes) / 1024, 1)})
+            results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='4032x3024,1920x1080,800x600')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    sizes = [tuple(int(part) for part in size.split('x')) for size in args.sizes.split(',')]
+    print(json.dumps({'benchmark': 'image_processing', 'results': run(sizes, args.runs)}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Measure the CPU time and memory allocated per request under different logging modes.
+
+Each mode runs /upload and /regenerate through the test client, with a
+zero-latency fake Gemini transport, in a fresh child process whose stderr
+goes to /dev/null, so formatting and writing log lines cost what they
+would in production. CPU time comes from time.process_time(); allocation
+figures come from a separate pass under tracemalloc, so tracing does not
+distort the CPU numbers: each traced request reports how far Python
+memory rose above its starting point. Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_logging [--requests 200] [--size 1920x1080]
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_image_processing import make_test_jpeg
+
+# Environment for each logging mode
+MODES = {
+    'debug_text': {'LOG_LEVEL': 'DEBUG', 'LOG_FORMAT': 'text', 'REQUEST_LOG': 'false'},
+    'info_text': {'LOG_LEVEL': 'INFO', 'LOG_FORMAT': 'text', 'REQUEST_LOG': 'true'},
+    'production_json': {'LOG_LEVEL': 'WARNING', 'LOG_FORMAT': 'json', 'REQUEST_LOG': 'true'},
+    'silent': {'LOG_LEVEL': 'CRITICAL', 'LOG_FORMAT': 'text', 'REQUEST_LOG': 'false'},
+}
+
+ROUTES = ('upload', 'regenerate')
+
+def _request(client, route, upload_bytes):
+    if route == 'upload':
+        return client.post('/upload', data={'image': (io.BytesIO(upload_bytes), 'bench.jpg')},
+                           content_type='multipart/form-data')
+    return client.post('/regenerate', json={'prompt': ''})
+
+def _run_mode(config, queue):
+    workdir = config['workdir']
+    os.chdir(workdir)
+    os.environ.update(MODES[config['mode']])
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+
+    # Log output is written for real, but not to the terminal
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 2)
+
+    from services.gemini_client import set_transport, FakeTransport
+    set_transport(FakeTransport())
+    import main
+    main.migrate()
+
+    upload_bytes = make_test_jpeg(*config['size'])
+    client = main.app.test_client()
+    _request(client, 'upload', upload_bytes)
+
+    routes = {}
+    for route in ROUTES:
+        # Warm up, then measure CPU time
+        for _ in range(5):
+            _request(client, route, upload_bytes)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        for _ in range(config['requests']):
+            _request(client, route, upload_bytes)
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        # Separate pass for the memory each request allocates at its peak
+        allocation_requests = max(1, config['requests'] // 10)
+        peaks = []
+        tracemalloc.start()
+        for _ in range(allocation_requests):
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _request(client, route, upload_bytes)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+        routes[route] = {
+            'cpu_ms_per_request': round(cpu / config['requests'] * 1000, 3),
+            'wall_ms_per_request': round(wall / config['requests'] * 1000, 3),
+            'peak_alloc_kb_per_request': round(sum(peaks) / len(peaks) / 1024, 1),
+        }
+
+    queue.put({'mode': config['mode'], 'env': MODES[config['mode']], 'routes': routes})
+
+def run(requests_total, size, modes):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for mode in modes:
+        with tempfile.TemporaryDirectory() as workdir:
+            queue = context.Queue()
+            config = {'workdir': workdir, 'mode': mode, 'requests': requests_total, 'size': size}
+            process = context.Process(target=_run_mode, args=(config, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--size', default='1920x1080')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    size = tuple(int(part) for part in args.size.split('x'))
+    modes = [mode for mode in args.modes.split(',') if mode]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+    print(json.dumps({'benchmark': 'logging', 'results': run(args.requests, size, modes)}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Benchmark the upload -> story -> speech pipeline end to end, offline.
+
+The Flask app (main:app) is driven through its test client with a fake
+Gemini transport, a fake gTTS backend and a throwaway SQLite database.
+For every image size and concurrency level the harness reports, per route
+(/upload, /regenerate, /generate-speech, /stories), latency percentiles,
+throughput, per-stage timings and peak RSS. Each scenario runs in a fresh
+child process so peak RSS is not inherited. Results are printed as JSON.
+
+The analysis cache is disabled unless --analysis-cache is given, and every
+speech request uses unique text, so each request does the full work.
+
+Usage:
+    python -m benchmarks.bench_pipeline [--sizes 4032x3024,1920x1080] [--concurrency 1,4,16]
+        [--requests 40] [--gemini-latency 0.2] [--tts-latency 0.1] [--output results.json]
+        [--fused] [--baseline previous.json --max-regression 0.2]
+"""
+import os
+import io
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import functools
+import multiprocessing
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_image_processing import make_test_jpeg, reset_peak_rss, peak_rss_kb
+
+ROUTES = ('upload', 'regenerate', 'generate-speech', 'stories')
+
+# Functions timed as pipeline stages: stage name -> (module, attribute)
+STAGES = {
+    'process_image': ('services.image_service', 'process_image'),
+    'save_image': ('utils.file_utils', 'save_image'),
+    'load_image': ('utils.file_utils', 'load_image'),
+    'analyze_image': ('services.ai_service', 'analyze_image'),
+    'generate_story': ('services.ai_service', 'generate_story'),
+    'generate_fused': ('services.ai_service', 'generate_fused'),
+    'save_story': ('services.db_service', 'save_story'),
+    'update_story_audio': ('services.db_service', 'update_story_audio'),
+    'synthesize_segment': ('services.tts_service', 'synthesize_segment'),
+    'generate_speech': ('services.tts_service', 'generate_speech'),
+    'get_stories_page': ('services.db_service', 'get_stories_page'),
+}
+
+STORY_TEXT = ("The little dog watched the red kite climb into the sky. It barked twice and ran after it. "
+              "All afternoon it chased the shadow across the meadow, until the wind fell quiet.")
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(durations):
+    """Summarize durations in seconds as milliseconds."""
+    values = sorted(durations)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values) * 1000, 2),
+        'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2),
+    }
+
+class StageTimer:
+    """Records how long each patched stage function takes, attributed to the route being measured."""
+
+    def __init__(self):
+        self.route = None
+        self.timings = defaultdict(lambda: defaultdict(list))
+        self._lock = threading.Lock()
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.timings[self.route][stage].append(elapsed)
+        return timed
+
+    def install(self, app_module):
+        import importlib
+        for stage, (module_name, attribute) in STAGES.items():
+            module = importlib.import_module(module_name)
+            timed = self.wrap(stage, getattr(module, attribute))
+            setattr(module, attribute, timed)
+            # Names imported into app.py at module level must be patched there too
+            if getattr(app_module, attribute, None) is not None:
+                setattr(app_module, attribute, timed)
+
+def _fake_synthesize_segment(latency):
+    def synthesize_segment(text, lang='en', slow=False):
+        time.sleep(latency)
+        # Roughly the size of real gTTS output: ~1 KB of MP3 per 10 characters
+        return b'\xff\xf3' * (len(text) * 50)
+    return synthesize_segment
+
+def _post_upload(client, upload_bytes):
+    return client.post('/upload', data={'image': (io.BytesIO(upload_bytes), 'bench.jpg')},
+                       content_type='multipart/form-data')
+
+def _run_route(route, clients, upload_bytes, requests_total, counter):
+    """Issue requests_total requests to a route from one thread per client."""
+    durations = []
+    errors = []
+    lock = threading.Lock()
+    remaining = [requests_total]
+
+    def worker(client):
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            if route == 'upload':
+                response = _post_upload(client, upload_bytes)
+            elif route == 'regenerate':
+                response = client.post('/regenerate', json={'prompt': ''})
+            elif route == 'generate-speech':
+                # Unique text so every request synthesizes instead of hitting the audio cache
+                response = client.post('/generate-speech', json={'text': f"{STORY_TEXT} Request {next(counter)}."})
+            else:
+                response = client.get('/stories')
+            elapsed = time.perf_counter() - start
+            with lock:
+                durations.append(elapsed)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    return durations, errors, wall
+
+def _run_scenario(config, queue):
+    import itertools
+
+    workdir = config['workdir']
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+    if not config['analysis_cache']:
+        os.environ['ANALYSIS_CACHE_BACKEND'] = 'none'
+    os.environ['FUSED_GENERATION'] = 'true' if config['fused'] else 'false'
+
+    from services.gemini_client import set_transport, FakeTransport
+    set_transport(FakeTransport(latency=config['gemini_latency'], jitter=config['gemini_jitter']))
+
+    import main
+    import app as app_module
+    main.migrate()
+    logging.getLogger().setLevel(config['log_level'])
+
+    timer = StageTimer()
+    timer.install(app_module)
+    import services.tts_service as tts_service
+    tts_service.synthesize_segment = timer.wrap('synthesize_segment',
+                                                _fake_synthesize_segment(config['tts_latency']))
+
+    upload_bytes = make_test_jpeg(*config['size'])
+    clients = [main.app.test_client() for _ in range(config['concurrency'])]
+    # Every client needs an uploaded image in its session before it can regenerate
+    for client in clients:
+        _post_upload(client, upload_bytes)
+
+    counter = itertools.count()
+    routes = {}
+    for route in config['routes']:
+        timer.route = route
+        reset_peak_rss()
+        durations, errors, wall = _run_route(route, clients, upload_bytes, config['requests'], counter)
+        routes[route] = {
+            'latency': summarize(durations),
+            'throughput_rps': round(len(durations) / wall, 2) if wall else None,
+            'errors': len(errors),
+            'peak_rss_kb': peak_rss_kb(),
+            'stages': {stage: summarize(values) for stage, values in sorted(timer.timings[route].items())},
+        }
+
+    queue.put({
+        'size': f"{config['size'][0]}x{config['size'][1]}",
+        'upload_kb': round(len(upload_bytes) / 1024, 1),
+        'concurrency': config['concurrency'],
+        'routes': routes,
+    })
+
+def run(sizes, concurrency_levels, requests_total, routes, gemini_latency, gemini_jitter, tts_latency,
+        analysis_cache=False, log_level='WARNING', fused=False):
+    context = multiprocessing.get_context('spawn')
+    scenarios = []
+    for size in sizes:
+        for concurrency in concurrency_levels:
+            with tempfile.TemporaryDirectory() as workdir:
+                config = {
+                    'workdir': workdir,
+                    'size': size,
+                    'concurrency': concurrency,
+                    'requests': requests_total,
+                    'routes': routes,
+                    'gemini_latency': gemini_latency,
+                    'gemini_jitter': gemini_jitter,
+                    'tts_latency': tts_latency,
+                    'analysis_cache': analysis_cache,
+                    'log_level': log_level,
+                    'fused': fused,
+                }
+                queue = context.Queue()
+                process = context.Process(target=_run_scenario, args=(config, queue))
+                process.start()
+                scenarios.append(queue.get())
+                process.join()
+    return scenarios
+
+def _scenario_key(scenario):
+    return (scenario['size'], scenario['concurrency'])
+
+def find_regressions(results, baseline, max_regression):
+    """
+    Compare p95 latency against a previous run.
+
+    Returns:
+        List of human-readable regression descriptions
+    """
+    previous = {_scenario_key(scenario): scenario for scenario in baseline['scenarios']}
+    regressions = []
+    for scenario in results['scenarios']:
+        old = previous.get(_scenario_key(scenario))
+        if old is None:
+            continue
+        for route, stats in scenario['routes'].items():
+            old_p95 = old['routes'].get(route, {}).get('latency', {}).get('p95_ms')
+            new_p95 = stats['latency'].get('p95_ms')
+            if old_p95 and new_p95 and new_p95 > old_p95 * (1 + max_regression):
+                regressions.append(f"{route} {scenario['size']} c={scenario['concurrency']}: "
+                                   f"p95 {old_p95}ms -> {new_p95}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='4032x3024,1920x1080')
+    parser.add_argument('--concurrency', default='1,4,16')
+    parser.add_argument('--requests', type=int, default=40, help='Requests per route and scenario')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='Seconds per fake Gemini call')
+    parser.add_argument('--gemini-jitter', type=float, default=0.05)
+    parser.add_argument('--tts-latency', type=float, default=0.1, help='Seconds per fake gTTS segment')
+    parser.add_argument('--analysis-cache', action='store_true', help='Leave the analysis cache enabled')
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--fused', action='store_true', help='Analyze and write stories in one fused call')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results of a previous run to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed relative p95 increase before the run fails')
+    args = parser.parse_args()
+
+    sizes = [tuple(int(part) for part in size.split('x')) for size in args.sizes.split(',')]
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    routes = [route for route in args.routes.split(',') if route]
+    unknown = set(routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(sorted(unknown))}")
+
+    results = {
+        'benchmark': 'pipeline',
+        'settings': {
+            'requests': args.requests,
+            'gemini_latency': args.gemini_latency,
+            'gemini_jitter': args.gemini_jitter,
+            'tts_latency': args.tts_latency,
+            'analysis_cache': args.analysis_cache,
+            'fused': args.fused,
+        },
+        'scenarios': run(sizes, concurrency_levels, args.requests, routes, args.gemini_latency,
+                         args.gemini_jitter, args.tts_latency, args.analysis_cache, args.log_level,
+                         args.fused),
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Measure story search latency over a large archive.
+
+Fills a throwaway database (SQLite, or --database-url, e.g. an empty
+Postgres scratch database) with synthetic English and Chinese stories,
+builds the search index from scratch, then reports:
+
+  - how long the bulk index build takes
+  - save_story latency, which now includes incremental indexing
+  - search_stories latency per query kind, through the index
+  - the same queries as unindexed substring scans, for comparison
+
+Results are printed as JSON.
+
+Usage:
+    python -m benchmarks.bench_search [--stories 100000] [--queries 100] [--scan-queries 5]
+        [--database-url postgresql://localhost/scratch]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_pipeline import summarize
+
+EN_SYLLABLES = "ka lo mi ren tor sha vel dun bri qua zen fi mor ath ell wyn gar pol ist nu".split()
+VOCABULARY_SIZE = 20000
+STORY_WORDS = 150
+ANALYSIS_WORDS = 40
+
+def make_vocabulary(rng):
+    """
+    Build synthetic English and Chinese vocabularies, most frequent first.
+
+    Words are drawn with Zipf-like frequencies, so a few are in most stories
+    and most are rare, as in real text.
+    """
+    english = set()
+    while len(english) < VOCABULARY_SIZE:
+        english.add(''.join(rng.choice(EN_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    chinese = set()
+    while len(chinese) < VOCABULARY_SIZE:
+        # Two- to three-character words from the 3000 most common CJK code points
+        chinese.add(''.join(chr(0x4e00 + rng.randrange(3000)) for _ in range(rng.randint(2, 3))))
+    weights = [1 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+    cumulative = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return sorted(english), sorted(chinese), cumulative
+
+def pick_words(rng, words, cumulative, count):
+    return rng.choices(words, cum_weights=cumulative, k=count)
+
+# Query kind -> function building a query from a random generator and the vocabularies
+QUERIES = {
+    'en_common': lambda rng, en, zh: rng.choice(en[:50]),
+    'en_rare': lambda rng, en, zh: rng.choice(en[1000:]),
+    'en_two_words': lambda rng, en, zh: f"{rng.choice(en[:1000])} {rng.choice(en[:1000])}",
+    'zh_word': lambda rng, en, zh: rng.choice(zh[:5000]),
+    'zh_char': lambda rng, en, zh: rng.choice(rng.choice(zh[:5000])),
+    'no_match': lambda rng, en, zh: 'xyzzy',
+}
+
+def make_story(rng, index, vocabulary):
+    """A synthetic story row; every third one is Chinese."""
+    english, chinese, cumulative = vocabulary
+    if index % 3 == 2:
+        words = pick_words(rng, chinese, cumulative, STORY_WORDS)
+        return {'content': '，'.join(''.join(words[i:i + 4]) for i in range(0, len(words), 4)) + '。',
+                'image_analysis': ''.join(pick_words(rng, chinese, cumulative, ANALYSIS_WORDS)),
+                'prompt': pick_words(rng, chinese, cumulative, 1)[0] if rng.random() < 0.3 else None}
+    words = pick_words(rng, english, cumulative, STORY_WORDS)
+    return {'content': ' '.join(words).capitalize() + '.',
+            'image_analysis': ' '.join(pick_words(rng, english, cumulative, ANALYSIS_WORDS)),
+            'prompt': pick_words(rng, english, cumulative, 1)[0] if rng.random() < 0.3 else None}
+
+def populate(db, Story, count, batch_size, rng, vocabulary):
+    """Bulk insert stories without indexing them."""
+    from datetime import datetime, timedelta
+    start_time = datetime.utcnow() - timedelta(seconds=count)
+    for offset in range(0, count, batch_size):
+        rows = []
+        for index in range(offset, min(count, offset + batch_size)):
+            row = make_story(rng, index, vocabulary)
+            row['excerpt'] = Story.make_excerpt(row['content'])
+            row['created_at'] = start_time + timedelta(seconds=index)
+            rows.append(row)
+        db.session.execute(db.insert(Story), rows)
+        db.session.commit()
+
+def time_queries(fn, kind, count, rng, vocabulary):
+    durations = []
+    results = []
+    for _ in range(count):
+        query = QUERIES[kind](rng, vocabulary[0], vocabulary[1])
+        start = time.perf_counter()
+        found = fn(query)
+        durations.append(time.perf_counter() - start)
+        results.append(found)
+    return durations, results
+
+def run(stories_total, queries, scan_queries, batch_size, database_url, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(rng)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ.setdefault('SESSION_SECRET', 'benchmark')
+        os.environ['IMAGE_GC_INTERVAL'] = '0'
+
+        import logging
+        import main
+        from app import db
+        from models import Story
+        from services.db_service import save_story
+        from services import search_service
+        logging.getLogger().setLevel(logging.WARNING)
+        main.migrate()
+
+        with main.app.app_context():
+            results = {'database': db.engine.dialect.name, 'stories': stories_total}
+            start = time.perf_counter()
+            populate(db, Story, stories_total, batch_size, rng, vocabulary)
+            results['insert_s'] = round(time.perf_counter() - start, 2)
+
+            start = time.perf_counter()
+            indexed = search_service.ensure_search_index(batch_size)
+            results['index_build_s'] = round(time.perf_counter() - start, 2)
+            results['indexed'] = indexed
+            if db.engine.dialect.name == 'sqlite':
+                results['database_mb'] = round(os.path.getsize(os.path.join(workdir, 'bench.db')) / 1e6, 1)
+
+            durations = []
+            for index in range(queries):
+                row = make_story(rng, index, vocabulary)
+                start = time.perf_counter()
+                save_story(**row)
+                durations.append(time.perf_counter() - start)
+            results['save_story'] = summarize(durations)
+
+            results['search'] = {}
+            for kind in QUERIES:
+                durations, found = time_queries(lambda query: search_service.search_stories(query)[0],
+                                                kind, queries, rng, vocabulary)
+                results['search'][kind] = dict(summarize(durations),
+                                               mean_results=round(sum(map(len, found)) / len(found), 1))
+
+            results['scan'] = {}
+            for kind in QUERIES:
+                durations, _ = time_queries(
+                    lambda query: search_service._scan_stories(query, search_service.SEARCH_PAGE_SIZE + 1, 0),
+                    kind, scan_queries, rng, vocabulary)
+                results['scan'][kind] = summarize(durations)
+
+        return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stories', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100, help='Searches (and saves) per query kind')
+    parser.add_argument('--scan-queries', type=int, default=5, help='Unindexed scans per query kind')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--database-url', help='Empty scratch database to fill instead of a temporary SQLite file')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = run(args.stories, args.queries, args.scan_queries, args.batch_size, args.database_url, args.seed)
+    print(json.dumps({'benchmark': 'search', 'results': results}, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# Gunicorn loads this file from the working directory by default
+
+def on_starting(server):
+    # Migrate once in the master process, before any worker is forked
+    import main
+    main.migrate()
@@ -1,11 +1,77 @@
+import threading
+
+import click
+
 from app import app, db  # noqa: F401
 
 # Import the models to ensure they are registered with SQLAlchemy
 import models  # noqa: F401
+from services.tts_service import set_audio_eviction_handler
+
+def migrate():
+    """
+    Create all database tables, bring existing ones up to date and backfill their data.
+
+    Run once per deployment before the workers start: `flask --app main migrate`,
+    or the on_starting hook in gunicorn.conf.py. Every step is idempotent.
+    """
+    from utils.schema_utils import upgrade_schema, drop_obsolete_tables
+    from services.db_service import backfill_story_excerpts, backfill_story_images, backfill_story_analyses
+    from services.storage_service import migrate_legacy_images
+    from services.search_service import ensure_search_index
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db)
+        drop_obsolete_tables(db)
+        backfill_story_excerpts()
+        # The search index must exist before linked stories index their images' analyses
+        ensure_search_index()
+        backfill_story_images()
+        backfill_story_analyses()
+        migrate_legacy_images()
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create and upgrade the database schema."""
+    migrate()
+    click.echo("Database is up to date")
+
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background_services():
+    """
+    Start this process's background threads: the image collector and the write-behind queue.
+
+    Threads do not survive a fork, so each worker starts its own, on its
+    first request rather than at import. Only the first call in a process
+    starts them.
+    """
+    global _background_started
+    if _background_started:
+        return
+    from services.db_service import start_write_behind
+    from services.storage_service import start_image_gc
+
+    with _background_lock:
+        if not _background_started:
+            start_image_gc(app)
+            start_write_behind(app)
+            _background_started = True
+
+@app.before_request
+def ensure_background_services():
+    start_background_services()
+
+def release_audio(audio_path):
+    from services.db_service import clear_story_audio
+    # Evictions happen on TTS worker threads, outside any request
+    with app.app_context():
+        clear_story_audio(audio_path)
 
-# Create all database tables
-with app.app_context():
-    db.create_all()
+set_audio_eviction_handler(release_audio)
 
 if __name__ == "__main__":
+    migrate()
     app.run(host="0.0.0.0", port=5000, debug=True)
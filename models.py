@@ -1,30 +1,121 @@
 from datetime import datetime
 from app import db
 
+# Number of characters of a story shown in listings
+EXCERPT_LENGTH = 200
+
+class Image(db.Model):
+    """Model for an uploaded image, shared by every story generated from it."""
+    
+    id = db.Column(db.String(64), primary_key=True)  # SHA-256 of the processed image bytes
+    path = db.Column(db.String(500), nullable=False)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    stories = db.relationship('Story', back_populates='image', lazy='dynamic')
+    analyses = db.relationship('ImageAnalysis', back_populates='image', cascade='all, delete-orphan')
+    
+    def __repr__(self):
+        return f'<Image {self.id}>'
+
+class ImageAnalysis(db.Model):
+    """
+    Model for one analysis of an image in one language.
+    
+    Analyses are never changed: re-analyzing an image adds a new one, and
+    each story keeps pointing at the analysis it was written from.
+    """
+    
+    # Supersedes the image_analysis table, which held one analysis per image and language
+    __tablename__ = 'image_analysis_version'
+    __table_args__ = (
+        # Finds the latest analysis of an image in a language
+        db.Index('ix_image_analysis_version_image_language', 'image_id', 'language', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    image_id = db.Column(db.String(64), db.ForeignKey('image.id', ondelete='CASCADE'), nullable=False)
+    language = db.Column(db.String(10), nullable=False)
+    analysis = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    image = db.relationship('Image', back_populates='analyses')
+    
+    def __repr__(self):
+        return f'<ImageAnalysis {self.id}: {self.image_id} ({self.language})>'
+
 class Story(db.Model):
     """Model for storing generated stories."""
     
+    __table_args__ = (
+        # Supports keyset pagination over (created_at, id), newest first
+        db.Index('ix_story_created_at_id', 'created_at', 'id'),
+        # Supports listing the versions of a story generated from one image
+        db.Index('ix_story_image_id_created_at', 'image_id', 'created_at', 'id'),
+        # Finds the stories narrated by an audio file when it is evicted
+        db.Index('ix_story_audio_path', 'audio_path'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=True)
     content = db.Column(db.Text, nullable=False)
+    excerpt = db.Column(db.String(EXCERPT_LENGTH + 3), nullable=True)
+    # Legacy: the analysis of stories saved before images were stored; newer stories point at theirs
     image_analysis = db.Column(db.Text, nullable=True)
+    image_id = db.Column(db.String(64), db.ForeignKey('image.id'), nullable=True)
+    analysis_id = db.Column(db.Integer, db.ForeignKey('image_analysis_version.id'), nullable=True)
+    language = db.Column(db.String(10), nullable=True)
     image_path = db.Column(db.String(500), nullable=True)
     audio_path = db.Column(db.String(500), nullable=True)
     prompt = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    image = db.relationship('Image', back_populates='stories')
+    stored_analysis = db.relationship('ImageAnalysis')
+    
     def __repr__(self):
         return f'<Story {self.id}: {self.title or "Untitled"}>'
     
+    @staticmethod
+    def make_excerpt(content):
+        """Build the listing excerpt for story content."""
+        if len(content) > EXCERPT_LENGTH:
+            return content[:EXCERPT_LENGTH] + '...'
+        return content
+    
+    @property
+    def analysis(self):
+        """The analysis of the image the story was written from."""
+        if self.stored_analysis is not None:
+            return self.stored_analysis.analysis
+        return self.image_analysis
+    
     def to_dict(self):
         """Convert story to dictionary."""
         return {
             'id': self.id,
             'title': self.title,
             'content': self.content,
-            'image_analysis': self.image_analysis,
+            'excerpt': self.excerpt,
+            'image_analysis': self.analysis,
+            'image_id': self.image_id,
+            'language': self.language,
             'image_path': self.image_path,
             'audio_path': self.audio_path,
             'prompt': self.prompt,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class JobRecord(db.Model):
+    """Model for the latest state of a background job, so any instance can report it."""
+    
+    __tablename__ = 'job'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    snapshot = db.Column(db.Text, nullable=False)  # JSON of Job.to_dict()
+    version = db.Column(db.Integer, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    def __repr__(self):
+        return f'<JobRecord {self.id}>'
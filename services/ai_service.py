@@ -1,7 +1,14 @@
 import os
 import json
+import asyncio
 import logging
 import google.generativeai as genai
+from services.cache_service import make_analysis_key, get_cached_analysis, store_analysis
+from services.encoding_service import image_mime_type
+from services.gemini_client import get_gemini_client
+from services.context_cache_service import CONTEXT_CACHE_MODEL, get_story_context, invalidate_context, is_cacheable
+from services.metrics_service import timed_stage, observe_payload, record_cache_lookup, record_error
+from utils.concurrency_utils import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -13,69 +20,244 @@ genai.configure(api_key=GOOGLE_API_KEY)
 IMAGE_MODEL = "gemini-2.0-flash"  # Gemini's multimodal model for image processing
 TEXT_MODEL = "gemini-2.0-flash"  # Gemini's model for text generation
 
-def analyze_image(base64_image, language="en"):
+# Generation settings for stories
+STORY_GENERATION_CONFIG = {
+    "temperature": 0.9,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 1000,
+}
+
+# Request sent after a cached story context when there are no custom instructions
+STORY_REQUEST_WITHOUT_INSTRUCTIONS = {
+    'en': "Write the story now.",
+    'zh': "现在请写这个故事。",
+}
+
+# Ask the multimodal model for the analysis and the story in one call by default
+FUSED_GENERATION = os.environ.get("FUSED_GENERATION", "false").lower() in ("1", "true", "yes")
+
+# Structured output settings for fused generation; the analysis is shorter than the story
+FUSED_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "image_analysis": {"type": "string"},
+        "story": {"type": "string"},
+    },
+    "required": ["image_analysis", "story"],
+}
+FUSED_GENERATION_CONFIG = dict(
+    STORY_GENERATION_CONFIG,
+    max_output_tokens=2000,
+    response_mime_type="application/json",
+    response_schema=FUSED_RESPONSE_SCHEMA,
+)
+
+class InvalidFusedResponse(ValueError):
+    """Raised when a fused response does not match FUSED_RESPONSE_SCHEMA."""
+
+def _build_analysis_prompt(language="en"):
+    """
+    Build the image analysis prompt for a language.
+
+    Args:
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        The prompt string
+    """
+    if language == "zh":
+        return """
+            详细分析这张图片。识别关键元素、场景设置、人物、活动、情感、颜色以及任何值得注意或有趣的方面。
+            提供一个全面的描述，可以用于创意讲故事。请使用中文回答。
+            """
+    return """
+            Analyze this image in detail. Identify the key elements, settings, people,
+            activities, emotions, colors, and any notable or interesting aspects.
+            Provide a comprehensive description that could be used for creative storytelling.
+            """
+
+# Identical concurrent requests share one upstream call
+_analysis_flight = SingleFlight('analyze_image')
+
+def analyze_image(image_bytes, language="en", force_refresh=False):
     """
     Analyze an image using Google's Gemini Flash capabilities.
 
+    Analyses are cached by image content, language and model, so the same
+    image is only sent to the vision model once, and concurrent requests
+    for the same analysis wait for the first one.
+
     Args:
-        base64_image: Base64 encoded image
+        image_bytes: Encoded image bytes from process_image
         language: Language code ('en' for English, 'zh' for Chinese)
+        force_refresh: Skip the cache lookup and request a fresh analysis
+
+    Returns:
+        String containing analysis of the image
+    """
+    key = (make_analysis_key(image_bytes, language, IMAGE_MODEL), force_refresh)
+    return _analysis_flight.do(key, _analyze_image, image_bytes, language, force_refresh)
+
+def _analyze_image(image_bytes, language="en", force_refresh=False):
+    """
+    Analyze an image, using the analysis cache.
+
+    Args:
+        image_bytes: Encoded image bytes from process_image
+        language: Language code ('en' for English, 'zh' for Chinese)
+        force_refresh: Skip the cache lookup and request a fresh analysis
 
     Returns:
         String containing analysis of the image
     """
     try:
+        cache_key = make_analysis_key(image_bytes, language, IMAGE_MODEL)
+        if not force_refresh:
+            cached_analysis = get_cached_analysis(cache_key)
+            record_cache_lookup('analysis', cached_analysis is not None)
+            if cached_analysis is not None:
+                logger.debug("Using cached image analysis")
+                return cached_analysis
+
         # Log the start of image analysis and API key status
-        logger.info(f"Starting image analysis with model {IMAGE_MODEL}")
-        logger.info(f"API Key configured: {bool(GOOGLE_API_KEY)}")
+        logger.debug("Starting image analysis with model %s", IMAGE_MODEL)
+        logger.debug("API Key configured: %s", bool(GOOGLE_API_KEY))
 
         # Log image size to help diagnose memory issues
-        image_size_kb = len(base64_image) / 1024
-        logger.info(f"Processing image of size: {image_size_kb:.2f} KB")
-
-        if image_size_kb > 1000:
-            logger.warning(f"Large image detected ({image_size_kb:.2f} KB). This may cause memory issues.")
+        observe_payload('vision_request', len(image_bytes))
+        image_size_kb = len(image_bytes) / 1024
+        logger.debug("Processing image of size: %.2f KB", image_size_kb)
 
-        # Initialize the model
-        logger.info("Initializing Gemini model")
-        model = genai.GenerativeModel(IMAGE_MODEL)
+        if image_size_kb > 750:
+            logger.warning("Large image detected (%.2f KB). This may cause memory issues.", image_size_kb)
 
         image_parts = [
             {
-                "mime_type": "image/jpeg",
-                "data": base64_image
+                "mime_type": image_mime_type(image_bytes),
+                "data": image_bytes
             }
         ]
 
         # Dynamic prompt based on language
-        logger.info(f"Using language: {language}")
-        if language == "zh":
-            prompt = """
-            详细分析这张图片。识别关键元素、场景设置、人物、活动、情感、颜色以及任何值得注意或有趣的方面。
-            提供一个全面的描述，可以用于创意讲故事。请使用中文回答。
-            """
-        else:
-            prompt = """
-            Analyze this image in detail. Identify the key elements, settings, people,
-            activities, emotions, colors, and any notable or interesting aspects.
-            Provide a comprehensive description that could be used for creative storytelling.
-            """
+        logger.debug("Using language: %s", language)
+        prompt = _build_analysis_prompt(language)
 
         # Log before API call
-        logger.info("Sending request to Gemini API")
+        logger.debug("Sending request to Gemini API")
         try:
-            response = model.generate_content([prompt, image_parts[0]])
-            logger.info("Successfully received response from Gemini API")
-            return response.text
+            with timed_stage('analyze_image'):
+                analysis = get_gemini_client().generate(IMAGE_MODEL, [prompt, image_parts[0]])
+            logger.debug("Successfully received response from Gemini API")
+            store_analysis(cache_key, analysis)
+            return analysis
         except Exception as api_error:
-            logger.error(f"Gemini API error: {str(api_error)}", exc_info=True)
+            logger.error("Gemini API error: %s", api_error, exc_info=True)
             # Re-raise with more context
             raise Exception(f"Gemini API error: {str(api_error)}")
 
     except Exception as e:
-        logger.error(f"Error analyzing image: {str(e)}", exc_info=True)
+        logger.error("Error analyzing image: %s", e, exc_info=True)
         raise Exception(f"Failed to analyze the image: {str(e)}")
 
+def _story_prompt_parts(image_analysis, custom_prompt="", language="en"):
+    """
+    Build the parts of a story request.
+
+    The system prompt and context prompt only depend on the image analysis,
+    so they can be cached and shared by regenerations; the instructions
+    carry the custom prompt and come last, so regenerations of an image
+    also share the longest possible prompt prefix.
+
+    Args:
+        image_analysis: Text description of the image
+        custom_prompt: Optional custom instructions for the story
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        Tuple containing (system_prompt, context_prompt, instructions)
+    """
+    # Log the start of story generation
+    logger.debug("Starting story generation with model %s", TEXT_MODEL)
+    logger.debug("Using language: %s, Custom prompt: %s", language, bool(custom_prompt))
+
+    # Log the length of the image analysis
+    analysis_length = len(image_analysis) if image_analysis else 0
+    logger.debug("Image analysis length: %s characters", analysis_length)
+
+    # Prepare the prompt based on language
+    if language == "zh":
+        system_prompt = """
+        你是一位专业的创意作家，擅长根据图像描述生成引人入胜的故事。
+        创作生动的叙述，包含引人入胜的角色和有趣的情节。请使用中文回答。
+        """
+
+        prompt = f"""
+        根据以下图像分析，创作一个引人入胜、富有创意且结构完整的短篇故事（约300-500字）。
+        故事应该有清晰的开头、中间和结尾，包含有趣的角色和叙事。
+
+        图像分析: {image_analysis}
+        """
+
+        # Add custom prompt if provided
+        instructions = ""
+        if custom_prompt:
+            instructions = f"\n\n故事的额外指示: {custom_prompt}"
+            logger.debug("Added custom prompt in Chinese")
+    else:
+        system_prompt = """
+        You are a creative writer specializing in generating engaging stories from image descriptions.
+        Create vivid narratives with compelling characters and interesting plots.
+        """
+
+        prompt = f"""
+        Based on the following image analysis, create an engaging, creative, and
+        well-structured short story (around 300-500 words). The story should have
+        a clear beginning, middle, and end, with interesting characters and narrative.
+
+        Image analysis: {image_analysis}
+        """
+
+        # Add custom prompt if provided
+        instructions = ""
+        if custom_prompt:
+            instructions = f"\n\nAdditional instructions for the story: {custom_prompt}"
+            logger.debug("Added custom prompt in English")
+
+    return system_prompt, prompt, instructions
+
+def _story_request(prompt_parts, image_analysis, language="en"):
+    """
+    Build the keyword arguments of a story request to the Gemini client.
+
+    When the story context is large enough to cache, the system prompt and
+    image analysis are sent once as cached content and each request only
+    carries the custom instructions.
+
+    Args:
+        prompt_parts: Tuple returned by _story_prompt_parts
+        image_analysis: Text description of the image
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        Tuple containing (request, fallback): the request to send, and the
+        uncached request to retry with if the cached content is gone
+    """
+    system_prompt, context_prompt, instructions = prompt_parts
+    uncached = {'model_name': TEXT_MODEL, 'contents': context_prompt + instructions,
+                'system_instruction': system_prompt, 'generation_config': STORY_GENERATION_CONFIG}
+
+    cached_content = get_story_context(system_prompt, context_prompt, image_analysis, language)
+    if cached_content is None:
+        return uncached, None
+
+    logger.debug("Using cached story context %s", cached_content)
+    contents = instructions.strip() or STORY_REQUEST_WITHOUT_INSTRUCTIONS.get(
+        language, STORY_REQUEST_WITHOUT_INSTRUCTIONS['en'])
+    request = {'model_name': CONTEXT_CACHE_MODEL, 'contents': contents,
+               'generation_config': STORY_GENERATION_CONFIG, 'cached_content': cached_content}
+    return request, uncached
+
 def generate_story(image_analysis, custom_prompt="", language="en"):
     """
     Generate a creative story based on image analysis using Google's Gemini.
@@ -89,112 +271,410 @@ def generate_story(image_analysis, custom_prompt="", language="en"):
         String containing the generated story
     """
     try:
-        # Log the start of story generation
-        logger.info(f"Starting story generation with model {TEXT_MODEL}")
-        logger.info(f"Using language: {language}, Custom prompt: {bool(custom_prompt)}")
-
-        # Log the length of the image analysis
-        analysis_length = len(image_analysis) if image_analysis else 0
-        logger.info(f"Image analysis length: {analysis_length} characters")
-
-        # Initialize the model
-        logger.info("Initializing Gemini model for story generation")
-        model = genai.GenerativeModel(TEXT_MODEL)
-
-        # Prepare the prompt based on language
-        if language == "zh":
-            system_prompt = """
-            你是一位专业的创意作家，擅长根据图像描述生成引人入胜的故事。
-            创作生动的叙述，包含引人入胜的角色和有趣的情节。请使用中文回答。
-            """
+        story_request, fallback = _story_request(_story_prompt_parts(image_analysis, custom_prompt, language),
+                                                 image_analysis, language)
 
-            prompt = f"""
-            根据以下图像分析，创作一个引人入胜、富有创意且结构完整的短篇故事（约300-500字）。
-            故事应该有清晰的开头、中间和结尾，包含有趣的角色和叙事。
+        # Send the prompt with the system prompt as the model's system instruction
+        logger.debug("Sending message to Gemini API for story generation")
+        try:
+            with timed_stage('generate_story'):
+                try:
+                    story = get_gemini_client().generate(**story_request)
+                except Exception as cache_error:
+                    if fallback is None:
+                        raise
+                    logger.warning("Cached story context failed, sending the full prompt: %s", cache_error)
+                    invalidate_context(story_request['cached_content'])
+                    story = get_gemini_client().generate(**fallback)
+            logger.debug("Successfully received story from Gemini API")
+            return story
+        except Exception as api_error:
+            logger.error("Gemini API error during story generation: %s", api_error, exc_info=True)
+            raise Exception(f"Gemini API error during story generation: {str(api_error)}")
 
-            图像分析: {image_analysis}
-            """
+    except Exception as e:
+        logger.error("Error generating story: %s", e, exc_info=True)
+        raise Exception(f"Failed to generate a story: {str(e)}")
 
-            # Add custom prompt if provided
-            if custom_prompt:
-                prompt += f"\n\n故事的额外指示: {custom_prompt}"
-                logger.info("Added custom prompt in Chinese")
-        else:
-            system_prompt = """
-            You are a creative writer specializing in generating engaging stories from image descriptions.
-            Create vivid narratives with compelling characters and interesting plots.
-            """
+def generate_story_stream(image_analysis, custom_prompt="", language="en"):
+    """
+    Generate a creative story, yielding text chunks as Gemini streams them.
 
-            prompt = f"""
-            Based on the following image analysis, create an engaging, creative, and
-            well-structured short story (around 300-500 words). The story should have
-            a clear beginning, middle, and end, with interesting characters and narrative.
+    Args:
+        image_analysis: Text description of the image
+        custom_prompt: Optional custom instructions for the story
+        language: Language code ('en' for English, 'zh' for Chinese)
 
-            Image analysis: {image_analysis}
-            """
+    Yields:
+        Successive text chunks of the generated story
+    """
+    try:
+        story_request, fallback = _story_request(_story_prompt_parts(image_analysis, custom_prompt, language),
+                                                 image_analysis, language)
 
-            # Add custom prompt if provided
-            if custom_prompt:
-                prompt += f"\n\nAdditional instructions for the story: {custom_prompt}"
-                logger.info("Added custom prompt in English")
-
-        # Configure the generation settings
-        logger.info("Configuring generation settings")
-        generation_config = {
-            "temperature": 0.9,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 1000,
-        }
-
-        # Create a chat session for better context handling
-        logger.info("Creating chat session")
-        chat = model.start_chat(history=[
-            {"role": "user", "parts": [system_prompt]},
-        ])
-
-        # Send the message and get the response
-        logger.info("Sending message to Gemini API for story generation")
+        logger.debug("Streaming story from Gemini API")
         try:
-            response = chat.send_message(prompt)
-            logger.info("Successfully received story from Gemini API")
-            return response.text
+            with timed_stage('generate_story_stream'):
+                started = False
+                try:
+                    for chunk in get_gemini_client().generate_stream(**story_request):
+                        started = True
+                        yield chunk
+                except Exception as cache_error:
+                    # Only fall back if nothing was streamed from the cached request yet
+                    if fallback is None or started:
+                        raise
+                    logger.warning("Cached story context failed, sending the full prompt: %s", cache_error)
+                    invalidate_context(story_request['cached_content'])
+                    yield from get_gemini_client().generate_stream(**fallback)
+            logger.debug("Finished streaming story from Gemini API")
         except Exception as api_error:
-            logger.error(f"Gemini API error during story generation: {str(api_error)}", exc_info=True)
+            logger.error("Gemini API error during story streaming: %s", api_error, exc_info=True)
             raise Exception(f"Gemini API error during story generation: {str(api_error)}")
 
     except Exception as e:
-        logger.error(f"Error generating story: {str(e)}", exc_info=True)
+        logger.error("Error streaming story: %s", e, exc_info=True)
         raise Exception(f"Failed to generate a story: {str(e)}")
 
-def analyze_image_and_generate_story(base64_image, custom_prompt="", language="en"):
+async def analyze_image_async(image_bytes, language="en", force_refresh=False):
+    """
+    Analyze an image like analyze_image, without blocking the event loop.
+
+    Args:
+        image_bytes: Encoded image bytes from process_image
+        language: Language code ('en' for English, 'zh' for Chinese)
+        force_refresh: Skip the cache lookup and request a fresh analysis
+
+    Returns:
+        String containing analysis of the image
+    """
+    key = (make_analysis_key(image_bytes, language, IMAGE_MODEL), force_refresh)
+    return await _analysis_flight.do_async(key, _analyze_image_async, image_bytes, language, force_refresh)
+
+async def _analyze_image_async(image_bytes, language="en", force_refresh=False):
+    """
+    Analyze an image without blocking the event loop, using the analysis cache.
+
+    Cache lookups and stores run in a worker thread, so the database cache
+    backend can be used from a request context.
+
+    Args:
+        image_bytes: Encoded image bytes from process_image
+        language: Language code ('en' for English, 'zh' for Chinese)
+        force_refresh: Skip the cache lookup and request a fresh analysis
+
+    Returns:
+        String containing analysis of the image
+    """
+    try:
+        cache_key = make_analysis_key(image_bytes, language, IMAGE_MODEL)
+        if not force_refresh:
+            cached_analysis = await asyncio.to_thread(get_cached_analysis, cache_key)
+            record_cache_lookup('analysis', cached_analysis is not None)
+            if cached_analysis is not None:
+                logger.debug("Using cached image analysis")
+                return cached_analysis
+
+        observe_payload('vision_request', len(image_bytes))
+        image_part = {"mime_type": image_mime_type(image_bytes), "data": image_bytes}
+
+        logger.debug("Sending async image analysis request to %s", IMAGE_MODEL)
+        try:
+            with timed_stage('analyze_image'):
+                analysis = await get_gemini_client().generate_async(
+                    IMAGE_MODEL, [_build_analysis_prompt(language), image_part])
+        except Exception as api_error:
+            logger.error("Gemini API error: %s", api_error, exc_info=True)
+            raise Exception(f"Gemini API error: {str(api_error)}")
+
+        await asyncio.to_thread(store_analysis, cache_key, analysis)
+        return analysis
+
+    except Exception as e:
+        logger.error("Error analyzing image: %s", e, exc_info=True)
+        raise Exception(f"Failed to analyze the image: {str(e)}")
+
+async def generate_story_async(image_analysis, custom_prompt="", language="en"):
+    """
+    Generate a story like generate_story, without blocking the event loop.
+
+    Args:
+        image_analysis: Text description of the image
+        custom_prompt: Optional custom instructions for the story
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        String containing the generated story
+    """
+    try:
+        prompt_parts = _story_prompt_parts(image_analysis, custom_prompt, language)
+        if is_cacheable(prompt_parts[0], prompt_parts[1]):
+            # Creating or extending the cached context is a blocking API call
+            story_request, fallback = await asyncio.to_thread(_story_request, prompt_parts, image_analysis, language)
+        else:
+            story_request, fallback = _story_request(prompt_parts, image_analysis, language)
+
+        logger.debug("Sending async story generation request to Gemini API")
+        try:
+            with timed_stage('generate_story'):
+                try:
+                    return await get_gemini_client().generate_async(**story_request)
+                except Exception as cache_error:
+                    if fallback is None:
+                        raise
+                    logger.warning("Cached story context failed, sending the full prompt: %s", cache_error)
+                    invalidate_context(story_request['cached_content'])
+                    return await get_gemini_client().generate_async(**fallback)
+        except Exception as api_error:
+            logger.error("Gemini API error during story generation: %s", api_error, exc_info=True)
+            raise Exception(f"Gemini API error during story generation: {str(api_error)}")
+
+    except Exception as e:
+        logger.error("Error generating story: %s", e, exc_info=True)
+        raise Exception(f"Failed to generate a story: {str(e)}")
+
+def _build_fused_prompt(custom_prompt="", language="en"):
+    """
+    Build the system instruction and prompt for fused analysis and story generation.
+
+    Args:
+        custom_prompt: Optional custom instructions for the story
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        Tuple containing (system_prompt, prompt)
+    """
+    system_prompt, _, _ = _story_prompt_parts("", custom_prompt, language)
+    if language == "zh":
+        prompt = _build_analysis_prompt(language) + """
+            然后根据你的分析，创作一个引人入胜、富有创意且结构完整的短篇故事（约300-500字），
+            有清晰的开头、中间和结尾。
+            以 JSON 对象回答，包含两个字段："image_analysis"（图片分析）和 "story"（故事）。
+            """
+        if custom_prompt:
+            prompt += f"\n\n故事的额外指示: {custom_prompt}"
+    else:
+        prompt = _build_analysis_prompt(language) + """
+            Then, based on your analysis, write an engaging, creative, and well-structured
+            short story (around 300-500 words) with a clear beginning, middle, and end.
+            Respond with a JSON object with two fields: "image_analysis" and "story".
+            """
+        if custom_prompt:
+            prompt += f"\n\nAdditional instructions for the story: {custom_prompt}"
+    return system_prompt, prompt
+
+def parse_fused_response(text):
+    """
+    Parse and validate a fused generation response.
+
+    Args:
+        text: The model's response text
+
+    Returns:
+        Tuple containing (image_analysis, story)
+
+    Raises:
+        InvalidFusedResponse: If the text is not a JSON object with non-empty
+            string fields image_analysis and story
+    """
+    cleaned = text.strip()
+    # Tolerate a Markdown code fence around the JSON
+    if cleaned.startswith("```"):
+        cleaned = cleaned.strip("`")
+        cleaned = cleaned[cleaned.find("{"):] if "{" in cleaned else cleaned
+    try:
+        data = json.loads(cleaned)
+    except ValueError as e:
+        raise InvalidFusedResponse(f"Response is not valid JSON: {str(e)}")
+
+    if not isinstance(data, dict):
+        raise InvalidFusedResponse("Response is not a JSON object")
+    for field in FUSED_RESPONSE_SCHEMA["required"]:
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise InvalidFusedResponse(f"Response field '{field}' is missing or empty")
+    return data["image_analysis"].strip(), data["story"].strip()
+
+def _fused_request(image_bytes, custom_prompt, language):
+    system_prompt, prompt = _build_fused_prompt(custom_prompt, language)
+    contents = [prompt, {"mime_type": image_mime_type(image_bytes), "data": image_bytes}]
+    return contents, system_prompt
+
+def generate_fused(image_bytes, custom_prompt="", language="en"):
+    """
+    Analyze an image and write a story about it in a single Gemini call.
+
+    The analysis is stored in the analysis cache, so later regenerations of
+    the same image can reuse it.
+
+    Args:
+        image_bytes: Encoded image bytes from process_image
+        custom_prompt: Optional custom prompt for the story
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        Tuple containing (image_analysis, story)
+
+    Raises:
+        InvalidFusedResponse: If the response does not match the schema
+    """
+    contents, system_prompt = _fused_request(image_bytes, custom_prompt, language)
+    observe_payload('vision_request', len(image_bytes))
+    logger.debug("Sending fused analysis and story request to %s", IMAGE_MODEL)
+    with timed_stage('fused_generation'):
+        text = get_gemini_client().generate(IMAGE_MODEL, contents, system_instruction=system_prompt,
+                                            generation_config=FUSED_GENERATION_CONFIG)
+    image_analysis, story = parse_fused_response(text)
+    store_analysis(make_analysis_key(image_bytes, language, IMAGE_MODEL), image_analysis)
+    return image_analysis, story
+
+async def generate_fused_async(image_bytes, custom_prompt="", language="en"):
+    """
+    Run generate_fused without blocking the event loop.
+
+    Returns:
+        Tuple containing (image_analysis, story)
+
+    Raises:
+        InvalidFusedResponse: If the response does not match the schema
+    """
+    contents, system_prompt = _fused_request(image_bytes, custom_prompt, language)
+    observe_payload('vision_request', len(image_bytes))
+    logger.debug("Sending async fused analysis and story request to %s", IMAGE_MODEL)
+    with timed_stage('fused_generation'):
+        text = await get_gemini_client().generate_async(IMAGE_MODEL, contents, system_instruction=system_prompt,
+                                                        generation_config=FUSED_GENERATION_CONFIG)
+    image_analysis, story = parse_fused_response(text)
+    await asyncio.to_thread(store_analysis, make_analysis_key(image_bytes, language, IMAGE_MODEL), image_analysis)
+    return image_analysis, story
+
+def parse_fused_option(value):
+    """
+    Read a per-request fused generation flag.
+
+    Args:
+        value: Request field value such as 'true' or '0', or None if not given
+
+    Returns:
+        True or False, or None to use the FUSED_GENERATION setting
+    """
+    if value is None or value == '':
+        return None
+    return str(value).lower() in ('1', 'true', 'yes')
+
+def should_fuse(image_bytes, language="en", refresh_analysis=False, fused=None):
+    """
+    Decide whether to use a fused call for an image.
+
+    A cached analysis already makes the two-call path a single story call,
+    so fused calls are only made when the analysis is not cached.
+
+    Returns:
+        Boolean indicating if a fused call should be made
+    """
+    if not (FUSED_GENERATION if fused is None else fused):
+        return False
+    return refresh_analysis or get_cached_analysis(make_analysis_key(image_bytes, language, IMAGE_MODEL)) is None
+
+def analyze_image_and_generate_story(image_bytes, custom_prompt="", language="en", refresh_analysis=False,
+                                     fused=None, on_stage=None, before_call=None):
     """
     Analyze an image and generate a story based on the analysis.
 
+    In fused mode both are requested from the multimodal model in one call.
+    If the fused response does not match the schema, the separate analysis
+    and story calls are made instead.
+
     Args:
-        base64_image: Base64 encoded image
+        image_bytes: Encoded image bytes from process_image
         custom_prompt: Optional custom prompt for the story
         language: Language code ('en' for English, 'zh' for Chinese)
+        refresh_analysis: Ignore any cached analysis of this image
+        fused: Use a single fused call; None uses the FUSED_GENERATION setting
+        on_stage: Optional function called with 'analyze' and then 'story' as each step starts;
+            a fused call is reported as the analysis
+        before_call: Optional function called before each model call, e.g. to wait for a rate limit
 
     Returns:
         Tuple containing (image_analysis, story)
     """
-    image_analysis = analyze_image(base64_image, language)
+    on_stage = on_stage or (lambda stage: None)
+    before_call = before_call or (lambda: None)
+
+    on_stage('analyze')
+    if should_fuse(image_bytes, language, refresh_analysis, fused):
+        try:
+            before_call()
+            image_analysis, story = generate_fused(image_bytes, custom_prompt, language)
+            on_stage('story')
+            return image_analysis, story
+        except InvalidFusedResponse as e:
+            record_error('fused_validation')
+            logger.warning("Invalid fused response, falling back to separate calls: %s", e)
+        except Exception as e:
+            logger.error("Error in fused generation: %s", e, exc_info=True)
+            raise Exception(f"Failed to generate a story: {str(e)}")
+
+    before_call()
+    image_analysis = analyze_image(image_bytes, language, force_refresh=refresh_analysis)
+    on_stage('story')
+    before_call()
     story = generate_story(image_analysis, custom_prompt, language)
     return image_analysis, story
 
-def regenerate_story(base64_image, custom_prompt="", language="en"):
+async def analyze_image_and_generate_story_async(image_bytes, custom_prompt="", language="en",
+                                                 refresh_analysis=False, fused=None):
+    """
+    Run analyze_image_and_generate_story without blocking the event loop.
+
+    Returns:
+        Tuple containing (image_analysis, story)
+    """
+    if await asyncio.to_thread(should_fuse, image_bytes, language, refresh_analysis, fused):
+        try:
+            return await generate_fused_async(image_bytes, custom_prompt, language)
+        except InvalidFusedResponse as e:
+            record_error('fused_validation')
+            logger.warning("Invalid fused response, falling back to separate calls: %s", e)
+        except Exception as e:
+            logger.error("Error in fused generation: %s", e, exc_info=True)
+            raise Exception(f"Failed to generate a story: {str(e)}")
+
+    image_analysis = await analyze_image_async(image_bytes, language, force_refresh=refresh_analysis)
+    story = await generate_story_async(image_analysis, custom_prompt, language)
+    return image_analysis, story
+
+def regenerate_story(image_bytes, custom_prompt="", language="en", refresh_analysis=False, fused=None,
+                     image_analysis=None):
     """
     Regenerate a story for an already analyzed image with optional custom prompt.
 
     Args:
-        base64_image: Base64 encoded image
+        image_bytes: Encoded image bytes from process_image; may be None if image_analysis is given
         custom_prompt: Optional custom prompt for the story
         language: Language code ('en' for English, 'zh' for Chinese)
+        refresh_analysis: Re-analyze the image instead of reusing the cached analysis
+        fused: Use a single fused call when re-analyzing; None uses the FUSED_GENERATION setting
+        image_analysis: Stored analysis of the image to write the story from, skipping the analysis
 
     Returns:
-        String containing the regenerated story
+        Tuple containing (image_analysis, story)
+    """
+    if image_analysis is not None:
+        return image_analysis, generate_story(image_analysis, custom_prompt, language)
+    # Reuse the cached analysis unless a fresh one is requested
+    return analyze_image_and_generate_story(image_bytes, custom_prompt, language,
+                                            refresh_analysis=refresh_analysis, fused=fused)
+
+async def regenerate_story_async(image_bytes, custom_prompt="", language="en", refresh_analysis=False, fused=None,
+                                 image_analysis=None):
+    """
+    Regenerate a story like regenerate_story, without blocking the event loop.
+
+    Returns:
+        Tuple containing (image_analysis, story)
     """
-    # Re-analyze the image to get fresh inspiration
-    image_analysis = analyze_image(base64_image, language)
-    return generate_story(image_analysis, custom_prompt, language)
+    if image_analysis is not None:
+        return image_analysis, await generate_story_async(image_analysis, custom_prompt, language)
+    return await analyze_image_and_generate_story_async(
+        image_bytes, custom_prompt, language, refresh_analysis=refresh_analysis, fused=fused)
@@ -0,0 +1,227 @@
+import io
+import os
+import time
+import atexit
+import logging
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from services.image_service import process_image, ALLOWED_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Batch configuration
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 200))
+BATCH_MAX_ITEM_BYTES = int(os.environ.get("BATCH_MAX_ITEM_BYTES", 20 * 1024 * 1024))
+# Total size of the images of one batch; they are held in memory until the job has processed them
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 100 * 1024 * 1024))
+BATCH_PROCESS_WORKERS = int(os.environ.get("BATCH_PROCESS_WORKERS", os.cpu_count() or 2))
+BATCH_AI_CONCURRENCY = int(os.environ.get("BATCH_AI_CONCURRENCY", 4))
+BATCH_AI_RATE_PER_MINUTE = float(os.environ.get("BATCH_AI_RATE_PER_MINUTE", 60))
+
+class BatchError(Exception):
+    """Raised when a batch upload is invalid as a whole."""
+
+class RateLimiter:
+    """Token bucket limiting how many calls start per minute, shared by all threads."""
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call may start."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# Shared by all batches so the limit applies per worker process, not per batch
+_ai_rate_limiter = RateLimiter(BATCH_AI_RATE_PER_MINUTE)
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Forking a server that runs writer, GC and TTS threads could copy a lock held by one of
+            # them into the child, so workers start from a fresh interpreter instead
+            _process_pool = ProcessPoolExecutor(max_workers=BATCH_PROCESS_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_process_pool.shutdown, wait=False, cancel_futures=True)
+        return _process_pool
+
+def _is_allowed_image(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def collect_batch_items(files, max_bytes=BATCH_MAX_BYTES):
+    """
+    Collect the images of a batch upload, expanding zip archives.
+
+    Images are read one at a time, straight from the uploaded files and
+    from the archives' members, and no more than BATCH_MAX_ITEM_BYTES of
+    any one image is read.
+
+    Args:
+        files: List of (filename, binary file object) tuples from the request
+        max_bytes: Maximum total size of the batch's images
+
+    Returns:
+        List of dicts with 'filename' and either 'data' or an 'error'
+
+    Raises:
+        BatchError: If the batch is empty or too large
+    """
+    items = []
+    total_bytes = 0
+
+    def add(filename, read):
+        nonlocal total_bytes
+        if len(items) >= BATCH_MAX_ITEMS:
+            raise BatchError(f"A batch can contain at most {BATCH_MAX_ITEMS} images")
+        # Sizes recorded in an archive can lie, so never read more than one byte past the limit
+        data = read(BATCH_MAX_ITEM_BYTES + 1)
+        if len(data) > BATCH_MAX_ITEM_BYTES:
+            items.append({'filename': filename, 'error': 'Image is too large'})
+            return
+        total_bytes += len(data)
+        if total_bytes > max_bytes:
+            raise BatchError(f"A batch can contain at most {max_bytes // (1024 * 1024)} MB of images")
+        items.append({'filename': filename, 'data': data})
+
+    for filename, stream in files:
+        if filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(stream) as archive:
+                    for member in archive.infolist():
+                        name = member.filename
+                        if member.is_dir() or name.startswith('__MACOSX/') or not _is_allowed_image(name):
+                            continue
+                        if member.file_size > BATCH_MAX_ITEM_BYTES:
+                            items.append({'filename': name, 'error': 'Image is too large'})
+                            continue
+                        with archive.open(member) as member_stream:
+                            add(name, member_stream.read)
+            except zipfile.BadZipFile:
+                items.append({'filename': filename, 'error': 'Invalid zip archive'})
+        elif _is_allowed_image(filename):
+            add(filename, stream.read)
+        else:
+            items.append({'filename': filename, 'error': 'Invalid image format. Please upload a JPEG, PNG, or GIF.'})
+
+        if len(items) > BATCH_MAX_ITEMS:
+            raise BatchError(f"A batch can contain at most {BATCH_MAX_ITEMS} images")
+
+    if not items:
+        raise BatchError("No images uploaded")
+    return items
+
+def _process_upload(upload_bytes):
+    # Runs in a worker process; must stay a picklable module-level function
+    return process_image(io.BytesIO(upload_bytes))
+
+def _generate(app, image_bytes, language):
+    from services.ai_service import analyze_image_and_generate_story
+
+    # The analysis cache may live in the database, so give each thread an app context
+    with app.app_context():
+        # Every model call, fused or not, waits for its own token
+        return analyze_image_and_generate_story(image_bytes, language=language,
+                                                before_call=_ai_rate_limiter.acquire)
+
+def run_batch(job, items, language="en"):
+    """
+    Turn a batch of images into stories.
+
+    Images are processed on a process pool, analysis and story generation
+    run on a bounded thread pool under the shared rate limit, and all
+    resulting stories are inserted in one transaction. Failures are
+    reported per item instead of aborting the batch. Must run inside an
+    application context.
+
+    Args:
+        job: The Job reporting progress
+        items: Items from collect_batch_items
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        Dict with per-item results and success/failure counts
+    """
+    from flask import current_app
+    from services.db_service import save_stories
+    from services.story_service import story_record, image_url
+    from utils.file_utils import save_image
+
+    app = current_app._get_current_object()
+
+    results = [{'filename': item['filename'], 'status': 'failed', 'error': item.get('error')} for item in items]
+    pending = [index for index, item in enumerate(items) if 'data' in item]
+
+    # Resize and encode images in parallel processes
+    job.start_stage('process')
+    futures = {index: _get_process_pool().submit(_process_upload, items[index]['data']) for index in pending}
+    images = {}
+    for done, (index, future) in enumerate(futures.items(), start=1):
+        try:
+            image_bytes = future.result()
+            image_id, image_path = save_image(image_bytes)
+            images[index] = (image_id, image_bytes)
+        except Exception as e:
+            logger.warning("Batch item %s failed processing: %s", items[index]['filename'], e)
+            results[index]['error'] = f"Error processing image: {str(e)}"
+        finally:
+            # Release the original upload as soon as it is processed
+            items[index].pop('data', None)
+        job.set_progress(done, len(futures))
+    job.finish_stage('process')
+
+    # Analyze and write stories with bounded concurrency
+    job.start_stage('generate')
+    generated = {}
+    with ThreadPoolExecutor(max_workers=BATCH_AI_CONCURRENCY, thread_name_prefix='batch-ai') as executor:
+        futures = {index: executor.submit(_generate, app, image_bytes, language)
+                   for index, (image_id, image_bytes) in images.items()}
+        for done, (index, future) in enumerate(futures.items(), start=1):
+            try:
+                generated[index] = future.result()
+            except Exception as e:
+                logger.warning("Batch item %s failed generation: %s", items[index]['filename'], e)
+                results[index]['error'] = f"Error generating story: {str(e)}"
+            job.set_progress(done, len(futures))
+    job.finish_stage('generate')
+
+    # Insert all stories in one transaction
+    job.start_stage('save')
+    indexes = sorted(generated)
+    if indexes:
+        stories = save_stories([story_record(generated[index][1], generated[index][0], images[index][0],
+                                             images[index][1], language) for index in indexes])
+
+        for index, story in zip(indexes, stories):
+            results[index].update({
+                'status': 'completed',
+                'error': None,
+                'storyId': story.id,
+                'imageUrl': image_url(images[index][0]),
+            })
+    job.finish_stage('save')
+
+    succeeded = len(indexes)
+    logger.info("Batch finished: %s of %s items succeeded", succeeded, len(items))
+    return {
+        'items': results,
+        'succeeded': succeeded,
+        'failed': len(items) - succeeded,
+    }
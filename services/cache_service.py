@@ -0,0 +1,204 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+ANALYSIS_CACHE_BACKEND = os.environ.get("ANALYSIS_CACHE_BACKEND", "memory")  # 'memory', 'db' or 'none'
+ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))  # Seconds
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", 512))
+
+def make_analysis_key(image_bytes, language, model):
+    """
+    Build a content-addressed cache key for an image analysis.
+
+    Args:
+        image_bytes: The processed image bytes sent to the vision model
+        language: Language code of the analysis
+        model: Name of the model that produced the analysis
+
+    Returns:
+        String cache key
+    """
+    return make_image_analysis_key(hashlib.sha256(image_bytes).hexdigest(), language, model)
+
+def make_image_analysis_key(image_id, language, model):
+    """
+    Build the analysis cache key of a stored image from its ID (the SHA-256 of its bytes).
+
+    Args:
+        image_id: The image ID
+        language: Language code of the analysis
+        model: Name of the model that produced the analysis
+
+    Returns:
+        String cache key
+    """
+    return f"{model}:{language}:{image_id}"
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries=ANALYSIS_CACHE_MAX_ENTRIES, ttl=ANALYSIS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+
+            # Evict the least recently used entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class StoredAnalysisBackend:
+    """
+    In-process LRU cache in front of the analyses stored with images, shared by all workers.
+
+    Analyses are stored with the stories written from them, so misses fall
+    back to the latest stored analysis of the image in that language, and
+    set() only fills the in-process cache. Lookups are read-only and use
+    their own session, leaving the caller's transaction alone. Stored
+    analyses are taken to come from the model named in the key.
+    """
+
+    def __init__(self, max_entries=ANALYSIS_CACHE_MAX_ENTRIES, ttl=ANALYSIS_CACHE_TTL):
+        self._memory = MemoryCacheBackend(max_entries, ttl)
+
+    def get(self, key):
+        from sqlalchemy.orm import Session
+        from app import db
+        from models import ImageAnalysis
+
+        value = self._memory.get(key)
+        if value is not None:
+            return value
+
+        _, language, image_id = key.rsplit(':', 2)
+        with Session(db.engine) as session:
+            value = session.scalars(
+                db.select(ImageAnalysis.analysis)
+                .where(ImageAnalysis.image_id == image_id, ImageAnalysis.language == language)
+                .order_by(ImageAnalysis.id.desc())
+                .limit(1)
+            ).first()
+        if value is not None:
+            self._memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self._memory.set(key, value)
+
+    def delete(self, key):
+        self._memory.delete(key)
+
+    def clear(self):
+        self._memory.clear()
+
+class NullCacheBackend:
+    """Backend that never stores anything, used to disable caching."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+_BACKENDS = {
+    'memory': MemoryCacheBackend,
+    'db': StoredAnalysisBackend,
+    'none': NullCacheBackend,
+}
+
+_analysis_cache = None
+
+def get_analysis_cache():
+    """
+    Get the configured analysis cache backend.
+
+    Returns:
+        The shared cache backend instance
+    """
+    global _analysis_cache
+    if _analysis_cache is None:
+        backend_cls = _BACKENDS.get(ANALYSIS_CACHE_BACKEND)
+        if backend_cls is None:
+            logger.warning("Unknown analysis cache backend '%s', using memory", ANALYSIS_CACHE_BACKEND)
+            backend_cls = MemoryCacheBackend
+        _analysis_cache = backend_cls()
+    return _analysis_cache
+
+def set_analysis_cache(backend):
+    """
+    Replace the analysis cache backend.
+
+    Args:
+        backend: An object implementing get/set/delete/clear
+    """
+    global _analysis_cache
+    _analysis_cache = backend
+
+def get_cached_analysis(key):
+    """
+    Look up an analysis in the cache. Cache failures are logged and treated as misses.
+
+    Args:
+        key: Cache key from make_analysis_key
+
+    Returns:
+        The cached analysis text, or None on a miss
+    """
+    try:
+        return get_analysis_cache().get(key)
+    except Exception as e:
+        logger.warning("Analysis cache lookup failed: %s", e)
+        return None
+
+def store_analysis(key, analysis):
+    """
+    Store an analysis in the cache. Cache failures are logged and ignored.
+
+    Args:
+        key: Cache key from make_analysis_key
+        analysis: The analysis text
+    """
+    try:
+        get_analysis_cache().set(key, analysis)
+    except Exception as e:
+        logger.warning("Analysis cache store failed: %s", e)
@@ -0,0 +1,113 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from services.gemini_client import get_gemini_client
+from services.metrics_service import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Context cache configuration
+CONTEXT_CACHE_ENABLED = os.environ.get("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CONTEXT_CACHE_MODEL = os.environ.get("CONTEXT_CACHE_MODEL", "models/gemini-2.0-flash-001")  # Must be versioned
+CONTEXT_CACHE_TTL = int(os.environ.get("CONTEXT_CACHE_TTL", 3600))  # Seconds since the context was last used
+CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", 4096))  # Gemini's minimum cache size
+
+# Extend a cached context once less than this fraction of its TTL remains
+REFRESH_FRACTION = 0.1
+
+_contexts = {}  # key -> (cached content name, expires_at)
+_lock = threading.Lock()
+
+def _context_key(image_analysis, language):
+    return hashlib.sha256(f"{CONTEXT_CACHE_MODEL}:{language}:{image_analysis}".encode('utf-8')).hexdigest()
+
+def estimate_tokens(*texts):
+    """Rough token count of some texts, at four UTF-8 bytes per token."""
+    return sum(len(text.encode('utf-8')) for text in texts if text) // 4
+
+def is_cacheable(system_prompt, context_prompt):
+    """
+    Whether a story context is large enough for Gemini to cache.
+
+    Checked locally before any API call, so contexts below the minimum
+    cost nothing more than their length.
+
+    Args:
+        system_prompt: The story system instruction
+        context_prompt: The fixed story prompt, including the image analysis
+
+    Returns:
+        True if context caching is enabled and the context reaches CONTEXT_CACHE_MIN_TOKENS
+    """
+    return CONTEXT_CACHE_ENABLED and estimate_tokens(system_prompt, context_prompt) >= CONTEXT_CACHE_MIN_TOKENS
+
+def get_story_context(system_prompt, context_prompt, image_analysis, language="en"):
+    """
+    Return cached content holding a story's system prompt and image analysis.
+
+    The context is registered with Gemini the first time a large enough
+    analysis is written from and reused by every regeneration from it,
+    whatever its custom prompt. Each use slides the expiry forward, so a
+    context lives as long as it keeps being used, plus CONTEXT_CACHE_TTL.
+
+    Args:
+        system_prompt: The story system instruction
+        context_prompt: The fixed story prompt, including the image analysis
+        image_analysis: Text description of the image
+        language: Language code ('en' for English, 'zh' for Chinese)
+
+    Returns:
+        The cached content name, or None if the context is not cached
+    """
+    if not image_analysis or not is_cacheable(system_prompt, context_prompt):
+        return None
+
+    key = _context_key(image_analysis, language)
+    now = time.time()
+    with _lock:
+        entry = _contexts.get(key)
+        if entry is not None and entry[1] <= now:
+            del _contexts[key]
+            entry = None
+
+    if entry is not None:
+        name, expires_at = entry
+        record_cache_lookup('context', True)
+        if expires_at - now < CONTEXT_CACHE_TTL * REFRESH_FRACTION:
+            try:
+                get_gemini_client().update_cached_content(name, CONTEXT_CACHE_TTL)
+                with _lock:
+                    _contexts[key] = (name, now + CONTEXT_CACHE_TTL)
+            except Exception as e:
+                # The content still has some time left, so keep using it
+                logger.warning("Failed to extend cached context %s: %s", name, e)
+        return name
+
+    record_cache_lookup('context', False)
+    try:
+        name = get_gemini_client().create_cached_content(CONTEXT_CACHE_MODEL, system_prompt, [context_prompt],
+                                                         CONTEXT_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Failed to create cached context: %s", e)
+        return None
+
+    logger.debug("Created cached context %s", name)
+    with _lock:
+        # Gemini drops expired contents itself; forget them here too
+        for expired in [key for key, entry in _contexts.items() if entry[1] <= now]:
+            del _contexts[expired]
+        _contexts[key] = (name, now + CONTEXT_CACHE_TTL)
+    return name
+
+def invalidate_context(name):
+    """
+    Forget cached content that could not be used, e.g. because it expired early.
+
+    Args:
+        name: The cached content name
+    """
+    with _lock:
+        for key in [key for key, entry in _contexts.items() if entry[0] == name]:
+            del _contexts[key]
@@ -1,55 +1,645 @@
+import os
+import time
+import queue
+import atexit
+import base64
 import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from sqlalchemy import inspect, text, update, bindparam
+from sqlalchemy.orm import load_only
 from app import db
-from models import Story
+from models import Story, Image, ImageAnalysis
+from services.metrics_service import timed_stage, observe_write_batch, record_error
+from services.search_service import index_stories, unindex_story, index_image_analyses
+from services.page_cache_service import invalidate_story_page
+from services.storage_service import IMAGE_ID_SEARCH_PATTERN
+from utils.file_utils import get_image_url_path
+
+# Default and maximum page sizes for story listings
+STORIES_PAGE_SIZE = 20
+STORIES_MAX_PAGE_SIZE = 100
+
+# Write-behind configuration: story saves and audio updates from concurrent requests share transactions
+DB_WRITE_BEHIND = os.environ.get("DB_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+DB_WRITE_BATCH_SIZE = int(os.environ.get("DB_WRITE_BATCH_SIZE", 100))  # Most writes per transaction
+# Milliseconds to wait for more writes before committing. Writes queued while a commit runs are
+# batched anyway, so waiting only pays off when commits are very cheap compared to the round trip.
+DB_WRITE_LINGER_MS = int(os.environ.get("DB_WRITE_LINGER_MS", 0))
+DB_WRITE_TIMEOUT = int(os.environ.get("DB_WRITE_TIMEOUT", 30))  # Seconds a save waits for its transaction
 
 logger = logging.getLogger(__name__)
 
-def save_story(content, image_analysis=None, image_path=None, audio_path=None, prompt=None, title=None):
+class _Write:
+    """A queued write and the future its caller waits on."""
+
+    def __init__(self, kind, payload):
+        self.kind = kind  # 'stories' or 'audio'
+        self.payload = payload
+        self.future = Future()
+
+class WriteBehindQueue:
+    """
+    Applies story writes from many threads in shared transactions.
+
+    A single writer thread takes every write queued since its last commit
+    (up to DB_WRITE_BATCH_SIZE, optionally lingering DB_WRITE_LINGER_MS
+    for more) and commits them together, so concurrent requests pay for
+    one commit between them instead of one each.
+
+    Callers wait for the commit that contains their write, so a saved
+    story or audio path is durable when save_story or update_story_audio
+    returns, exactly as with a direct commit. Pending writes are flushed
+    when the process exits.
+
+    If a shared transaction fails, its writes are retried one by one, so
+    one bad write does not fail the others.
+    """
+
+    def __init__(self, app, batch_size=DB_WRITE_BATCH_SIZE, linger=DB_WRITE_LINGER_MS / 1000):
+        self.app = app
+        self.batch_size = batch_size
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._closed = False
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, kind, payload):
+        """
+        Queue a write.
+
+        Args:
+            kind: 'stories' (payload is a list of story dicts) or 'audio' (payload is (story_id, audio_path))
+
+        Returns:
+            Future resolved once committed with the saved Story objects (for 'stories'), or
+            whether the story exists (for 'audio')
+        """
+        if self._closed:
+            raise RuntimeError("The database writer has been shut down")
+        write = _Write(kind, payload)
+        self._queue.put(write)
+        return write.future
+
+    def flush(self, timeout=DB_WRITE_TIMEOUT):
+        """
+        Wait until every write queued so far has been committed.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if everything was flushed in time
+        """
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        marker = _Write('flush', None)
+        self._queue.put(marker)
+        try:
+            marker.future.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self, timeout=DB_WRITE_TIMEOUT):
+        """Flush pending writes and stop accepting new ones."""
+        if self._closed:
+            return
+        flushed = self.flush(timeout)
+        self._closed = True
+        if not flushed:
+            logger.error("Pending database writes were not flushed within %s seconds", timeout)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                remaining = deadline - time.monotonic()
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        with self.app.app_context():
+            # Saved stories are handed to other threads, so keep their loaded attributes after commit
+            db.session().expire_on_commit = False
+            while True:
+                batch = self._next_batch()
+                markers = [write for write in batch if write.kind == 'flush']
+                writes = [write for write in batch if write.kind != 'flush']
+                if writes:
+                    try:
+                        self._commit(writes)
+                    except Exception as e:
+                        # Keep the writer alive; whoever is waiting gets the error
+                        logger.error("Database writer failed: %s", e, exc_info=True)
+                        for write in writes:
+                            if not write.future.done():
+                                write.future.set_exception(e)
+                for marker in markers:
+                    marker.future.set_result(True)
+
+    def _commit(self, writes):
+        try:
+            results = _apply_writes(writes)
+        except Exception as e:
+            db.session.rollback()
+            if len(writes) > 1:
+                logger.warning("Batched write of %s changes failed, retrying them one by one: %s", len(writes), e)
+                for write in writes:
+                    self._commit([write])
+                return
+            logger.error("Error writing to database: %s", e)
+            record_error('db_write')
+            writes[0].future.set_exception(e)
+            return
+
+        observe_write_batch(len(writes))
+        for write, result in zip(writes, results):
+            write.future.set_result(result)
+
+def _apply_writes(writes):
+    # Applies writes in one transaction and returns each write's result
+    analyses = _record_images([data for write in writes if write.kind == 'stories' for data in write.payload])
+    stories = {}
+    for write in writes:
+        if write.kind == 'stories':
+            stories[write] = [_new_story(data, analyses) for data in write.payload]
+    saved = [story for batch in stories.values() for story in batch]
+    if saved:
+        db.session.add_all(saved)
+        # Index the stories in the same transaction, so search never misses a saved story
+        db.session.flush()
+        index_stories(saved)
+
+    # Only the last update of each story matters
+    audio_paths = {}
+    for write in writes:
+        if write.kind == 'audio':
+            story_id, audio_path = write.payload
+            audio_paths[story_id] = audio_path
+    existing = set()
+    if audio_paths:
+        # One lookup for the whole batch tells each caller whether its story exists
+        existing = set(db.session.scalars(db.select(Story.id).where(Story.id.in_(audio_paths))))
+        # A Core executemany: a story deleted since the update was queued matches no row,
+        # where an ORM bulk update by primary key would fail the whole batch
+        story_table = Story.__table__
+        db.session.execute(update(story_table)
+                           .where(story_table.c.id == bindparam('story_id'))
+                           .values(audio_path=bindparam('new_audio_path')),
+                           [{'story_id': story_id, 'new_audio_path': audio_path}
+                            for story_id, audio_path in audio_paths.items()])
+
+    db.session.commit()
+    # Hand the saved stories over to their callers' threads
+    db.session.expunge_all()
+    # Pages are only invalidated once the change is committed
+    for story_id in existing:
+        invalidate_story_page(story_id)
+    return [stories[write] if write.kind == 'stories' else write.payload[0] in existing for write in writes]
+
+_writer = None
+
+def start_write_behind(app, batch_size=DB_WRITE_BATCH_SIZE, linger=DB_WRITE_LINGER_MS / 1000):
+    """
+    Start the writer thread that batches story saves and audio updates.
+
+    Until it is started (or if DB_WRITE_BEHIND is off) every write commits
+    on its own. Pending writes are flushed when the process exits.
+
+    Args:
+        app: The Flask app, whose context the writer runs in
+        batch_size: Most writes committed in one transaction
+        linger: Seconds to wait for more writes before committing
+
+    Returns:
+        The WriteBehindQueue, or None if disabled
+    """
+    global _writer
+    if not DB_WRITE_BEHIND or _writer is not None:
+        return _writer
+    _writer = WriteBehindQueue(app, batch_size, linger)
+    _writer.start()
+    atexit.register(_writer.close)
+    return _writer
+
+def get_write_behind():
+    """Return the running WriteBehindQueue, or None if writes commit directly."""
+    return _writer
+
+def flush_writes(timeout=DB_WRITE_TIMEOUT):
+    """
+    Wait until every queued write has been committed.
+
+    Args:
+        timeout: Maximum seconds to wait
+
+    Returns:
+        True if everything was flushed in time
+    """
+    if _writer is None:
+        return True
+    return _writer.flush(timeout)
+
+def _new_story(data, analyses):
+    return Story(
+        title=data.get('title'),
+        content=data['content'],
+        excerpt=Story.make_excerpt(data['content']),
+        # The analysis is stored once with the image; only a story without one keeps its own copy
+        image_analysis=None if data.get('image_id') else data.get('image_analysis'),
+        image_id=data.get('image_id'),
+        stored_analysis=analyses.get(_analysis_key(data)),
+        language=data.get('language'),
+        image_path=data.get('image_path'),
+        audio_path=data.get('audio_path'),
+        prompt=data.get('prompt')
+    )
+
+def _analysis_key(data):
+    if data.get('image_id') and data.get('image_analysis') and data.get('language'):
+        return data['image_id'], data['language'], data['image_analysis']
+    return None
+
+def _record_images(stories_data):
+    # Adds the images of new stories that are not stored yet, and their new analyses,
+    # to the current transaction. Returns the analysis of each story, keyed by _analysis_key.
+    sizes = {}
+    keys = set()
+    for data in stories_data:
+        image_id = data.get('image_id')
+        if not image_id:
+            continue
+        if sizes.get(image_id) is None:
+            sizes[image_id] = data.get('image_size')
+        key = _analysis_key(data)
+        if key is not None:
+            keys.add(key)
+    if not sizes:
+        return {}
+
+    images = {image.id: image for image in Image.query.filter(Image.id.in_(sizes))}
+    for image_id, size in sizes.items():
+        image = images.get(image_id)
+        if image is None:
+            image = Image(id=image_id, path=get_image_url_path(image_id))
+            db.session.add(image)
+        if size and image.width is None:
+            image.width, image.height = size
+
+    # Stories written from the latest analysis share it; any other analysis is stored as a new one,
+    # leaving the analyses older stories were written from untouched
+    analyses = {}
+    added = []
+    for image_id, language, analysis in keys:
+        entry = _latest_analysis(image_id, language)
+        if entry is None or entry.analysis != analysis:
+            entry = ImageAnalysis(image_id=image_id, language=language, analysis=analysis)
+            db.session.add(entry)
+            added.append(entry)
+        analyses[(image_id, language, analysis)] = entry
+    if added:
+        db.session.flush()
+        index_image_analyses(added)
+    return analyses
+
+def _latest_analysis(image_id, language):
+    return db.session.scalars(
+        db.select(ImageAnalysis)
+        .where(ImageAnalysis.image_id == image_id, ImageAnalysis.language == language)
+        .order_by(ImageAnalysis.id.desc())
+        .limit(1)
+    ).first()
+
+@timed_stage('save_story')
+def save_story(content, image_analysis=None, image_path=None, audio_path=None, prompt=None, title=None,
+               image_id=None, image_size=None, language=None):
     """
     Save a generated story to the database.
     
+    With the write-behind queue running, the story is committed together
+    with other requests' writes; either way it has been committed when
+    this returns.
+    
+    A story with an image ID becomes a version of that image's story
+    family. The image is stored on first use, and an image analysis given
+    with its language is stored with the image for later regenerations.
+    
     Args:
         content: The story content
-        image_analysis: Analysis of the image
+        image_analysis: Analysis of the image, stored with the image when there is one
         image_path: Path to the image file
         audio_path: Path to the audio narration
         prompt: Custom prompt used to generate the story
         title: Title of the story (optional)
+        image_id: ID of the image the story was generated from (optional)
+        image_size: Tuple of (width, height) of the image (optional)
+        language: Language code of the story and its image analysis (optional)
         
     Returns:
         The saved Story object
     """
+    story = _save_stories([{
+        'title': title,
+        'content': content,
+        'image_analysis': image_analysis,
+        'image_id': image_id,
+        'image_size': image_size,
+        'language': language,
+        'image_path': image_path or (get_image_url_path(image_id) if image_id else None),
+        'audio_path': audio_path,
+        'prompt': prompt
+    }])[0]
+    logger.debug("Saved story with ID: %s", story.id)
+    return story
+
+@timed_stage('save_stories')
+def save_stories(stories_data):
+    """
+    Save several generated stories in a single transaction.
+
+    Args:
+        stories_data: List of dicts with the keyword arguments accepted by save_story
+
+    Returns:
+        List of the saved Story objects, in the same order
+    """
+    stories = _save_stories(stories_data)
+    logger.debug("Saved %s stories in one transaction", len(stories))
+    return stories
+
+def _save_stories(stories_data):
+    if _writer is not None:
+        try:
+            return _writer.submit('stories', stories_data).result(DB_WRITE_TIMEOUT)
+        except Exception as e:
+            logger.error("Error saving stories to database: %s", e)
+            raise
+
     try:
-        story = Story(
-            title=title,
-            content=content,
-            image_analysis=image_analysis,
-            image_path=image_path,
-            audio_path=audio_path,
-            prompt=prompt
-        )
-        
-        db.session.add(story)
+        analyses = _record_images(stories_data)
+        stories = [_new_story(data, analyses) for data in stories_data]
+        db.session.add_all(stories)
+        # Index the stories in the same transaction, so search never misses a saved story
+        db.session.flush()
+        index_stories(stories)
         db.session.commit()
-        
-        logger.debug(f"Saved story with ID: {story.id}")
-        return story
+        return stories
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error saving story to database: {str(e)}")
+        logger.error("Error saving stories to database: %s", e)
         raise
 
-def get_all_stories():
+def encode_story_cursor(story):
     """
-    Get all stories from the database.
-    
+    Encode the pagination cursor pointing just after a story.
+
+    Args:
+        story: The last Story of a page
+
+    Returns:
+        Opaque URL-safe cursor string
+    """
+    raw = f"{story.created_at.isoformat()}|{story.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_story_cursor(cursor):
+    """
+    Decode a pagination cursor.
+
+    Args:
+        cursor: Cursor from encode_story_cursor
+
+    Returns:
+        Tuple of (created_at, story_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, story_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(story_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+@timed_stage('list_stories')
+def get_stories_page(cursor=None, limit=STORIES_PAGE_SIZE, image_id=None):
+    """
+    Get one page of stories, newest first, using keyset pagination.
+
+    Only the columns needed for listings are loaded, never the full story
+    content or image analysis.
+
+    Args:
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of stories to return
+        image_id: Only list the versions generated from this image
+
+    Returns:
+        Tuple of (list of Story objects, cursor for the next page or None)
+    """
+    try:
+        limit = max(1, min(limit, STORIES_MAX_PAGE_SIZE))
+        query = (Story.query
+                 .options(load_only(Story.id, Story.title, Story.excerpt, Story.created_at))
+                 .order_by(Story.created_at.desc(), Story.id.desc()))
+        if image_id:
+            query = query.filter(Story.image_id == image_id)
+
+        if cursor:
+            created_at, story_id = decode_story_cursor(cursor)
+            query = query.filter(db.tuple_(Story.created_at, Story.id) < (created_at, story_id))
+
+        # Fetch one extra row to find out whether there is a next page
+        stories = query.limit(limit + 1).all()
+        if len(stories) > limit:
+            stories = stories[:limit]
+            return stories, encode_story_cursor(stories[-1])
+        return stories, None
+    except ValueError:
+        raise
+    except Exception as e:
+        logger.error("Error retrieving stories page from database: %s", e)
+        raise
+
+def backfill_story_excerpts(batch_size=500):
+    """
+    Fill in the excerpt of stories saved before excerpts were stored.
+
+    Args:
+        batch_size: Number of stories updated per commit
+
+    Returns:
+        Number of stories updated
+    """
+    updated = 0
+    try:
+        while True:
+            stories = (Story.query
+                       .options(load_only(Story.id, Story.content))
+                       .filter(Story.excerpt.is_(None))
+                       .limit(batch_size)
+                       .all())
+            if not stories:
+                break
+
+            for story in stories:
+                story.excerpt = Story.make_excerpt(story.content)
+            db.session.commit()
+            updated += len(stories)
+
+        if updated:
+            logger.info("Backfilled excerpts for %s stories", updated)
+        return updated
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error backfilling story excerpts: %s", e)
+        raise
+
+def get_image_analysis(image_id, language):
+    """
+    Get the latest stored analysis of an image.
+
+    Args:
+        image_id: The image ID
+        language: Language code of the analysis
+
+    Returns:
+        The analysis text, or None if the image has not been analyzed in that language
+    """
+    try:
+        entry = _latest_analysis(image_id, language)
+        return entry.analysis if entry is not None else None
+    except Exception as e:
+        logger.error("Error retrieving analysis of image %s: %s", image_id, e)
+        raise
+
+def backfill_story_images(batch_size=500):
+    """
+    Link stories saved before images were stored to their images.
+
+    The image ID is taken from the story's image path. Stories that
+    carried an image analysis also store it with the image, under the
+    language its text is written in.
+
+    Args:
+        batch_size: Number of stories updated per commit
+
+    Returns:
+        Number of stories linked
+    """
+    from services.search_service import CJK_RUN_PATTERN
+
+    linked = 0
+    last_id = 0
+    try:
+        while True:
+            stories = (Story.query
+                       .options(load_only(Story.id, Story.image_path, Story.image_analysis))
+                       .filter(Story.image_id.is_(None), Story.image_path.isnot(None), Story.id > last_id)
+                       .order_by(Story.id)
+                       .limit(batch_size)
+                       .all())
+            if not stories:
+                break
+            last_id = stories[-1].id
+
+            image_ids = {}
+            languages = {}
+            stories_data = []
+            for story in stories:
+                match = IMAGE_ID_SEARCH_PATTERN.search(story.image_path)
+                if not match:
+                    continue
+                image_ids[story] = match.group(0)
+                language = 'zh' if story.image_analysis and CJK_RUN_PATTERN.search(story.image_analysis) else 'en'
+                languages[story] = language
+                stories_data.append({'image_id': match.group(0), 'image_analysis': story.image_analysis,
+                                     'language': language})
+            # Store the images before the stories refer to them
+            analyses = _record_images(stories_data)
+            for story, image_id in image_ids.items():
+                story.image_id = image_id
+                story.language = languages[story]
+                story.stored_analysis = analyses.get((image_id, languages[story], story.image_analysis))
+            db.session.commit()
+            linked += len(image_ids)
+
+        if linked:
+            logger.info("Linked %s stories to their images", linked)
+        return linked
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error linking stories to their images: %s", e)
+        raise
+
+def backfill_story_analyses(batch_size=500):
+    """
+    Link stories saved before analyses were kept per story to their analyses.
+
+    Analyses stored in the former image_analysis table, one per image and
+    language, become the first analysis of their image. Each unlinked story
+    of an image is then linked to its image's latest analysis in the
+    story's language, which is the one it was written from unless the
+    image was re-analyzed since.
+
+    Args:
+        batch_size: Number of stories updated per commit
+
     Returns:
-        List of Story objects
+        Number of stories linked
     """
+    from services.search_service import index_missing_analyses
+
     try:
-        return Story.query.order_by(Story.created_at.desc()).all()
+        if 'image_analysis' in inspect(db.engine).get_table_names():
+            copied = db.session.execute(text(
+                "INSERT INTO image_analysis_version (image_id, language, analysis, created_at) "
+                "SELECT image_id, language, analysis, created_at FROM image_analysis AS legacy "
+                "WHERE NOT EXISTS (SELECT 1 FROM image_analysis_version AS version "
+                "WHERE version.image_id = legacy.image_id AND version.language = legacy.language)"
+            )).rowcount
+            db.session.commit()
+            if copied:
+                logger.info("Copied %s image analyses from the image_analysis table", copied)
+                index_missing_analyses()
+
+        latest = (db.select(ImageAnalysis.id)
+                  .where(ImageAnalysis.image_id == Story.image_id,
+                         ImageAnalysis.language == db.func.coalesce(Story.language, 'en'))
+                  .order_by(ImageAnalysis.id.desc())
+                  .limit(1)
+                  .scalar_subquery())
+        linked = 0
+        while True:
+            story_ids = db.session.scalars(
+                db.select(Story.id)
+                .where(Story.analysis_id.is_(None), Story.image_id.isnot(None), Story.image_analysis.is_(None),
+                       latest.isnot(None))
+                .order_by(Story.id)
+                .limit(batch_size)
+            ).all()
+            if not story_ids:
+                break
+            db.session.execute(update(Story).where(Story.id.in_(story_ids)).values(analysis_id=latest),
+                               execution_options={'synchronize_session': False})
+            db.session.commit()
+            linked += len(story_ids)
+
+        if linked:
+            logger.info("Linked %s stories to their image analyses", linked)
+        return linked
     except Exception as e:
-        logger.error(f"Error retrieving stories from database: {str(e)}")
+        db.session.rollback()
+        logger.error("Error linking stories to their image analyses: %s", e)
         raise
 
 def get_story_by_id(story_id):
@@ -63,9 +653,9 @@ def get_story_by_id(story_id):
         Story object if found, None otherwise
     """
     try:
-        return Story.query.get(story_id)
+        return db.session.get(Story, story_id)
     except Exception as e:
-        logger.error(f"Error retrieving story with ID {story_id}: {str(e)}")
+        logger.error("Error retrieving story with ID %s: %s", story_id, e)
         raise
 
 def delete_story(story_id):
@@ -79,42 +669,87 @@ def delete_story(story_id):
         True if successful, False otherwise
     """
     try:
-        story = Story.query.get(story_id)
+        story = db.session.get(Story, story_id)
         if not story:
             return False
             
         db.session.delete(story)
+        unindex_story(story_id)
         db.session.commit()
+        invalidate_story_page(story_id)
         
-        logger.debug(f"Deleted story with ID: {story_id}")
+        logger.debug("Deleted story with ID: %s", story_id)
         return True
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error deleting story with ID {story_id}: {str(e)}")
+        logger.error("Error deleting story with ID %s: %s", story_id, e)
         raise
 
+def clear_story_audio(audio_path):
+    """
+    Remove an audio file that no longer exists from the stories narrated by it.
+
+    The stories' pages then offer to generate the narration again.
+
+    Args:
+        audio_path: Relative path of the deleted audio file
+
+    Returns:
+        Number of stories updated
+    """
+    try:
+        story_ids = db.session.scalars(db.select(Story.id).where(Story.audio_path == audio_path)).all()
+        if not story_ids:
+            return 0
+        db.session.execute(update(Story).where(Story.id.in_(story_ids)).values(audio_path=None))
+        db.session.commit()
+        for story_id in story_ids:
+            invalidate_story_page(story_id)
+
+        logger.debug("Cleared deleted audio %s from %s stories", audio_path, len(story_ids))
+        return len(story_ids)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error clearing audio path %s: %s", audio_path, e)
+        raise
+
+@timed_stage('update_story_audio')
 def update_story_audio(story_id, audio_path):
     """
     Update the audio path for a story.
     
+    The story is updated with a single UPDATE, without loading it. With
+    the write-behind queue running, the update is committed together with
+    other requests' writes; either way it has been committed, and the
+    story's cached page invalidated, when this returns.
+    
     Args:
         story_id: The ID of the story
         audio_path: Path to the audio file
         
     Returns:
-        Updated Story object if successful, None otherwise
+        True if the story was updated, False if there is no story with that ID
     """
     try:
-        story = Story.query.get(story_id)
-        if not story:
-            return None
-            
-        story.audio_path = audio_path
+        story_id = int(story_id)
+    except (TypeError, ValueError):
+        return False
+
+    if _writer is not None:
+        updated = _writer.submit('audio', (story_id, audio_path)).result(DB_WRITE_TIMEOUT)
+        logger.debug("Updated audio path for story with ID %s: %s", story_id, updated)
+        return updated
+
+    try:
+        result = db.session.execute(update(Story).where(Story.id == story_id).values(audio_path=audio_path))
         db.session.commit()
+        if not result.rowcount:
+            return False
+        invalidate_story_page(story_id)
         
-        logger.debug(f"Updated audio path for story with ID: {story_id}")
-        return story
+        logger.debug("Updated audio path for story with ID: %s", story_id)
+        return True
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error updating audio path for story with ID {story_id}: {str(e)}")
-        raise
\ No newline at end of file
+        logger.error("Error updating audio path for story with ID %s: %s", story_id, e)
+        raise
@@ -0,0 +1,178 @@
+import os
+import io
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Gemini image billing: an image with both sides at most SMALL_IMAGE_SIZE pixels costs
+# TOKENS_PER_TILE tokens; a larger one is cut into TILE_SIZE tiles of TOKENS_PER_TILE tokens each
+TOKENS_PER_TILE = 258
+SMALL_IMAGE_SIZE = 384
+TILE_SIZE = 768
+
+# Formats the vision model and browsers both accept, by PIL format name
+MIME_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+
+# Furthest frame of an animated image that is decoded to find a representative one
+ANIMATION_MAX_FRAME = int(os.environ.get("ANIMATION_MAX_FRAME", 16))
+
+class EncodingPolicy:
+    """
+    How images are sized and encoded for the vision model.
+
+    Images are scaled to fit max_size and, if max_tiles is set, to cover
+    at most that many billing tiles, so no tokens are spent on a tile
+    that only a few rows of pixels spill into.
+    """
+
+    def __init__(self, name, max_size, format='JPEG', quality=85, max_tiles=0):
+        self.name = name
+        self.max_size = max_size
+        self.format = format.upper()
+        self.quality = quality
+        self.max_tiles = max_tiles
+        if self.format not in MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {format}")
+
+    def __repr__(self):
+        return (f"<EncodingPolicy {self.name}: {self.format} q{self.quality}, "
+                f"{self.max_size}px, {self.max_tiles or 'any'} tiles>")
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    def replace(self, **changes):
+        """Return a copy of the policy with some settings changed."""
+        settings = dict(name=self.name, max_size=self.max_size, format=self.format, quality=self.quality,
+                        max_tiles=self.max_tiles)
+        settings.update(changes)
+        return EncodingPolicy(**settings)
+
+    def target_size(self, width, height):
+        """
+        Dimensions an image of the given size is scaled to.
+
+        Args:
+            width: Width in pixels
+            height: Height in pixels
+
+        Returns:
+            Tuple of (width, height), never larger than the original
+        """
+        scale = min(1.0, self.max_size / max(width, height))
+        if self.max_tiles and estimate_image_tokens(width * scale, height * scale) > self.max_tiles * TOKENS_PER_TILE:
+            # Largest scale at which the image fits some grid of at most max_tiles tiles
+            scale = min(scale, max(min(columns * TILE_SIZE / width, (self.max_tiles // columns) * TILE_SIZE / height)
+                                   for columns in range(1, self.max_tiles + 1)))
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def save_options(self):
+        """Keyword arguments for Image.save. No metadata (EXIF, XMP, ICC) is passed on."""
+        if self.format == 'WEBP':
+            return {'format': 'WEBP', 'quality': self.quality, 'method': 4}
+        return {'format': 'JPEG', 'quality': self.quality, 'optimize': True}
+
+# Built-in policies, from most detail to fewest tokens and bytes
+POLICIES = {
+    'detail': EncodingPolicy('detail', max_size=1536, format='JPEG', quality=90, max_tiles=4),
+    'balanced': EncodingPolicy('balanced', max_size=1024, format='JPEG', quality=85, max_tiles=2),
+    'economy': EncodingPolicy('economy', max_size=768, format='WEBP', quality=80, max_tiles=1),
+    'minimal': EncodingPolicy('minimal', max_size=SMALL_IMAGE_SIZE, format='WEBP', quality=75, max_tiles=1),
+}
+
+# Policy used for uploads; IMAGE_MAX_SIZE, IMAGE_FORMAT, IMAGE_QUALITY and IMAGE_MAX_TILES override its settings
+IMAGE_POLICY = os.environ.get("IMAGE_POLICY", "balanced")
+
+def _policy_overrides():
+    overrides = {}
+    for setting, variable in (('max_size', 'IMAGE_MAX_SIZE'), ('quality', 'IMAGE_QUALITY'),
+                              ('max_tiles', 'IMAGE_MAX_TILES')):
+        if os.environ.get(variable):
+            overrides[setting] = int(os.environ[variable])
+    if os.environ.get('IMAGE_FORMAT'):
+        overrides['format'] = os.environ['IMAGE_FORMAT']
+    return overrides
+
+def get_encoding_policy(name=None):
+    """
+    Get an encoding policy by name.
+
+    Args:
+        name: Policy name, or None for the configured IMAGE_POLICY with its overrides
+
+    Returns:
+        The EncodingPolicy
+    """
+    if name is not None:
+        if name not in POLICIES:
+            raise ValueError(f"Unknown image policy: {name}")
+        return POLICIES[name]
+    if IMAGE_POLICY not in POLICIES:
+        logger.warning("Unknown IMAGE_POLICY %s, using 'balanced'", IMAGE_POLICY)
+        return POLICIES['balanced'].replace(**_policy_overrides())
+    return POLICIES[IMAGE_POLICY].replace(**_policy_overrides())
+
+def estimate_image_tokens(width, height):
+    """
+    Tokens the vision model bills for an image of the given size.
+
+    Args:
+        width: Width in pixels
+        height: Height in pixels
+
+    Returns:
+        Number of tokens
+    """
+    if width <= SMALL_IMAGE_SIZE and height <= SMALL_IMAGE_SIZE:
+        return TOKENS_PER_TILE
+    return TOKENS_PER_TILE * math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+def select_frame(img):
+    """
+    Seek an animated image to a frame that represents it.
+
+    The first frame of an animation is often a blank or title card, so the
+    middle frame is used instead. Frames are stored as changes to the ones
+    before them, so seeking decodes every earlier frame; the frame used is
+    at most ANIMATION_MAX_FRAME, and later frames are never decoded.
+
+    Args:
+        img: The opened PIL image
+    """
+    if not getattr(img, 'is_animated', False):
+        return
+    # Counting frames only parses their headers
+    frame = min(img.n_frames // 2, ANIMATION_MAX_FRAME)
+    img.seek(frame)
+    logger.debug("Using frame %s of %s of an animated image", frame, img.n_frames)
+
+def image_mime_type(image_bytes):
+    """
+    MIME type of processed image bytes.
+
+    Args:
+        image_bytes: Image encoded by process_image
+
+    Returns:
+        'image/webp' or 'image/jpeg'
+    """
+    if image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+def encode_image(img, policy):
+    """
+    Encode an image according to a policy, without its metadata.
+
+    Args:
+        img: RGB PIL image, already scaled
+        policy: The EncodingPolicy
+
+    Returns:
+        Encoded image bytes
+    """
+    buffer = io.BytesIO()
+    img.save(buffer, **policy.save_options())
+    return buffer.getvalue()
@@ -0,0 +1,392 @@
+import os
+import json
+import time
+import asyncio
+import random
+import logging
+import threading
+import google.generativeai as genai
+from google.generativeai import caching
+from services.metrics_service import record_retry
+
+logger = logging.getLogger(__name__)
+
+# Client configuration
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 60))  # Seconds per request
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_BASE = float(os.environ.get("GEMINI_BACKOFF_BASE", 0.5))  # Seconds
+GEMINI_BACKOFF_MAX = float(os.environ.get("GEMINI_BACKOFF_MAX", 8))  # Seconds
+
+# HTTP status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TransientError(Exception):
+    """An error carrying an HTTP status code, raised by transports other than the real API."""
+
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+def is_retryable(error):
+    """
+    Check whether a failed request should be retried.
+
+    google.api_core exceptions expose the HTTP status as `code`.
+
+    Args:
+        error: The exception raised by the transport
+
+    Returns:
+        Boolean indicating if the request can be retried
+    """
+    return getattr(error, 'code', None) in RETRYABLE_STATUS_CODES
+
+def backoff_delay(attempt, base=GEMINI_BACKOFF_BASE, maximum=GEMINI_BACKOFF_MAX):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)."""
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+def _config_key(generation_config):
+    # Configs may contain nested dicts (e.g. a response schema), so compare them serialized
+    return json.dumps(generation_config, sort_keys=True) if generation_config else None
+
+class GenaiTransport:
+    """
+    Transport that calls the Gemini API through google.generativeai.
+
+    GenerativeModel objects are cached per (model, system instruction,
+    generation config), or per (cached content, generation config) for
+    requests that use context caching; they all share the library's
+    underlying client connection.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name, system_instruction=None, generation_config=None, cached_content=None):
+        if cached_content:
+            key = ('cached', cached_content, _config_key(generation_config))
+        else:
+            key = (model_name, system_instruction, _config_key(generation_config))
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                if cached_content:
+                    logger.info("Creating Gemini model from cached content %s", cached_content)
+                    model = genai.GenerativeModel.from_cached_content(cached_content,
+                                                                      generation_config=generation_config)
+                else:
+                    logger.info("Creating Gemini model %s", model_name)
+                    model = genai.GenerativeModel(
+                        model_name,
+                        system_instruction=system_instruction,
+                        generation_config=generation_config,
+                    )
+                self._models[key] = model
+            return model
+
+    def generate(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                 cached_content=None):
+        model = self.get_model(model_name, system_instruction, generation_config, cached_content)
+        response = model.generate_content(contents, request_options={'timeout': timeout})
+        return response.text
+
+    async def generate_async(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                             cached_content=None):
+        model = self.get_model(model_name, system_instruction, generation_config, cached_content)
+        response = await model.generate_content_async(contents, request_options={'timeout': timeout})
+        return response.text
+
+    def create_cached_content(self, model_name, system_instruction, contents, ttl):
+        cached = caching.CachedContent.create(model=model_name, system_instruction=system_instruction,
+                                              contents=contents, ttl=ttl)
+        return cached.name
+
+    def update_cached_content(self, name, ttl):
+        caching.CachedContent.get(name).update(ttl=ttl)
+
+    def delete_cached_content(self, name):
+        with self._lock:
+            for key in [key for key in self._models if key[0] == 'cached' and key[1] == name]:
+                del self._models[key]
+        caching.CachedContent.get(name).delete()
+
+    def generate_stream(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                        cached_content=None):
+        model = self.get_model(model_name, system_instruction, generation_config, cached_content)
+        response = model.generate_content(contents, stream=True, request_options={'timeout': timeout})
+        for chunk in response:
+            # Chunks without text parts (e.g. the final finish-reason chunk) are skipped
+            if chunk.parts:
+                yield chunk.text
+
+class FakeTransport:
+    """
+    Offline stand-in for the Gemini API, for tests and benchmarks.
+
+    Args:
+        latency: Seconds each request takes
+        jitter: Extra random delay of up to this many seconds
+        responder: Function (model_name, contents, system_instruction, generation_config) -> text;
+            by default image requests get a fixed analysis, text requests a fixed story and
+            requests for JSON output both, as an object
+        failures: Number of initial requests that fail with a retryable error
+        chunk_size: Words per chunk when streaming
+        min_cache_tokens: Emulated minimum size of cached content, estimated at four bytes per token
+
+    Context caching is emulated locally: cached contents are kept in memory
+    with their expiry time, and requests that use them are answered as if
+    the cached system instruction and contents preceded the request.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, responder=None, failures=0, chunk_size=3, min_cache_tokens=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.responder = responder or self.default_responder
+        self.failures = failures
+        self.chunk_size = chunk_size
+        self.min_cache_tokens = min_cache_tokens
+        self.calls = []
+        self.cached_contents = {}
+        self._lock = threading.Lock()
+
+    ANALYSIS = "A sunny meadow with a red kite flying over a small dog."
+    STORY = ("The little dog watched the red kite climb into the sky.\n\n"
+             "All afternoon it chased the shadow across the meadow, until the wind fell quiet.")
+
+    @classmethod
+    def default_responder(cls, model_name, contents, system_instruction, generation_config=None):
+        if generation_config and generation_config.get('response_mime_type') == 'application/json':
+            return json.dumps({'image_analysis': cls.ANALYSIS, 'story': cls.STORY}, ensure_ascii=False)
+        has_image = isinstance(contents, list) and any(isinstance(part, dict) for part in contents)
+        if has_image:
+            return cls.ANALYSIS
+        return cls.STORY
+
+    def _resolve_cached(self, model_name, contents, system_instruction, cached_content):
+        # Expand a cached content reference into the full request it stands for
+        if not cached_content:
+            return model_name, contents, system_instruction
+        with self._lock:
+            entry = self.cached_contents.get(cached_content)
+            if entry is None or entry['expires_at'] <= time.time():
+                self.cached_contents.pop(cached_content, None)
+                raise TransientError(f"Cached content {cached_content} not found", code=404)
+        request_contents = contents if isinstance(contents, list) else [contents]
+        return entry['model'], list(entry['contents']) + request_contents, entry['system_instruction']
+
+    def _record_call(self, model_name, contents, system_instruction, cached_content=None):
+        # Returns True if this call should fail
+        with self._lock:
+            self.calls.append({'model': model_name, 'contents': contents, 'system_instruction': system_instruction,
+                               'cached_content': cached_content})
+            fail = self.failures > 0
+            if fail:
+                self.failures -= 1
+            return fail
+
+    def _respond(self, model_name, contents, system_instruction, generation_config, cached_content=None):
+        fail = self._record_call(model_name, contents, system_instruction, cached_content)
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if fail:
+            raise TransientError("Fake transient failure", code=503)
+        model_name, contents, system_instruction = self._resolve_cached(model_name, contents, system_instruction,
+                                                                        cached_content)
+        return self.responder(model_name, contents, system_instruction, generation_config)
+
+    def generate(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                 cached_content=None):
+        return self._respond(model_name, contents, system_instruction, generation_config, cached_content)
+
+    async def generate_async(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                             cached_content=None):
+        fail = self._record_call(model_name, contents, system_instruction, cached_content)
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        if fail:
+            raise TransientError("Fake transient failure", code=503)
+        model_name, contents, system_instruction = self._resolve_cached(model_name, contents, system_instruction,
+                                                                        cached_content)
+        return self.responder(model_name, contents, system_instruction, generation_config)
+
+    def generate_stream(self, model_name, contents, system_instruction=None, generation_config=None, timeout=None,
+                        cached_content=None):
+        words = self._respond(model_name, contents, system_instruction, generation_config, cached_content).split(' ')
+        for start in range(0, len(words), self.chunk_size):
+            chunk = ' '.join(words[start:start + self.chunk_size])
+            yield chunk if start + self.chunk_size >= len(words) else chunk + ' '
+
+    def create_cached_content(self, model_name, system_instruction, contents, ttl):
+        size = len((system_instruction or '').encode('utf-8')) + sum(
+            len(part.encode('utf-8')) for part in contents if isinstance(part, str))
+        if size // 4 < self.min_cache_tokens:
+            raise TransientError(f"Cached content is too small ({size // 4} tokens)", code=400)
+        with self._lock:
+            name = f"cachedContents/fake-{len(self.cached_contents) + 1}-{random.getrandbits(32):08x}"
+            self.cached_contents[name] = {
+                'model': model_name,
+                'system_instruction': system_instruction,
+                'contents': list(contents),
+                'expires_at': time.time() + ttl,
+            }
+        return name
+
+    def update_cached_content(self, name, ttl):
+        with self._lock:
+            entry = self.cached_contents.get(name)
+            if entry is None:
+                raise TransientError(f"Cached content {name} not found", code=404)
+            entry['expires_at'] = time.time() + ttl
+
+    def delete_cached_content(self, name):
+        with self._lock:
+            self.cached_contents.pop(name, None)
+
+class GeminiClient:
+    """Gemini client with per-request timeouts and jittered exponential backoff on 429/5xx."""
+
+    def __init__(self, transport=None, max_retries=GEMINI_MAX_RETRIES, timeout=GEMINI_TIMEOUT):
+        self.transport = transport or GenaiTransport()
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+    def _with_retries(self, model_name, description, call):
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("%s failed (%s), retrying in %.2fs", description, e, delay)
+                record_retry(model_name)
+                time.sleep(delay)
+                attempt += 1
+
+    def generate(self, model_name, contents, system_instruction=None, generation_config=None, cached_content=None):
+        """
+        Generate content and return the response text.
+
+        Args:
+            model_name: The Gemini model to use
+            contents: Prompt string or list of parts
+            system_instruction: Optional system instruction
+            generation_config: Optional generation settings dict
+            cached_content: Optional name of cached content to prepend to the request
+
+        Returns:
+            The generated text
+        """
+        return self._with_retries(
+            model_name,
+            f"Gemini request to {model_name}",
+            lambda: self.transport.generate(model_name, contents, system_instruction,
+                                            generation_config, timeout=self.timeout,
+                                            cached_content=cached_content),
+        )
+
+    async def generate_async(self, model_name, contents, system_instruction=None, generation_config=None,
+                             cached_content=None):
+        """
+        Generate content without blocking the event loop and return the response text.
+
+        Retries follow the same policy as generate(), sleeping with asyncio.
+
+        Args:
+            model_name: The Gemini model to use
+            contents: Prompt string or list of parts
+            system_instruction: Optional system instruction
+            generation_config: Optional generation settings dict
+            cached_content: Optional name of cached content to prepend to the request
+
+        Returns:
+            The generated text
+        """
+        attempt = 0
+        while True:
+            try:
+                return await self.transport.generate_async(model_name, contents, system_instruction,
+                                                           generation_config, timeout=self.timeout,
+                                                           cached_content=cached_content)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning("Gemini request to %s failed (%s), retrying in %.2fs", model_name, e, delay)
+                record_retry(model_name)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def generate_stream(self, model_name, contents, system_instruction=None, generation_config=None,
+                        cached_content=None):
+        """
+        Generate content, yielding text chunks as they arrive.
+
+        Requests are retried only until the first chunk has been received.
+
+        Yields:
+            Successive text chunks
+        """
+        def start():
+            stream = iter(self.transport.generate_stream(model_name, contents, system_instruction,
+                                                         generation_config, timeout=self.timeout,
+                                                         cached_content=cached_content))
+            return stream, next(stream, None)
+
+        stream, first_chunk = self._with_retries(model_name, f"Gemini stream from {model_name}", start)
+        if first_chunk is None:
+            return
+        yield first_chunk
+        yield from stream
+
+    def create_cached_content(self, model_name, system_instruction, contents, ttl):
+        """
+        Register a reusable prompt prefix with Gemini context caching.
+
+        Args:
+            model_name: The explicitly versioned model the cache is for
+            system_instruction: System instruction to cache
+            contents: List of content parts to cache
+            ttl: Seconds until the cached content expires
+
+        Returns:
+            The cached content name
+        """
+        return self._with_retries(model_name, f"Gemini context cache creation for {model_name}",
+                                  lambda: self.transport.create_cached_content(model_name, system_instruction,
+                                                                               contents, ttl))
+
+    def update_cached_content(self, name, ttl):
+        """Extend cached content to expire ttl seconds from now."""
+        self.transport.update_cached_content(name, ttl)
+
+    def delete_cached_content(self, name):
+        """Delete cached content before it expires."""
+        self.transport.delete_cached_content(name)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_gemini_client():
+    """
+    Get the shared Gemini client, creating it on first use.
+
+    Returns:
+        The shared GeminiClient
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeminiClient()
+        return _client
+
+def set_transport(transport):
+    """
+    Replace the transport used by the shared client, e.g. with a FakeTransport.
+
+    Args:
+        transport: An object implementing generate/generate_async/generate_stream
+    """
+    global _client
+    with _client_lock:
+        _client = GeminiClient(transport)
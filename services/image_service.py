@@ -1,13 +1,17 @@
-import os
-import base64
-from PIL import Image
+from PIL import Image, ImageOps, ExifTags
 import io
+import os
 import logging
+from services.encoding_service import get_encoding_policy, select_frame, encode_image, estimate_image_tokens
+from services.metrics_service import timed_stage, observe_payload
 
 logger = logging.getLogger(__name__)
 
 # List of allowed image extensions
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}  # WebP is what the upload page may send
+
+# Largest already-downscaled image that is stored as uploaded rather than re-encoded
+PRESIZED_MAX_BYTES = int(os.environ.get("PRESIZED_MAX_BYTES", 750 * 1024))
 
 def validate_image(file):
     """
@@ -26,76 +30,140 @@ def validate_image(file):
     return '.' in file.filename and \
            file.filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_image(image_path, max_size=1024):
+# Metadata an image is stored without
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+# EXIF orientations that swap an image's width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+def is_presized(img, size, policy):
     """
-    Process an image file:
-    - Resize if necessary while preserving aspect ratio
-    - Convert to base64 for API use
+    Check whether an upload was already downscaled and encoded by the browser.
+
+    Such an image is an RGB image in the policy's format and at its target
+    size, of a reasonable size and without metadata, so it has no
+    orientation to apply and no camera details to strip.
 
     Args:
-        image_path: Path to the image file
-        max_size: Maximum dimension (width or height) in pixels
+        img: The opened PIL image
+        size: Size of the upload in bytes
+        policy: The EncodingPolicy images are processed with
 
     Returns:
-        Base64 encoded image string
+        Boolean indicating if the upload can be used as is
     """
-    try:
-        # Log the start of image processing
-        logger.info(f"Processing image: {image_path}")
-        logger.info(f"Maximum dimension set to: {max_size} pixels")
+    return (img.format == policy.format and img.mode == 'RGB'
+            and policy.target_size(img.width, img.height) == img.size
+            and size <= PRESIZED_MAX_BYTES
+            and not any(key in img.info for key in METADATA_KEYS))
 
-        # Check if file exists
-        if not os.path.exists(image_path):
-            logger.error(f"Image file not found: {image_path}")
-            raise FileNotFoundError(f"Image file not found: {image_path}")
+def get_image_size(image_bytes):
+    """
+    Get the dimensions of encoded image bytes from their header, without decoding them.
 
-        # Get file size
-        file_size_kb = os.path.getsize(image_path) / 1024
-        logger.info(f"Original file size: {file_size_kb:.2f} KB")
+    Args:
+        image_bytes: Encoded image bytes
+
+    Returns:
+        Tuple of (width, height)
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return img.size
+
+def _read_source(image_source):
+    if isinstance(image_source, (str, os.PathLike)):
+        with open(image_source, 'rb') as f:
+            return f.read()
+    image_source.seek(0)
+    return image_source.read()
+
+def _source_size(image_source):
+    if isinstance(image_source, (str, os.PathLike)):
+        return os.path.getsize(image_source)
+    position = image_source.tell()
+    size = image_source.seek(0, io.SEEK_END)
+    image_source.seek(position)
+    return size
+
+@timed_stage('process_image')
+def process_image(image_source, policy=None, max_size=None):
+    """
+    Process an image in memory:
+    - Decode directly from a path or file-like object (e.g. the request stream)
+    - Keep images the upload page already downscaled as they are
+    - Use a representative frame of animated GIFs
+    - Apply the EXIF orientation, so photos are described the right way up
+    - Downscale to the encoding policy's size, using JPEG draft mode and
+      reduce() so large photos are never fully decoded at full resolution
+    - Encode in the policy's format and quality, without metadata
+
+    Args:
+        image_source: Path or seekable binary file-like object containing the image
+        policy: The EncodingPolicy to use (defaults to the configured IMAGE_POLICY)
+        max_size: Maximum dimension (width or height) in pixels, overriding the policy's
+
+    Returns:
+        Encoded image bytes
+    """
+    try:
+        policy = policy or get_encoding_policy()
+        if max_size is not None:
+            policy = policy.replace(max_size=max_size)
+        logger.debug("Processing image with %s", policy)
 
         # Open image
-        logger.info("Opening image file")
-        with Image.open(image_path) as img:
+        logger.debug("Opening image")
+        with Image.open(image_source) as img:
             # Log original image details
             width, height = img.size
-            logger.info(f"Original dimensions: {width}x{height} pixels, Mode: {img.mode}")
+            logger.debug("Original dimensions: %sx%s pixels, Mode: %s", width, height, img.mode)
+
+            if is_presized(img, _source_size(image_source), policy):
+                # Downscaled in the browser: re-encoding would only lose quality and cost CPU
+                logger.debug("Image was downscaled before upload, keeping it as is")
+                image_bytes = _read_source(image_source)
+                observe_payload('processed_image', len(image_bytes))
+                return image_bytes
+
+            select_frame(img)
+
+            # Let the JPEG decoder scale down by a power of two while decoding
+            target = policy.target_size(width, height)
+            if target != (width, height):
+                img.draft('RGB', target)
+
+            # Rotate phone photos according to their EXIF orientation
+            if img.getexif().get(ExifTags.Base.Orientation) in TRANSPOSED_ORIENTATIONS:
+                target = target[::-1]
+            img = ImageOps.exif_transpose(img)
 
             # Convert to RGB if it's not (e.g., PNG with transparency)
             if img.mode != 'RGB':
-                logger.info(f"Converting image from {img.mode} to RGB")
+                logger.debug("Converting image from %s to RGB", img.mode)
                 img = img.convert('RGB')
 
-            # Resize if the image is larger than max_size
-            if width > max_size or height > max_size:
-                # Calculate new dimensions
-                if width > height:
-                    new_width = max_size
-                    new_height = int(height * (max_size / width))
-                else:
-                    new_height = max_size
-                    new_width = int(width * (max_size / height))
-
-                logger.info(f"Resizing image from {width}x{height} to {new_width}x{new_height}")
-                # Resize image
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+            # Resize if the image is larger than the policy allows
+            if img.size != target:
+                # reducing_gap uses reduce() before resampling
+                img = img.resize(target, Image.LANCZOS, reducing_gap=3.0)
+                logger.debug("Resized image from %sx%s to %sx%s", width, height, img.width, img.height)
             else:
-                logger.info("Image is within size limits, no resizing needed")
+                logger.debug("Image is within size limits, no resizing needed")
 
-            # Convert to base64
-            logger.info("Converting image to base64")
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=85)
-            base64_data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            logger.debug("Encoding image as %s (about %s tokens)", policy.format,
+                         estimate_image_tokens(img.width, img.height))
+            image_bytes = encode_image(img, policy)
 
-            # Log the size of the base64 data
-            base64_size_kb = len(base64_data) / 1024
-            logger.info(f"Base64 data size: {base64_size_kb:.2f} KB")
+            # Log the size of the encoded image
+            observe_payload('processed_image', len(image_bytes))
+            image_size_kb = len(image_bytes) / 1024
+            logger.debug("Encoded image size: %.2f KB", image_size_kb)
 
-            if base64_size_kb > 1000:
-                logger.warning(f"Large base64 data ({base64_size_kb:.2f} KB). This may cause memory issues.")
+            if image_size_kb > 750:
+                logger.warning("Large encoded image (%.2f KB). This may cause memory issues.", image_size_kb)
 
-            return base64_data
+            return image_bytes
 
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}", exc_info=True)
+        logger.error("Error processing image: %s", e, exc_info=True)
         raise Exception(f"Failed to process the image: {str(e)}")
@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job queue configuration
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "database")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 100))
+JOB_RESULT_TTL = int(os.environ.get("JOB_RESULT_TTL", 3600))  # Seconds to keep finished jobs
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.5))  # Seconds between checks on other instances' jobs
+
+# Job and stage statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+PENDING = 'pending'
+
+class JobQueueFull(Exception):
+    """Raised when the queue already holds the maximum number of unfinished jobs."""
+
+class Job:
+    """A unit of background work with per-stage progress."""
+
+    def __init__(self, job_id, stages, condition, on_change=None):
+        self.id = job_id
+        self.status = QUEUED
+        self.stage = None
+        self.stages = [{'name': name, 'status': PENDING} for name in stages]
+        self.result = None
+        self.error = None
+        self.progress = None
+        self.version = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self._condition = condition
+        self._on_change = on_change
+
+    @property
+    def finished(self):
+        return self.status in (COMPLETED, FAILED)
+
+    def _set_stage_status(self, name, status):
+        for stage in self.stages:
+            if stage['name'] == name:
+                stage['status'] = status
+                return
+        self.stages.append({'name': name, 'status': status})
+
+    def _touch(self):
+        self.version += 1
+        self._condition.notify_all()
+
+    def _changed(self):
+        # Called after each change, outside the lock
+        if self._on_change is not None:
+            self._on_change(self)
+
+    def start_stage(self, name):
+        """Mark a stage as running."""
+        with self._condition:
+            self.stage = name
+            self._set_stage_status(name, RUNNING)
+            self._touch()
+        self._changed()
+
+    def finish_stage(self, name):
+        """Mark a stage as completed."""
+        with self._condition:
+            self._set_stage_status(name, COMPLETED)
+            self._touch()
+        self._changed()
+
+    def set_progress(self, completed, total):
+        """Report how many items of the current stage are done."""
+        with self._condition:
+            self.progress = {'completed': completed, 'total': total}
+            self._touch()
+        self._changed()
+
+    def to_dict(self):
+        """Convert job to a JSON-serializable snapshot."""
+        with self._condition:
+            return {
+                'id': self.id,
+                'status': self.status,
+                'stage': self.stage,
+                'stages': [dict(stage) for stage in self.stages],
+                'progress': dict(self.progress) if self.progress else None,
+                'result': self.result,
+                'error': self.error,
+                'version': self.version,
+            }
+
+class LocalJobQueue:
+    """
+    In-process job queue backed by a bounded thread pool.
+
+    Jobs are only visible to the process that queued them, so deployments
+    with several workers or instances should use DatabaseJobQueue.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, result_ttl=JOB_RESULT_TTL):
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._condition = threading.Condition()
+
+    def submit(self, fn, *args, stages=(), **kwargs):
+        """
+        Queue a function to run in the background.
+
+        The function is called as fn(job, *args, **kwargs) and its return
+        value becomes the job result.
+
+        Args:
+            fn: The function to run
+            stages: Names of the stages the function reports progress for
+
+        Returns:
+            The queued Job
+        """
+        with self._condition:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs ({pending})")
+
+            job = Job(uuid.uuid4().hex, stages, self._condition, self._on_change)
+            self._jobs[job.id] = job
+
+        job._changed()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info("Queued job %s", job.id)
+        return job
+
+    def _on_change(self, job):
+        # Called after each change of a job, outside the lock; backends override it to publish jobs
+        pass
+
+    def _run(self, job, fn, args, kwargs):
+        with self._condition:
+            job.status = RUNNING
+            job._touch()
+        job._changed()
+
+        try:
+            result = fn(job, *args, **kwargs)
+            with self._condition:
+                job.result = result
+                job.status = COMPLETED
+                job.finished_at = time.time()
+                job._touch()
+            job._changed()
+            logger.info("Job %s completed", job.id)
+        except Exception as e:
+            logger.error("Job %s failed: %s", job.id, e, exc_info=True)
+            with self._condition:
+                if job.stage:
+                    job._set_stage_status(job.stage, FAILED)
+                job.error = str(e)
+                job.status = FAILED
+                job.finished_at = time.time()
+                job._touch()
+            job._changed()
+
+    def _prune(self):
+        # Drop finished jobs older than the result TTL; caller holds the lock
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """
+        Get a job by its ID.
+
+        Args:
+            job_id: The ID of the job
+
+        Returns:
+            Job if found, None otherwise
+        """
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def wait_for_update(self, job_id, version, timeout=15):
+        """
+        Block until a job changes past the given version.
+
+        Args:
+            job_id: The ID of the job
+            version: The last version the caller has seen
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            Snapshot dict of the job (unchanged if the wait timed out),
+            or None if the job does not exist
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            self._condition.wait_for(lambda: job.version != version, timeout=timeout)
+        return job.to_dict()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+class JobSnapshot:
+    """Read-only view of a job run by another instance."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self.id = snapshot['id']
+        self.status = snapshot['status']
+        self.version = snapshot['version']
+
+    @property
+    def finished(self):
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self):
+        """Return a copy of the snapshot."""
+        return json.loads(json.dumps(self._snapshot))
+
+class DatabaseJobQueue(LocalJobQueue):
+    """
+    Job queue that runs jobs in-process and publishes their state to the database.
+
+    Each change of a job is written to the job table, so a status poll that
+    reaches another worker or instance still finds the job. Waiting on
+    another instance's job polls the table every JOB_POLL_INTERVAL seconds.
+    Finished jobs are deleted JOB_RESULT_TTL seconds after they finish.
+    """
+
+    def __init__(self, app=None, poll_interval=JOB_POLL_INTERVAL, **kwargs):
+        from flask import current_app
+        super().__init__(**kwargs)
+        self.app = app or current_app._get_current_object()
+        self.poll_interval = poll_interval
+
+    def submit(self, fn, *args, stages=(), **kwargs):
+        self._delete_expired()
+        return super().submit(fn, *args, stages=stages, **kwargs)
+
+    def _on_change(self, job):
+        from app import db
+        from models import JobRecord
+
+        snapshot = job.to_dict()
+        values = {
+            'snapshot': json.dumps(snapshot),
+            'version': snapshot['version'],
+            'finished_at': datetime.utcfromtimestamp(job.finished_at) if job.finished_at else None,
+        }
+        # A fresh application context has its own session, so the caller's transaction is left alone
+        with self.app.app_context():
+            try:
+                # Changes reported from several threads may arrive out of order; keep the newest
+                updated = db.session.execute(
+                    db.update(JobRecord)
+                    .where(JobRecord.id == job.id, JobRecord.version < snapshot['version'])
+                    .values(**values)
+                ).rowcount
+                if not updated and db.session.get(JobRecord, job.id) is None:
+                    db.session.add(JobRecord(id=job.id, **values))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Failed to publish the state of job %s: %s", job.id, e)
+
+    def _delete_expired(self):
+        from app import db
+        from models import JobRecord
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.result_ttl)
+        with self.app.app_context():
+            try:
+                db.session.execute(db.delete(JobRecord).where(JobRecord.finished_at < cutoff))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning("Failed to delete expired jobs: %s", e)
+
+    def _load(self, job_id):
+        from app import db
+        from models import JobRecord
+
+        with self.app.app_context():
+            record = db.session.get(JobRecord, job_id)
+            return JobSnapshot(json.loads(record.snapshot)) if record is not None else None
+
+    def get(self, job_id):
+        """
+        Get a job by its ID, from any instance.
+
+        Args:
+            job_id: The ID of the job
+
+        Returns:
+            Job if it runs in this process, JobSnapshot if it runs elsewhere, None if not found
+        """
+        return super().get(job_id) or self._load(job_id)
+
+    def wait_for_update(self, job_id, version, timeout=15):
+        if super().get(job_id) is not None:
+            return super().wait_for_update(job_id, version, timeout)
+
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._load(job_id)
+            if job is None or job.version != version or time.monotonic() >= deadline:
+                return job.to_dict() if job is not None else None
+            time.sleep(min(self.poll_interval, max(0, deadline - time.monotonic())))
+
+_BACKENDS = {
+    'local': LocalJobQueue,
+    'database': DatabaseJobQueue,
+}
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Get the configured job queue, creating it on first use.
+
+    Returns:
+        The shared job queue instance
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            backend_cls = _BACKENDS.get(JOB_BACKEND)
+            if backend_cls is None:
+                logger.warning("Unknown job backend '%s', using local", JOB_BACKEND)
+                backend_cls = LocalJobQueue
+            _job_queue = backend_cls()
+        return _job_queue
+
+def set_job_queue(queue):
+    """
+    Replace the job queue backend.
+
+    Args:
+        queue: An object implementing submit/get/wait_for_update
+    """
+    global _job_queue
+    with _job_queue_lock:
+        _job_queue = queue
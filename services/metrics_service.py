@@ -0,0 +1,218 @@
+import time
+import bisect
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Metric names are prefixed so they do not collide with other exporters on the same host
+METRIC_PREFIX = "imagetostory_"
+
+# Bucket upper bounds in seconds, covering fast DB writes up to slow model calls
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Bucket upper bounds in bytes, from small audio segments up to full-size uploads
+SIZE_BUCKETS = (1024, 10 * 1024, 50 * 1024, 100 * 1024, 250 * 1024, 500 * 1024, 750 * 1024,
+                1024 * 1024, 5 * 1024 * 1024, 20 * 1024 * 1024)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}_total{_format_labels(self.label_names, label_values)} {_format_value(value)}"
+
+class Histogram:
+    """
+    Observations counted into fixed buckets, optionally split by labels.
+
+    Observing is a bisect and three additions under a lock, so histograms
+    are cheap enough to leave on for every request.
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            snapshot = {label_values: list(series) for label_values, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, [('le', _format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, label_values, [('le', '+Inf')])
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            labels = _format_labels(self.label_names, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(float(series[-2]))}"
+            yield f"{self.name}_count{labels} {series[-1]}"
+
+class MetricsRegistry:
+    """Holds the metrics of this process and renders them in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+REQUEST_DURATION = registry.register(Histogram(
+    f"{METRIC_PREFIX}request_duration_seconds", "Time spent handling HTTP requests.",
+    ('endpoint', 'method', 'status')))
+STAGE_DURATION = registry.register(Histogram(
+    f"{METRIC_PREFIX}stage_duration_seconds", "Time spent in each pipeline stage.", ('stage',)))
+PAYLOAD_SIZE = registry.register(Histogram(
+    f"{METRIC_PREFIX}payload_size_bytes", "Size of uploads, processed images, model requests and audio.",
+    ('kind',), buckets=SIZE_BUCKETS))
+CACHE_REQUESTS = registry.register(Counter(
+    f"{METRIC_PREFIX}cache_requests", "Cache lookups by cache and result.", ('cache', 'result')))
+ERRORS = registry.register(Counter(
+    f"{METRIC_PREFIX}errors", "Failures by pipeline stage.", ('stage',)))
+RETRIES = registry.register(Counter(
+    f"{METRIC_PREFIX}gemini_retries", "Gemini requests retried after a transient error.", ('model',)))
+WRITE_BATCH_SIZE = registry.register(Histogram(
+    f"{METRIC_PREFIX}db_write_batch_size", "Writes committed together by the database writer.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250)))
+SPECULATIVE_SPEECH = registry.register(Counter(
+    f"{METRIC_PREFIX}speculative_speech", "Narrations pre-warmed when a story is saved, by result.", ('result',)))
+
+# Stage durations of the request being handled, for the per-request log line
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+def begin_request_stages():
+    """
+    Start collecting stage durations for the current request.
+
+    Threads started with asyncio.to_thread share the collection; background
+    jobs do not.
+
+    Returns:
+        Dict mapping stage name to total seconds, filled in as stages finish
+    """
+    stages = {}
+    _request_stages.set(stages)
+    return stages
+
+@contextmanager
+def timed_stage(stage):
+    """
+    Record how long a block takes as a pipeline stage, counting an error if it raises.
+
+    Can also be used as a function decorator.
+
+    Args:
+        stage: Name of the stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0) + elapsed
+
+def observe_request(endpoint, method, status, duration):
+    """Record the duration of a handled HTTP request."""
+    REQUEST_DURATION.observe(duration, endpoint or 'unknown', method, str(status))
+
+def observe_payload(kind, size):
+    """Record the size in bytes of a payload of the given kind."""
+    PAYLOAD_SIZE.observe(size, kind)
+
+def record_cache_lookup(cache, hit):
+    """Count a cache lookup as a hit or a miss."""
+    CACHE_REQUESTS.inc(cache, 'hit' if hit else 'miss')
+
+def record_error(stage):
+    """Count a failure in a stage that is not wrapped in timed_stage."""
+    ERRORS.inc(stage)
+
+def record_retry(model):
+    """Count a retried Gemini request."""
+    RETRIES.inc(model)
+
+def observe_write_batch(size):
+    """Record the number of writes committed in one transaction."""
+    WRITE_BATCH_SIZE.observe(size)
+
+def record_speculative_speech(result):
+    """Count a speculative narration as 'started', 'cached' or 'skipped'."""
+    SPECULATIVE_SPEECH.inc(result)
+
+def render_metrics():
+    """
+    Render all metrics of this process in Prometheus text exposition format.
+
+    Metrics are kept per process; with several gunicorn workers each
+    worker reports its own values.
+
+    Returns:
+        The metrics as text
+    """
+    return registry.render()
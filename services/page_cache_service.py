@@ -0,0 +1,139 @@
+import os
+import hashlib
+import logging
+from datetime import timezone
+from services.cache_service import MemoryCacheBackend
+from services.metrics_service import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Rendered story page cache configuration
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 256))
+# Seconds a rendered page is kept; every hit is checked against the story in the database first
+PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 300))
+
+# Languages a story page is rendered in
+PAGE_LANGUAGES = ('en', 'zh')
+
+_pages = MemoryCacheBackend(max_entries=PAGE_CACHE_MAX_ENTRIES, ttl=PAGE_CACHE_TTL)
+
+class RenderedPage:
+    """A rendered page with the validators clients use to revalidate it."""
+
+    def __init__(self, html, etag, last_modified):
+        self.html = html
+        self.etag = etag
+        self.last_modified = last_modified
+
+def make_etag(*parts):
+    """
+    Build an ETag from the values a response is rendered from.
+
+    Args:
+        *parts: Values that change whenever the response does
+
+    Returns:
+        Hex digest to use as the ETag
+    """
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()[:32]
+
+def utc(value):
+    """Mark a naive UTC datetime from the database as UTC, for Last-Modified headers."""
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+def story_etag(story, language):
+    """
+    ETag of a story page.
+
+    Story content never changes after it is saved. The audio narration is
+    added later, a story saved before analyses were kept per story is
+    linked to its analysis later, and the page text depends on the
+    reader's language.
+
+    Args:
+        story: The Story object, or a row with the columns used here
+        language: Language code the page is rendered in
+
+    Returns:
+        The ETag
+    """
+    created_at = story.created_at.isoformat() if story.created_at else None
+    return make_etag('story', story.id, created_at, story.audio_path, story.analysis_id, language)
+
+def _story_version(story_id):
+    # The columns story_etag is built from, in one primary key lookup
+    from app import db
+    from models import Story
+    return db.session.execute(
+        db.select(Story.id, Story.created_at, Story.audio_path, Story.analysis_id).where(Story.id == story_id)
+    ).first()
+
+def _page_key(story_id, language):
+    return f"story:{story_id}:{language}"
+
+def get_story_page(story_id, language):
+    """
+    Get a cached rendered story page, if it is still current.
+
+    Pages are cached per process, so a hit is checked against the story's
+    current ETag in the database. A story changed or deleted by another
+    worker is re-rendered (or not found) at once, and its stale page is
+    never served or revalidated.
+
+    Must be called within an application context.
+
+    Args:
+        story_id: The ID of the story
+        language: Language code the page is rendered in
+
+    Returns:
+        RenderedPage, or None if it is not cached or out of date
+    """
+    if not PAGE_CACHE_ENABLED:
+        return None
+    key = _page_key(story_id, language)
+    page = _pages.get(key)
+    if page is not None:
+        version = _story_version(story_id)
+        if version is None or story_etag(version, language) != page.etag:
+            _pages.delete(key)
+            page = None
+    record_cache_lookup('story_page', page is not None)
+    return page
+
+def cache_story_page(story, language, html):
+    """
+    Cache a rendered story page.
+
+    Args:
+        story: The Story object the page was rendered from
+        language: Language code the page is rendered in
+        html: The rendered page
+
+    Returns:
+        The RenderedPage
+    """
+    page = RenderedPage(html, story_etag(story, language), utc(story.created_at))
+    if PAGE_CACHE_ENABLED:
+        _pages.set(_page_key(story.id, language), page)
+    return page
+
+def invalidate_story_page(story_id):
+    """
+    Drop this process's cached pages of a story after it has changed or been deleted.
+
+    Other workers notice the change when they next serve the page.
+
+    Args:
+        story_id: The ID of the story
+    """
+    for language in PAGE_LANGUAGES:
+        _pages.delete(_page_key(story_id, language))
+    logger.debug("Invalidated cached pages of story %s", story_id)
+
+def clear_page_cache():
+    """Drop every cached page."""
+    _pages.clear()
@@ -0,0 +1,379 @@
+import re
+import logging
+from sqlalchemy import text
+from sqlalchemy.orm import load_only
+from app import db
+from models import Story, ImageAnalysis
+from services.metrics_service import timed_stage
+
+logger = logging.getLogger(__name__)
+
+# Default and maximum number of search results per page
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+# Names of the tables holding the search index of stories, and of the image analyses they share
+SEARCH_TABLE = 'story_search'
+IMAGE_SEARCH_TABLE = 'analysis_search'
+# Former index of the analyses, keyed by image and language
+LEGACY_IMAGE_SEARCH_TABLE = 'image_analysis_search'
+
+# Weight of a match in the image analysis relative to one in the story itself
+ANALYSIS_WEIGHT = 0.5
+
+# Text search configuration for Postgres; 'simple' does no stemming, so English and Chinese index alike
+POSTGRES_TS_CONFIG = 'simple'
+
+# Runs of characters written without spaces between words: CJK ideographs, kana and hangul
+CJK_RUN_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+')
+WORD_PATTERN = re.compile(r'\w+')
+
+def tokenize(value, query=False):
+    """
+    Split text into search tokens.
+
+    Words in space-separated scripts are lowercased. CJK runs, which have no
+    spaces between words, become overlapping character bigrams, so any
+    two-character word in them can be matched without a dictionary. Indexed
+    runs also end with their last character on its own, so every character
+    starts some token and single-character queries can match by prefix.
+
+    Args:
+        value: The text to tokenize
+        query: Tokenize a search query rather than text to index
+
+    Returns:
+        List of tokens
+    """
+    tokens = []
+    for word in WORD_PATTERN.findall((value or '').lower()):
+        position = 0
+        for run in CJK_RUN_PATTERN.finditer(word):
+            if run.start() > position:
+                tokens.append(word[position:run.start()])
+            chars = run.group(0)
+            tokens.extend(chars[i:i + 2] for i in range(len(chars) - 1))
+            if len(chars) == 1 or not query:
+                tokens.append(chars[-1])
+            position = run.end()
+        if position < len(word):
+            tokens.append(word[position:])
+    return tokens
+
+def _is_single_cjk(token):
+    return len(token) == 1 and CJK_RUN_PATTERN.match(token) is not None
+
+def _index_text(value):
+    return ' '.join(tokenize(value))
+
+def _backend():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        return 'postgres'
+    if dialect == 'sqlite':
+        return 'sqlite'
+    return None
+
+def ensure_search_index(batch_size=1000):
+    """
+    Create the search index if needed and add any stories missing from it.
+
+    Must be called within an application context.
+
+    Args:
+        batch_size: Number of stories indexed per commit
+
+    Returns:
+        Number of stories added to the index
+    """
+    backend = _backend()
+    if backend is None:
+        logger.warning("Full-text search is not supported on %s; searches will scan stories",
+                       db.engine.dialect.name)
+        return 0
+
+    with db.engine.begin() as connection:
+        if backend == 'sqlite':
+            # The image_analysis column only holds the analyses of legacy stories saved without an image
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+                f"USING fts5(content, image_analysis, prompt, tokenize='unicode61 remove_diacritics 2')"
+            ))
+            connection.execute(text(f"DROP TABLE IF EXISTS {LEGACY_IMAGE_SEARCH_TABLE}"))
+            # The rowid of an entry is the ID of its analysis
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {IMAGE_SEARCH_TABLE} "
+                f"USING fts5(analysis, tokenize='unicode61 remove_diacritics 2')"
+            ))
+        else:
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                f"story_id INTEGER PRIMARY KEY REFERENCES story (id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING GIN (document)"
+            ))
+            connection.execute(text(f"DROP TABLE IF EXISTS {LEGACY_IMAGE_SEARCH_TABLE}"))
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {IMAGE_SEARCH_TABLE} ("
+                f"analysis_id INTEGER PRIMARY KEY REFERENCES {ImageAnalysis.__tablename__} (id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{IMAGE_SEARCH_TABLE}_document "
+                f"ON {IMAGE_SEARCH_TABLE} USING GIN (document)"
+            ))
+
+    indexed_column = 'rowid' if backend == 'sqlite' else 'story_id'
+    added = 0
+    try:
+        while True:
+            stories = (Story.query
+                       .options(load_only(Story.id, Story.content, Story.image_analysis, Story.prompt))
+                       .filter(Story.id.notin_(db.select(db.column(indexed_column)).select_from(db.table(SEARCH_TABLE))))
+                       .order_by(Story.id)
+                       .limit(batch_size)
+                       .all())
+            if not stories:
+                break
+            index_stories(stories)
+            db.session.commit()
+            added += len(stories)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error building the search index: %s", e)
+        raise
+
+    if added:
+        logger.info("Added %s stories to the search index", added)
+    index_missing_analyses(batch_size)
+    return added
+
+def index_missing_analyses(batch_size=1000):
+    """
+    Add stored image analyses that are not in the search index yet.
+
+    Args:
+        batch_size: Number of analyses indexed per commit
+
+    Returns:
+        Number of analyses added to the index
+    """
+    backend = _backend()
+    if backend is None:
+        return 0
+
+    indexed_column = 'rowid' if backend == 'sqlite' else 'analysis_id'
+    indexed = db.select(db.column(indexed_column)).select_from(db.table(IMAGE_SEARCH_TABLE))
+    added = 0
+    try:
+        while True:
+            analyses = db.session.scalars(
+                db.select(ImageAnalysis)
+                .where(ImageAnalysis.id.notin_(indexed))
+                .order_by(ImageAnalysis.id)
+                .limit(batch_size)
+            ).all()
+            if not analyses:
+                break
+            index_image_analyses(analyses)
+            db.session.commit()
+            added += len(analyses)
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error building the image analysis search index: %s", e)
+        raise
+
+    if added:
+        logger.info("Added %s image analyses to the search index", added)
+    return added
+
+def index_stories(stories):
+    """
+    Add stories to the search index in the current transaction.
+
+    The stories must already have IDs (i.e. have been flushed). The caller
+    commits, so stories and their index entries are saved together.
+
+    Args:
+        stories: List of Story objects
+    """
+    backend = _backend()
+    if backend is None or not stories:
+        return
+
+    rows = [{
+        'id': story.id,
+        'content': _index_text(story.content),
+        'image_analysis': _index_text(story.image_analysis),
+        'prompt': _index_text(story.prompt),
+    } for story in stories]
+
+    if backend == 'sqlite':
+        db.session.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, content, image_analysis, prompt) "
+            f"VALUES (:id, :content, :image_analysis, :prompt)"
+        ), rows)
+    else:
+        # Matches in the story rank above matches in the analysis, which rank above the prompt
+        db.session.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (story_id, document) VALUES (:id, "
+            f"setweight(to_tsvector('{POSTGRES_TS_CONFIG}', :content), 'A') || "
+            f"setweight(to_tsvector('{POSTGRES_TS_CONFIG}', :image_analysis), 'B') || "
+            f"setweight(to_tsvector('{POSTGRES_TS_CONFIG}', :prompt), 'C')) "
+            f"ON CONFLICT (story_id) DO NOTHING"
+        ), rows)
+
+def index_image_analyses(analyses):
+    """
+    Add new image analyses to the search index in the current transaction.
+
+    Each analysis is indexed once, however many stories were written from
+    it; searches reach the stories through Story.analysis_id. Analyses are
+    never changed, so their entries are never updated.
+
+    Args:
+        analyses: List of flushed ImageAnalysis objects
+    """
+    backend = _backend()
+    if backend is None or not analyses:
+        return
+
+    rows = [{'id': entry.id, 'analysis': _index_text(entry.analysis)} for entry in analyses]
+    if backend == 'sqlite':
+        db.session.execute(text(
+            f"INSERT INTO {IMAGE_SEARCH_TABLE} (rowid, analysis) VALUES (:id, :analysis)"
+        ), rows)
+    else:
+        db.session.execute(text(
+            f"INSERT INTO {IMAGE_SEARCH_TABLE} (analysis_id, document) "
+            f"VALUES (:id, to_tsvector('{POSTGRES_TS_CONFIG}', :analysis)) "
+            f"ON CONFLICT (analysis_id) DO NOTHING"
+        ), rows)
+
+def unindex_images(image_ids):
+    """
+    Remove the analyses of images from the search index in the current transaction.
+
+    Must be called before the analyses themselves are deleted.
+
+    Args:
+        image_ids: IDs of the images being deleted
+    """
+    # Postgres removes them with their analyses
+    if _backend() == 'sqlite' and image_ids:
+        db.session.execute(text(
+            f"DELETE FROM {IMAGE_SEARCH_TABLE} WHERE rowid IN "
+            f"(SELECT id FROM {ImageAnalysis.__tablename__} WHERE image_id = :image_id)"
+        ), [{'image_id': image_id} for image_id in image_ids])
+
+def unindex_story(story_id):
+    """
+    Remove a story from the search index in the current transaction.
+
+    Args:
+        story_id: The ID of the story
+    """
+    backend = _backend()
+    if backend == 'sqlite':
+        db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id"), {'id': story_id})
+    elif backend == 'postgres':
+        db.session.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE story_id = :id"), {'id': story_id})
+
+def _match_query(tokens):
+    # Every token must match; quoting keeps FTS5 operators in user input literal
+    return ' '.join('"{}"{}'.format(token.replace('"', '""'), '*' if _is_single_cjk(token) else '')
+                    for token in tokens)
+
+def _tsquery(tokens):
+    return ' & '.join("'{}'{}".format(token.replace("'", "''").replace('\\', '\\\\'),
+                                      ':*' if _is_single_cjk(token) else '')
+                      for token in tokens)
+
+@timed_stage('search_stories')
+def search_stories(query, page=1, limit=SEARCH_PAGE_SIZE):
+    """
+    Search stories by their content, image analysis and custom prompt.
+
+    Results are ranked by relevance, with matches in the story itself
+    counting most. A story matches if all query words appear in the story
+    and its prompt, or all of them in the analysis it was written from.
+
+    Args:
+        query: The search text
+        page: 1-based page of results
+        limit: Maximum number of stories per page
+
+    Returns:
+        Tuple of (list of Story objects with listing columns loaded, whether there is a next page)
+    """
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    offset = (max(1, page) - 1) * limit
+    tokens = tokenize(query, query=True)
+    if not tokens:
+        return [], False
+
+    try:
+        backend = _backend()
+        params = {'limit': limit + 1, 'offset': offset}
+        if backend == 'sqlite':
+            params['match'] = _match_query(tokens)
+            params['analysis_weight'] = ANALYSIS_WEIGHT
+            # bm25 column weights: content, legacy image analysis, prompt; lower scores rank higher
+            rows = db.session.execute(text(
+                f"SELECT story_id FROM ("
+                f"SELECT rowid AS story_id, bm25({SEARCH_TABLE}, 4.0, 2.0, 1.0) AS score "
+                f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+                f"UNION ALL "
+                f"SELECT story.id, bm25({IMAGE_SEARCH_TABLE}) * :analysis_weight "
+                f"FROM {IMAGE_SEARCH_TABLE} JOIN story ON story.analysis_id = {IMAGE_SEARCH_TABLE}.rowid "
+                f"WHERE {IMAGE_SEARCH_TABLE} MATCH :match"
+                f") GROUP BY story_id ORDER BY MIN(score), story_id DESC LIMIT :limit OFFSET :offset"
+            ), params)
+            story_ids = [row[0] for row in rows]
+        elif backend == 'postgres':
+            params['query'] = _tsquery(tokens)
+            params['analysis_weight'] = ANALYSIS_WEIGHT
+            rows = db.session.execute(text(
+                f"SELECT story_id FROM ("
+                f"SELECT story_id, ts_rank(document, to_tsquery('{POSTGRES_TS_CONFIG}', :query)) AS rank "
+                f"FROM {SEARCH_TABLE} WHERE document @@ to_tsquery('{POSTGRES_TS_CONFIG}', :query) "
+                f"UNION ALL "
+                f"SELECT story.id, ts_rank(search.document, to_tsquery('{POSTGRES_TS_CONFIG}', :query)) "
+                f"* :analysis_weight "
+                f"FROM {IMAGE_SEARCH_TABLE} AS search JOIN story ON story.analysis_id = search.analysis_id "
+                f"WHERE search.document @@ to_tsquery('{POSTGRES_TS_CONFIG}', :query)"
+                f") AS matches GROUP BY story_id ORDER BY MAX(rank) DESC, story_id DESC "
+                f"LIMIT :limit OFFSET :offset"
+            ), params)
+            story_ids = [row[0] for row in rows]
+        else:
+            story_ids = _scan_stories(query, limit + 1, offset)
+
+        has_more = len(story_ids) > limit
+        story_ids = story_ids[:limit]
+        if not story_ids:
+            return [], False
+
+        stories = (Story.query
+                   .options(load_only(Story.id, Story.title, Story.excerpt, Story.created_at))
+                   .filter(Story.id.in_(story_ids))
+                   .all())
+        by_id = {story.id: story for story in stories}
+        return [by_id[story_id] for story_id in story_ids if story_id in by_id], has_more
+    except Exception as e:
+        logger.error("Error searching stories: %s", e)
+        raise
+
+def _scan_stories(query, limit, offset):
+    # Unindexed fallback for other databases: a substring match on every column, newest first
+    pattern = f"%{query.strip()}%"
+    analyses = db.select(ImageAnalysis.id).where(ImageAnalysis.analysis.ilike(pattern))
+    rows = (db.session.query(Story.id)
+            .filter(db.or_(Story.content.ilike(pattern), Story.analysis_id.in_(analyses),
+                           Story.image_analysis.ilike(pattern), Story.prompt.ilike(pattern)))
+            .order_by(Story.created_at.desc(), Story.id.desc())
+            .limit(limit)
+            .offset(offset))
+    return [row[0] for row in rows]
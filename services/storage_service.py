@@ -0,0 +1,425 @@
+import io
+import os
+import re
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timezone
+from services.encoding_service import image_mime_type
+
+logger = logging.getLogger(__name__)
+
+# Image store configuration
+IMAGE_STORE_BACKEND = os.environ.get("IMAGE_STORE_BACKEND", "local")  # 'local' or 's3'
+IMAGE_STORE_DIR = os.environ.get("IMAGE_STORE_DIR", "data/images")
+IMAGE_STORE_BUCKET = os.environ.get("IMAGE_STORE_BUCKET", "")
+IMAGE_STORE_PREFIX = os.environ.get("IMAGE_STORE_PREFIX", "images/")
+IMAGE_STORE_ENDPOINT_URL = os.environ.get("IMAGE_STORE_ENDPOINT_URL")  # For S3-compatible services, e.g. MinIO
+
+# Garbage collection of images that no story refers to
+IMAGE_GC_TTL = int(os.environ.get("IMAGE_GC_TTL", 7 * 24 * 3600))  # Seconds since the image was last saved
+IMAGE_GC_INTERVAL = int(os.environ.get("IMAGE_GC_INTERVAL", 3600))  # Seconds between sweeps; 0 disables
+
+# Directory and filename prefix used before images moved to the store
+LEGACY_IMAGE_DIR = os.environ.get("LEGACY_IMAGE_DIR", "tmp")
+LEGACY_IMAGE_PREFIX = 'img_'
+
+# Image IDs are SHA-256 hex digests of the image bytes
+IMAGE_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+IMAGE_ID_SEARCH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+class LocalImageStore:
+    """
+    Images stored on local disk, sharded by the first bytes of their ID.
+
+    An image with ID abcdef... is stored as <root>/ab/cd/abcdef....jpg, so
+    no single directory grows too large.
+    """
+
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+
+    def path(self, image_id):
+        """Local file path of an image."""
+        return os.path.join(self.root, image_id[:2], image_id[2:4], f"{image_id}.jpg")
+
+    def put(self, image_id, data):
+        path = self.path(image_id)
+        if os.path.exists(path):
+            # Saving again counts as a new use, so the collector leaves it alone
+            os.utime(path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file
+        partial_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(partial_path, 'wb') as f:
+                f.write(data)
+            os.replace(partial_path, path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        return path
+
+    def get(self, image_id):
+        try:
+            with open(self.path(image_id), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, image_id):
+        return os.path.exists(self.path(image_id))
+
+    def delete(self, image_id):
+        try:
+            os.remove(self.path(image_id))
+        except FileNotFoundError:
+            pass
+
+    def iter_images(self):
+        """Yield (image_id, last saved time as a Unix timestamp) for every stored image."""
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                image_id, extension = os.path.splitext(filename)
+                if extension == '.jpg' and IMAGE_ID_PATTERN.match(image_id):
+                    try:
+                        yield image_id, os.path.getmtime(os.path.join(directory, filename))
+                    except FileNotFoundError:
+                        continue
+
+class S3ImageStore:
+    """
+    Images stored in an S3-compatible bucket, shared by every instance.
+
+    Keys are sharded like LocalImageStore paths. The client is a boto3 S3
+    client, or any object with the same put/get/head/delete/list_objects_v2
+    methods, such as InMemoryS3Client.
+    """
+
+    def __init__(self, bucket=IMAGE_STORE_BUCKET, prefix=IMAGE_STORE_PREFIX, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise Exception("The s3 image store requires boto3 (pip install boto3)")
+            client = boto3.client('s3', endpoint_url=IMAGE_STORE_ENDPOINT_URL)
+        if not bucket:
+            raise Exception("IMAGE_STORE_BUCKET must be set for the s3 image store")
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, image_id):
+        return f"{self.prefix}{image_id[:2]}/{image_id[2:4]}/{image_id}.jpg"
+
+    def path(self, image_id):
+        return None
+
+    def put(self, image_id, data):
+        # Objects are immutable, so an upload of an existing image just refreshes its last-saved time
+        key = self.key(image_id)
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=image_mime_type(data))
+        return f"s3://{self.bucket}/{key}"
+
+    def get(self, image_id):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(image_id))
+        except Exception as e:
+            if _s3_error_code(e) in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
+
+    def exists(self, image_id):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(image_id))
+            return True
+        except Exception as e:
+            if _s3_error_code(e) in ('NoSuchKey', '404'):
+                return False
+            raise
+
+    def delete(self, image_id):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(image_id))
+
+    def iter_images(self):
+        kwargs = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for item in response.get('Contents', []):
+                image_id = item['Key'].rsplit('/', 1)[-1][:-len('.jpg')]
+                if IMAGE_ID_PATTERN.match(image_id):
+                    yield image_id, item['LastModified'].timestamp()
+            if not response.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+def _s3_error_code(error):
+    # botocore's ClientError carries the S3 error code in its response
+    return str(getattr(error, 'response', {}).get('Error', {}).get('Code', ''))
+
+class S3ClientError(Exception):
+    """Error raised by InMemoryS3Client, shaped like botocore's ClientError."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+class InMemoryS3Client:
+    """
+    Local stand-in for a boto3 S3 client, covering the calls S3ImageStore makes.
+
+    Use it to exercise the s3 backend without a bucket, e.g.
+    set_image_store(S3ImageStore('images', client=InMemoryS3Client())).
+    """
+
+    def __init__(self, page_size=1000):
+        self.page_size = page_size
+        self.objects = {}  # (bucket, key) -> (body, last modified)
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        with self._lock:
+            self.objects[(Bucket, Key)] = (bytes(Body), datetime.now(timezone.utc))
+
+    def _get(self, Bucket, Key):
+        with self._lock:
+            item = self.objects.get((Bucket, Key))
+        if item is None:
+            raise S3ClientError('NoSuchKey', f"The specified key does not exist: {Key}")
+        return item
+
+    def get_object(self, Bucket, Key):
+        body, last_modified = self._get(Bucket, Key)
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body), 'LastModified': last_modified}
+
+    def head_object(self, Bucket, Key):
+        body, last_modified = self._get(Bucket, Key)
+        return {'ContentLength': len(body), 'LastModified': last_modified}
+
+    def delete_object(self, Bucket, Key):
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None):
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+            if ContinuationToken:
+                keys = [key for key in keys if key > ContinuationToken]
+            page = keys[:self.page_size]
+            contents = [{'Key': key, 'LastModified': self.objects[(Bucket, key)][1],
+                         'Size': len(self.objects[(Bucket, key)][0])} for key in page]
+        response = {'Contents': contents, 'IsTruncated': len(keys) > len(page)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+_BACKENDS = {
+    'local': LocalImageStore,
+    's3': S3ImageStore,
+}
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+def get_image_store():
+    """
+    Get the configured image store.
+
+    Returns:
+        The shared image store instance
+    """
+    global _image_store
+    with _image_store_lock:
+        if _image_store is None:
+            backend_cls = _BACKENDS.get(IMAGE_STORE_BACKEND)
+            if backend_cls is None:
+                logger.warning("Unknown image store backend '%s', using local", IMAGE_STORE_BACKEND)
+                backend_cls = LocalImageStore
+            _image_store = backend_cls()
+        return _image_store
+
+def set_image_store(store):
+    """
+    Replace the image store.
+
+    Args:
+        store: An object implementing path/put/get/exists/delete/iter_images
+    """
+    global _image_store
+    with _image_store_lock:
+        _image_store = store
+
+def migrate_legacy_images(legacy_dir=LEGACY_IMAGE_DIR):
+    """
+    Move images saved as tmp/img_<id>.jpg into the image store.
+
+    Args:
+        legacy_dir: Directory holding the old image files
+
+    Returns:
+        Number of images moved
+    """
+    if not os.path.isdir(legacy_dir):
+        return 0
+
+    store = get_image_store()
+    moved = 0
+    for entry in os.scandir(legacy_dir):
+        name, extension = os.path.splitext(entry.name)
+        image_id = name[len(LEGACY_IMAGE_PREFIX):]
+        if (not entry.is_file() or extension != '.jpg' or not name.startswith(LEGACY_IMAGE_PREFIX)
+                or not IMAGE_ID_PATTERN.match(image_id)):
+            continue
+        try:
+            with open(entry.path, 'rb') as f:
+                store.put(image_id, f.read())
+            os.remove(entry.path)
+            moved += 1
+        except Exception as e:
+            logger.warning("Could not move %s into the image store: %s", entry.path, e)
+
+    if moved:
+        logger.info("Moved %s images from %s into the image store", moved, legacy_dir)
+    return moved
+
+def referenced_image_ids(image_ids, batch_size=500):
+    """
+    Get which of some images stories refer to.
+
+    Must be called within an application context.
+
+    Args:
+        image_ids: IDs of the images to check
+        batch_size: Number of IDs looked up per query
+
+    Returns:
+        Set of the image IDs that at least one story refers to
+    """
+    from app import db
+    from models import Story
+
+    image_ids = list(image_ids)
+    referenced = set()
+    for start in range(0, len(image_ids), batch_size):
+        batch = image_ids[start:start + batch_size]
+        referenced.update(db.session.scalars(
+            db.select(Story.image_id).where(Story.image_id.in_(batch)).distinct()))
+    return referenced
+
+def forget_images(image_ids):
+    """
+    Delete the database records of images, with their analyses, unless a story refers to them.
+
+    Must be called within an application context.
+
+    Args:
+        image_ids: IDs of the images to forget
+
+    Returns:
+        Set of the image IDs whose records are gone
+    """
+    from app import db
+    from models import Story, Image, ImageAnalysis
+    from services.search_service import unindex_images
+
+    image_ids = list(image_ids)
+    if not image_ids:
+        return set()
+    # Checked again in the same transaction, so a story saved since the images were picked keeps its image
+    unreferenced = ~db.select(Story.id).where(Story.image_id == Image.id).exists()
+    try:
+        forgotten = set(db.session.scalars(db.select(Image.id).where(Image.id.in_(image_ids), unreferenced)))
+        if forgotten:
+            unindex_images(forgotten)
+            db.session.execute(db.delete(ImageAnalysis).where(ImageAnalysis.image_id.in_(forgotten)))
+            db.session.execute(db.delete(Image).where(Image.id.in_(forgotten), unreferenced))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # Images that were never recorded have nothing to forget
+    recorded = set(db.session.scalars(db.select(Image.id).where(Image.id.in_(image_ids))))
+    return set(image_ids) - recorded
+
+def collect_garbage(ttl=IMAGE_GC_TTL, on_delete=None):
+    """
+    Delete images that no story refers to and that were last saved more than ttl seconds ago.
+
+    Images only referenced from a session are kept for the TTL, so a
+    recently uploaded image can still be regenerated from. The image's
+    database record and analyses are deleted with its file, so a later
+    regeneration from it fails cleanly instead of writing a story about a
+    missing image.
+
+    Must be called within an application context.
+
+    Args:
+        ttl: Minimum age in seconds of an unreferenced image before it is deleted
+        on_delete: Optional function called with the ID of each deleted image
+
+    Returns:
+        Number of images deleted
+    """
+    store = get_image_store()
+    cutoff = time.time() - ttl
+    candidates = [image_id for image_id, saved_at in store.iter_images() if saved_at < cutoff]
+    if not candidates:
+        return 0
+
+    # Read references after listing, so a story saved in between still protects its image
+    referenced = referenced_image_ids(candidates)
+    unreferenced = forget_images([image_id for image_id in candidates if image_id not in referenced])
+    deleted = 0
+    for image_id in candidates:
+        if image_id not in unreferenced:
+            continue
+        try:
+            store.delete(image_id)
+            deleted += 1
+        except Exception as e:
+            logger.warning("Could not delete image %s: %s", image_id, e)
+            continue
+        if on_delete is not None:
+            try:
+                on_delete(image_id)
+            except Exception as e:
+                logger.warning("Error releasing resources of image %s: %s", image_id, e)
+
+    logger.info("Image garbage collection deleted %s of %s candidates", deleted, len(candidates))
+    return deleted
+
+_gc_thread = None
+
+def start_image_gc(app, interval=IMAGE_GC_INTERVAL, ttl=IMAGE_GC_TTL, on_delete=None):
+    """
+    Run collect_garbage every interval seconds in a background thread.
+
+    Args:
+        app: The Flask app, whose context the collector runs in
+        interval: Seconds between sweeps; 0 disables the collector
+        ttl: Minimum age in seconds of an unreferenced image before it is deleted
+        on_delete: Optional function called with the ID of each deleted image
+
+    Returns:
+        The collector thread, or None if disabled
+    """
+    global _gc_thread
+    if interval <= 0 or _gc_thread is not None:
+        return _gc_thread
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    collect_garbage(ttl, on_delete)
+            except Exception as e:
+                logger.error("Image garbage collection failed: %s", e, exc_info=True)
+
+    _gc_thread = threading.Thread(target=run, name='image-gc', daemon=True)
+    _gc_thread.start()
+    return _gc_thread
@@ -0,0 +1,384 @@
+import asyncio
+import io
+import logging
+from contextlib import contextmanager
+from flask import current_app
+from services.ai_service import (analyze_image, generate_story_stream, analyze_image_and_generate_story,
+                                 analyze_image_and_generate_story_async, regenerate_story, regenerate_story_async)
+from services.image_service import process_image, get_image_size
+from services.tts_service import generate_speech, generate_speech_async, start_speech, prewarm_speech
+from utils.concurrency_utils import SingleFlight
+from utils.file_utils import save_image, load_image, get_image_url_path
+
+logger = logging.getLogger(__name__)
+
+# Stages reported by background upload jobs
+UPLOAD_STAGES = ('process', 'analyze', 'story', 'save')
+
+# Identical concurrent regenerations share one story
+_regenerate_flight = SingleFlight('regenerate_story')
+
+class StoryPipelineError(Exception):
+    """Raised when a step of the story pipeline fails; the message names the step."""
+
+@contextmanager
+def _step(description):
+    try:
+        yield
+    except StoryPipelineError:
+        raise
+    except Exception as e:
+        logger.error("%s: %s", description, e, exc_info=True)
+        raise StoryPipelineError(f"{description}: {str(e)}") from e
+
+def _report_stage(job, stage):
+    # Start a stage on a background job, completing the one before it
+    if job is None:
+        return
+    if job.stage:
+        job.finish_stage(job.stage)
+    job.start_stage(stage)
+
+def tts_language(language):
+    """gTTS language code for a story language code."""
+    return 'zh-CN' if language == 'zh' else 'en'
+
+def image_url(image_id):
+    """Site-relative URL a stored image is served from."""
+    return f"/{get_image_url_path(image_id)}"
+
+def store_upload(image_source):
+    """
+    Process an uploaded image for the vision model and store it.
+
+    Args:
+        image_source: File-like object or bytes of the upload
+
+    Returns:
+        Tuple of (image_id, processed image bytes)
+    """
+    if isinstance(image_source, bytes):
+        image_source = io.BytesIO(image_source)
+    image_bytes = process_image(image_source)
+    image_id, image_path = save_image(image_bytes)
+    return image_id, image_bytes
+
+def story_record(story, image_analysis, image_id, image_bytes=None, language="en", prompt=None):
+    """
+    Keyword arguments for save_story (or an item for save_stories) of a story written from an image.
+
+    Args:
+        story: The story text
+        image_analysis: The analysis the story was written from
+        image_id: ID of the stored image
+        image_bytes: Processed image bytes, if loaded, to record the image size
+        language: Language code of the story and analysis
+        prompt: Custom prompt the story was written with
+
+    Returns:
+        Dict of save_story keyword arguments
+    """
+    return {
+        'content': story,
+        'image_analysis': image_analysis,
+        'image_id': image_id,
+        'image_path': get_image_url_path(image_id),
+        'image_size': get_image_size(image_bytes) if image_bytes else None,
+        'language': language,
+        'prompt': prompt or None,
+    }
+
+def save_generated_story(story, image_analysis, image_id, image_bytes=None, language="en", prompt=None):
+    """
+    Save a story written from an image and start pre-warming its narration.
+
+    Args:
+        Same as story_record
+
+    Returns:
+        Response data: imageAnalysis, story, storyId, imageId and imageUrl
+    """
+    from services.db_service import save_story
+    saved_story = save_story(**story_record(story, image_analysis, image_id, image_bytes, language, prompt))
+    logger.debug("Story saved with ID: %s", saved_story.id)
+    prewarm_story_audio(saved_story.id, story, language)
+    return {
+        'imageAnalysis': image_analysis,
+        'story': story,
+        'storyId': saved_story.id,
+        'imageId': image_id,
+        'imageUrl': image_url(image_id),
+    }
+
+def create_story(image_source, language="en", refresh_analysis=False, fused=None, job=None):
+    """
+    Run the upload pipeline: process and store the image, analyze it, write its story and save it.
+
+    Must be called within an application context.
+
+    Args:
+        image_source: File-like object or bytes of the upload
+        language: Language code ('en' for English, 'zh' for Chinese)
+        refresh_analysis: Ignore any cached analysis of the image
+        fused: Use a single fused call; None uses the FUSED_GENERATION setting
+        job: Optional background Job to report UPLOAD_STAGES on
+
+    Returns:
+        Response data, as returned by save_generated_story
+
+    Raises:
+        StoryPipelineError: If a step fails
+    """
+    _report_stage(job, 'process')
+    with _step("Error processing image"):
+        image_id, image_bytes = store_upload(image_source)
+
+    with _step("Error generating story"):
+        image_analysis, story = analyze_image_and_generate_story(
+            image_bytes, language=language, refresh_analysis=refresh_analysis, fused=fused,
+            on_stage=lambda stage: _report_stage(job, stage))
+
+    _report_stage(job, 'save')
+    with _step("Error saving to database"):
+        result = save_generated_story(story, image_analysis, image_id, image_bytes, language)
+    if job is not None:
+        job.finish_stage('save')
+    return result
+
+async def create_story_async(image_source, language="en", refresh_analysis=False, fused=None):
+    """
+    Run the upload pipeline like create_story, without blocking the event loop.
+
+    Returns:
+        Response data, as returned by save_generated_story
+
+    Raises:
+        StoryPipelineError: If a step fails
+    """
+    with _step("Error processing image"):
+        image_id, image_bytes = await asyncio.to_thread(store_upload, image_source)
+
+    with _step("Error generating story"):
+        image_analysis, story = await analyze_image_and_generate_story_async(
+            image_bytes, language=language, refresh_analysis=refresh_analysis, fused=fused)
+
+    with _step("Error saving to database"):
+        return await asyncio.to_thread(save_generated_story, story, image_analysis, image_id, image_bytes, language)
+
+def load_regeneration_source(image_id, language="en", refresh_analysis=False):
+    """
+    Get what a new version of an image's story is written from.
+
+    The analysis stored with the image is reused, so the image is only
+    loaded when there is none or a fresh one is requested.
+
+    Args:
+        image_id: ID of the stored image
+        language: Language code of the analysis
+        refresh_analysis: Ignore the stored analysis
+
+    Returns:
+        Tuple of (stored analysis or None, image bytes or None)
+
+    Raises:
+        StoryPipelineError: If the image cannot be loaded
+    """
+    from services.db_service import get_image_analysis
+    with _step("Error loading image"):
+        image_analysis = None if refresh_analysis else get_image_analysis(image_id, language)
+        if image_analysis is not None:
+            logger.debug("Using the stored analysis of image %s", image_id)
+            return image_analysis, None
+        return None, load_image(image_id)
+
+def regenerate_from_image(image_id, language="en", custom_prompt="", refresh_analysis=False, fused=None):
+    """
+    Write and save a new version of an image's story.
+
+    Identical requests made while one is in progress (a double-click or a
+    reload) wait for it and get the same saved story instead of their own.
+
+    Must be called within an application context.
+
+    Args:
+        image_id: ID of the stored image
+        language: Language code ('en' for English, 'zh' for Chinese)
+        custom_prompt: Optional custom prompt for the story
+        refresh_analysis: Re-analyze the image instead of reusing its stored analysis
+        fused: Use a single fused call when re-analyzing; None uses the FUSED_GENERATION setting
+
+    Returns:
+        Response data, as returned by save_generated_story
+
+    Raises:
+        StoryPipelineError: If a step fails
+    """
+    key = (image_id, custom_prompt, language, refresh_analysis, fused)
+    return _regenerate_flight.do(key, _regenerate_from_image, image_id, language, custom_prompt,
+                                 refresh_analysis, fused)
+
+def _regenerate_from_image(image_id, language, custom_prompt, refresh_analysis, fused):
+    image_analysis, image_bytes = load_regeneration_source(image_id, language, refresh_analysis)
+
+    with _step("Error generating story"):
+        image_analysis, story = regenerate_story(image_bytes, custom_prompt, language=language,
+                                                 refresh_analysis=refresh_analysis, fused=fused,
+                                                 image_analysis=image_analysis)
+
+    with _step("Error saving to database"):
+        return save_generated_story(story, image_analysis, image_id, image_bytes, language, custom_prompt)
+
+async def regenerate_from_image_async(image_id, language="en", custom_prompt="", refresh_analysis=False, fused=None):
+    """
+    Write and save a new version of an image's story like regenerate_from_image, without blocking the event loop.
+
+    Returns:
+        Response data, as returned by save_generated_story
+
+    Raises:
+        StoryPipelineError: If a step fails
+    """
+    key = (image_id, custom_prompt, language, refresh_analysis, fused)
+    return await _regenerate_flight.do_async(key, _regenerate_from_image_async, image_id, language, custom_prompt,
+                                             refresh_analysis, fused)
+
+async def _regenerate_from_image_async(image_id, language, custom_prompt, refresh_analysis, fused):
+    image_analysis, image_bytes = await asyncio.to_thread(load_regeneration_source, image_id, language,
+                                                          refresh_analysis)
+
+    with _step("Error generating story"):
+        image_analysis, story = await regenerate_story_async(image_bytes, custom_prompt, language,
+                                                             refresh_analysis=refresh_analysis, fused=fused,
+                                                             image_analysis=image_analysis)
+
+    with _step("Error saving to database"):
+        return await asyncio.to_thread(save_generated_story, story, image_analysis, image_id, image_bytes,
+                                       language, custom_prompt)
+
+def stream_story(image_id, image_bytes, language="en", custom_prompt="", refresh_analysis=False,
+                 image_analysis=None):
+    """
+    Write a story from an image token by token, saving it once complete.
+
+    Must be iterated within an application context.
+
+    Args:
+        image_id: ID of the stored image
+        image_bytes: Processed image bytes; may be None if image_analysis is given
+        language: Language code ('en' for English, 'zh' for Chinese)
+        custom_prompt: Optional custom prompt for the story
+        refresh_analysis: Ignore any cached analysis of the image
+        image_analysis: Stored analysis to write the story from, skipping the analysis
+
+    Yields:
+        ('analysis', text), then ('token', text) for each chunk of the story, then
+        ('done', response data as returned by save_generated_story)
+    """
+    if image_analysis is None:
+        image_analysis = analyze_image(image_bytes, language, force_refresh=refresh_analysis)
+    yield 'analysis', image_analysis
+
+    chunks = []
+    for chunk in generate_story_stream(image_analysis, custom_prompt, language):
+        chunks.append(chunk)
+        yield 'token', chunk
+
+    yield 'done', save_generated_story(''.join(chunks), image_analysis, image_id, image_bytes, language,
+                                       custom_prompt)
+
+def record_story_audio(app, synthesis, story_id, audio_path):
+    """
+    Store the audio path on a story once background synthesis has succeeded.
+
+    Args:
+        app: The Flask app, whose context the update runs in
+        synthesis: The finished SpeechSynthesis
+        story_id: The ID of the story
+        audio_path: Relative path of the synthesized audio
+    """
+    if synthesis.error:
+        return
+    with app.app_context():
+        from services.db_service import update_story_audio
+        update_story_audio(story_id, audio_path)
+
+def _attach_story_audio(story_id, audio_path, synthesis):
+    # Record the audio on the story now if it is cached, or once its synthesis finishes
+    if synthesis is None:
+        from services.db_service import update_story_audio
+        update_story_audio(story_id, audio_path)
+        return
+    app = current_app._get_current_object()
+    synthesis.add_done_callback(lambda done: record_story_audio(app, done, story_id, audio_path))
+
+def prewarm_story_audio(story_id, story, language):
+    """
+    Start narrating a newly saved story in the background, if SPECULATIVE_TTS is on.
+
+    The audio path is stored on the story once synthesis succeeds. When the
+    narration is requested, /generate-speech finds the file or joins the
+    synthesis in progress. Failures only cost the head start.
+
+    Args:
+        story_id: The ID of the saved story
+        story: The story text
+        language: Language code ('en' for English, 'zh' for Chinese)
+    """
+    try:
+        prewarmed = prewarm_speech(story, lang=tts_language(language))
+        if prewarmed is not None:
+            _attach_story_audio(story_id, *prewarmed)
+    except Exception as e:
+        logger.warning("Error starting speculative speech for story %s: %s", story_id, e)
+
+def start_narration(text, language="en", story_id=None):
+    """
+    Start narrating text, or find the narration cached or in progress.
+
+    Must be called within an application context.
+
+    Args:
+        text: The text to narrate
+        language: Language code ('en' for English, 'zh' for Chinese)
+        story_id: Optional ID of the story to record the audio on
+
+    Returns:
+        Tuple of (relative audio path, SpeechSynthesis or None if the file is already cached)
+    """
+    audio_path, synthesis = start_speech(text, lang=tts_language(language))
+    if story_id:
+        _attach_story_audio(story_id, audio_path, synthesis)
+    return audio_path, synthesis
+
+def narrate(text, language="en", story_id=None):
+    """
+    Narrate text, waiting for the audio file.
+
+    Must be called within an application context.
+
+    Args:
+        text: The text to narrate
+        language: Language code ('en' for English, 'zh' for Chinese)
+        story_id: Optional ID of the story to record the audio on
+
+    Returns:
+        Relative path of the audio file
+    """
+    audio_path = generate_speech(text, lang=tts_language(language))
+    if story_id:
+        from services.db_service import update_story_audio
+        update_story_audio(story_id, audio_path)
+    return audio_path
+
+async def narrate_async(text, language="en", story_id=None):
+    """
+    Narrate text like narrate, without blocking the event loop.
+
+    Returns:
+        Relative path of the audio file
+    """
+    audio_path = await generate_speech_async(text, lang=tts_language(language))
+    if story_id:
+        from services.db_service import update_story_audio
+        await asyncio.to_thread(update_story_audio, story_id, audio_path)
+    return audio_path
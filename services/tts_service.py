@@ -1,36 +1,535 @@
+import io
 import os
+import asyncio
+import re
 import uuid
+import hashlib
 import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from gtts import gTTS
+from services.metrics_service import timed_stage, observe_payload, record_cache_lookup, record_speculative_speech
+from utils.concurrency_utils import SingleFlight
 
 logger = logging.getLogger(__name__)
 
-def generate_speech(text, lang='en', output_dir='static/audio'):
+# Directory the narrations are written to, served at /static/audio
+AUDIO_DIR = os.environ.get("AUDIO_DIR", "static/audio")
+
+# Maximum total size of the audio cache directory before old files are evicted
+TTS_CACHE_MAX_BYTES = int(os.environ.get("TTS_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+
+# Segmented synthesis settings
+TTS_WORKERS = int(os.environ.get("TTS_WORKERS", 4))
+TTS_SEGMENT_MAX_CHARS = int(os.environ.get("TTS_SEGMENT_MAX_CHARS", 300))
+
+# Speculative narration: stories are synthesized as soon as they are saved, before anyone asks to hear them
+SPECULATIVE_TTS = os.environ.get("SPECULATIVE_TTS", "false").lower() in ("1", "true", "yes")
+# Speculation is skipped while this many syntheses (speculative or requested) are in progress
+SPECULATIVE_TTS_MAX_IN_FLIGHT = int(os.environ.get("SPECULATIVE_TTS_MAX_IN_FLIGHT", 2))
+
+# Sentence boundaries: ASCII punctuation followed by whitespace (so "3.5" is not split), or
+# full-width Chinese punctuation, which is not followed by spaces; both may end with a closing quote
+SENTENCE_BOUNDARY_PATTERN = re.compile(
+    r"""(?:(?<=[.!?])|(?<=[.!?]["'”’)]))\s+"""
+    r"""|(?<=[。！？；…])(?![”’」』）])\s*"""
+    r"""|(?<=[。！？；…][”’」』）])\s*"""
+)
+
+def normalize_text(text):
+    """Normalize text so that trivially different copies of a story share one audio file."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+
+def make_audio_key(text, lang='en', slow=False):
+    """
+    Build a content-addressed key for synthesized speech.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code
+        slow: Whether the speech is read slowly
+
+    Returns:
+        Hex digest identifying the audio
+    """
+    payload = f"{lang}\n{int(slow)}\n{normalize_text(text)}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class AudioCache:
+    """
+    Size-bounded LRU index over the MP3 files in an audio directory.
+
+    The directory is scanned once, on first use; after that lookups only
+    consult the in-memory index (plus a single stat for files written by
+    other workers). Each hit refreshes the file's mtime, so recency
+    survives restarts. Stories narrated by an evicted file are told
+    through the handler set with set_audio_eviction_handler.
+    """
+
+    def __init__(self, directory, max_bytes=TTS_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # filename -> size, least recently used first
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith('.mp3'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total_bytes += size
+        self._loaded = True
+        logger.info("Indexed %s audio files (%.0f KB) in %s", len(self._entries), self._total_bytes / 1024, self.directory)
+
+    def lookup(self, filename):
+        """
+        Return True if the file is cached, marking it as recently used.
+
+        Args:
+            filename: Name of the MP3 file within the directory
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            filepath = os.path.join(self.directory, filename)
+            if filename not in self._entries:
+                # Another worker may have produced it since the index was built
+                if not os.path.exists(filepath):
+                    return False
+                self._add(filename, os.path.getsize(filepath))
+
+            self._entries.move_to_end(filename)
+
+        try:
+            os.utime(filepath)
+        except OSError:
+            pass
+        return True
+
+    def add(self, filename):
+        """
+        Record a newly written file and evict old files if the cache is over budget.
+
+        Args:
+            filename: Name of the MP3 file within the directory
+        """
+        size = os.path.getsize(os.path.join(self.directory, filename))
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._add(filename, size)
+            evicted = self._sweep()
+
+        if _on_evict is not None:
+            for evicted_filename in evicted:
+                try:
+                    _on_evict(os.path.join('audio', evicted_filename))
+                except Exception as e:
+                    logger.warning("Error releasing evicted audio file %s: %s", evicted_filename, e)
+
+    def _add(self, filename, size):
+        self._total_bytes += size - self._entries.pop(filename, 0)
+        self._entries[filename] = size
+
+    def _sweep(self):
+        # Returns the evicted filenames; never evicts the most recently added file
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            filename, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, filename))
+                evicted.append(filename)
+                logger.info("Evicted cached audio file %s", filename)
+            except OSError as e:
+                logger.warning("Could not evict cached audio file %s: %s", filename, e)
+        return evicted
+
+# Called with the relative path of each evicted audio file
+_on_evict = None
+
+def set_audio_eviction_handler(handler):
+    """
+    Set the function told about evicted audio files, e.g. to clear them from stories.
+
+    Args:
+        handler: Function called with the relative audio path ('audio/<key>.mp3'), or None
+    """
+    global _on_evict
+    _on_evict = handler
+
+_audio_caches = {}
+_audio_caches_lock = threading.Lock()
+
+def get_audio_cache(output_dir=AUDIO_DIR):
+    """
+    Get the audio cache for a directory, creating it on first use.
+
+    Args:
+        output_dir: The directory holding the audio files
+
+    Returns:
+        The AudioCache for the directory
+    """
+    with _audio_caches_lock:
+        cache = _audio_caches.get(output_dir)
+        if cache is None:
+            cache = _audio_caches[output_dir] = AudioCache(output_dir)
+        return cache
+
+def split_sentences(text, max_chars=TTS_SEGMENT_MAX_CHARS):
+    """
+    Split text into synthesis segments at sentence boundaries.
+
+    The first sentence is kept on its own so playback can start as early as
+    possible; later sentences are merged into segments of up to max_chars.
+
+    Args:
+        text: The text to split
+        max_chars: Soft maximum length of a segment
+
+    Returns:
+        List of non-empty text segments
+    """
+    sentences = [sentence.strip() for sentence in SENTENCE_BOUNDARY_PATTERN.split(normalize_text(text))]
+    sentences = [sentence for sentence in sentences if sentence]
+    if not sentences:
+        return []
+
+    segments = [sentences[0]]
+    current = ''
+    for sentence in sentences[1:]:
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            # Chinese sentences are joined without a space
+            joiner = '' if not current or current[-1] in '。！？；…”’」』）' else ' '
+            current = f"{current}{joiner}{sentence}"
+    if current:
+        segments.append(current)
+    return segments
+
+@timed_stage('synthesize_segment')
+def synthesize_segment(text, lang='en', slow=False):
+    """
+    Synthesize one text segment with gTTS.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code
+        slow: Whether to read slowly
+
+    Returns:
+        MP3 bytes for the segment
+    """
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=slow).write_to_fp(buffer)
+    return buffer.getvalue()
+
+_tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix='tts')
+
+class SpeechSynthesis:
+    """
+    An in-progress synthesis of one text, split into segments produced concurrently.
+
+    MP3 frames can be concatenated, so segments are streamed in order as soon
+    as each is ready and joined into the cached file once all are done.
+    """
+
+    def __init__(self, key, text, lang, output_dir):
+        self.key = key
+        self.filename = f"{key}.mp3"
+        self.lang = lang
+        self.output_dir = output_dir
+        self.texts = split_sentences(text) or [normalize_text(text)]
+        self.segments = [None] * len(self.texts)
+        self.done = False
+        self.error = None
+        self._remaining = len(self.texts)
+        self._callbacks = []
+        self._condition = threading.Condition()
+
+    def start(self):
+        logger.info("Synthesizing %s segments for %s", len(self.texts), self.filename)
+        for index, segment_text in enumerate(self.texts):
+            _tts_executor.submit(self._synthesize, index, segment_text)
+
+    def add_done_callback(self, callback):
+        """
+        Call callback(synthesis) once synthesis finishes (immediately if it already has).
+
+        Args:
+            callback: Function taking the SpeechSynthesis
+        """
+        with self._condition:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _synthesize(self, index, segment_text):
+        try:
+            audio = synthesize_segment(segment_text, self.lang)
+        except Exception as e:
+            logger.error("Error synthesizing segment %s of %s: %s", index, self.filename, e)
+            self._finish(error=str(e))
+            return
+
+        with self._condition:
+            if self.done:
+                return
+            self.segments[index] = audio
+            self._remaining -= 1
+            self._condition.notify_all()
+            finished = self._remaining == 0
+
+        if finished:
+            try:
+                self._write_file()
+                self._finish()
+            except Exception as e:
+                logger.error("Error saving audio file %s: %s", self.filename, e)
+                self._finish(error=str(e))
+
+    def _write_file(self):
+        filepath = os.path.join(self.output_dir, self.filename)
+        partial_path = f"{filepath}.{uuid.uuid4().hex}.part"
+        try:
+            with open(partial_path, 'wb') as f:
+                for audio in self.segments:
+                    f.write(audio)
+            os.replace(partial_path, filepath)
+            observe_payload('audio', sum(len(audio) for audio in self.segments))
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+        get_audio_cache(self.output_dir).add(self.filename)
+
+    def _finish(self, error=None):
+        with self._condition:
+            if self.done:
+                return
+            self.error = error
+            self.done = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notify_all()
+
+        with _in_flight_lock:
+            if _in_flight.get(self.key) is self:
+                del _in_flight[self.key]
+
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                logger.error("Error in speech completion callback: %s", e, exc_info=True)
+
+    def wait(self, timeout=None):
+        """
+        Wait for synthesis to finish.
+
+        Raises:
+            Exception: If synthesis failed or did not finish in time
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.done, timeout=timeout):
+                raise Exception("Timed out waiting for speech synthesis")
+            if self.error:
+                raise Exception(self.error)
+
+    async def wait_async(self):
+        """
+        Wait for synthesis to finish without blocking the event loop.
+
+        Raises:
+            Exception: If synthesis failed
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(synthesis):
+            # Called from a TTS worker thread (or immediately if already done)
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        self.add_done_callback(resolve)
+        await future
+        if self.error:
+            raise Exception(self.error)
+
+    def iter_audio(self):
+        """
+        Yield MP3 bytes segment by segment, in order, as they become available.
+
+        Raises:
+            Exception: If synthesis fails before all segments are produced
+        """
+        for index in range(len(self.segments)):
+            with self._condition:
+                self._condition.wait_for(lambda: self.segments[index] is not None or self.error)
+                if self.segments[index] is None:
+                    raise Exception(self.error)
+                audio = self.segments[index]
+            yield audio
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+def start_speech(text, lang='en', output_dir=AUDIO_DIR):
+    """
+    Start synthesizing speech, or find it already cached or in progress.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code
+        output_dir: The directory to save the audio file
+
+    Returns:
+        Tuple of (relative audio path, SpeechSynthesis or None if the file is already cached)
+    """
+    key = make_audio_key(text, lang)
+    filename = f"{key}.mp3"
+    audio_path = os.path.join('audio', filename)
+
+    cached = get_audio_cache(output_dir).lookup(filename)
+    record_cache_lookup('audio', cached)
+    if cached:
+        logger.info("Using cached audio file %s", filename)
+        return audio_path, None
+
+    os.makedirs(output_dir, exist_ok=True)
+    with _in_flight_lock:
+        synthesis = _in_flight.get(key)
+        if synthesis is not None:
+            logger.info("Joining in-progress synthesis of %s", filename)
+            return audio_path, synthesis
+
+        synthesis = _in_flight[key] = SpeechSynthesis(key, text, lang, output_dir)
+
+    synthesis.start()
+    return audio_path, synthesis
+
+def get_speech_synthesis(key):
+    """
+    Get the in-progress synthesis for an audio key.
+
+    Args:
+        key: The audio key (the MP3 filename without extension)
+
+    Returns:
+        SpeechSynthesis if one is in progress, None otherwise
+    """
+    with _in_flight_lock:
+        return _in_flight.get(key)
+
+def prewarm_speech(text, lang='en', output_dir=AUDIO_DIR):
+    """
+    Start synthesizing speech that is likely to be requested soon, if there is capacity for it.
+
+    Later requests for the same text find the cached file or join the
+    synthesis in progress. Nothing is started when SPECULATIVE_TTS is off
+    or SPECULATIVE_TTS_MAX_IN_FLIGHT syntheses are already running, so
+    speculation never queues ahead of narrations users are waiting for.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code
+        output_dir: The directory to save the audio file
+
+    Returns:
+        Tuple of (relative audio path, SpeechSynthesis or None if the file is already cached),
+        or None if speculation was skipped
+    """
+    if not SPECULATIVE_TTS:
+        return None
+
+    with _in_flight_lock:
+        in_flight = len(_in_flight)
+    if in_flight >= SPECULATIVE_TTS_MAX_IN_FLIGHT:
+        logger.debug("Skipping speculative speech: %s syntheses in progress", in_flight)
+        record_speculative_speech('skipped')
+        return None
+
+    audio_path, synthesis = start_speech(text, lang, output_dir)
+    record_speculative_speech('cached' if synthesis is None else 'started')
+    return audio_path, synthesis
+
+# Identical concurrent requests share one synthesis, across workers when SINGLEFLIGHT_LOCK_DIR is set
+_speech_flight = SingleFlight('generate_speech')
+
+def generate_speech(text, lang='en', output_dir=AUDIO_DIR):
     """
     Generate speech from text using Google's Text-to-Speech API.
-    
+
+    Audio is stored under a hash of the normalized text and language, so
+    repeated requests for the same text return the existing file. The text
+    is synthesized in sentence segments in parallel.
+
     Args:
         text: The text to convert to speech
         lang: The language code (default: 'en' for English)
         output_dir: The directory to save the audio file
-        
+
+    Returns:
+        The relative path to the generated audio file
+    """
+    return _speech_flight.do((make_audio_key(text, lang), output_dir), _generate_speech, text, lang, output_dir)
+
+def _generate_speech(text, lang='en', output_dir=AUDIO_DIR):
+    """
+    Generate speech from text, joining a synthesis of the same text in progress in this worker.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code (default: 'en' for English)
+        output_dir: The directory to save the audio file
+
     Returns:
         The relative path to the generated audio file
     """
     try:
-        # Ensure the output directory exists
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Generate a unique filename
-        filename = f"{uuid.uuid4()}.mp3"
-        filepath = os.path.join(output_dir, filename)
-        
-        # Generate speech
-        tts = gTTS(text=text, lang=lang, slow=False)
-        tts.save(filepath)
-        
+        audio_path, synthesis = start_speech(text, lang, output_dir)
+        if synthesis is not None:
+            synthesis.wait()
+
         # Return the relative path for the web app
-        return os.path.join('audio', filename)
+        return audio_path
+    except Exception as e:
+        logger.error("Error generating speech: %s", e)
+        raise Exception(f"Failed to generate speech: {str(e)}")
+
+async def generate_speech_async(text, lang='en', output_dir=AUDIO_DIR):
+    """
+    Generate speech like generate_speech, without blocking the event loop.
+
+    Args:
+        text: The text to convert to speech
+        lang: The language code (default: 'en' for English)
+        output_dir: The directory to save the audio file
+
+    Returns:
+        The relative path to the generated audio file
+    """
+    return await _speech_flight.do_async((make_audio_key(text, lang), output_dir), _generate_speech_async,
+                                         text, lang, output_dir)
+
+async def _generate_speech_async(text, lang='en', output_dir=AUDIO_DIR):
+    try:
+        # The cache lookup touches the filesystem, so keep it off the event loop
+        audio_path, synthesis = await asyncio.to_thread(start_speech, text, lang, output_dir)
+        if synthesis is not None:
+            await synthesis.wait_async()
+        return audio_path
     except Exception as e:
-        logger.error(f"Error generating speech: {str(e)}")
-        raise Exception(f"Failed to generate speech: {str(e)}")
\ No newline at end of file
+        logger.error("Error generating speech: %s", e)
+        raise Exception(f"Failed to generate speech: {str(e)}")
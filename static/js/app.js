@@ -9,6 +9,7 @@ document.addEventListener('DOMContentLoaded', function() {
     
     const initialMessage = document.getElementById('initial-message');
     const loadingElement = document.getElementById('loading');
+    const loadingStage = document.getElementById('loading-stage');
     const storyContainer = document.getElementById('story-container');
     const storyContent = document.getElementById('story-content');
     const analysisContent = document.getElementById('analysis-content');
@@ -29,6 +30,8 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Current file to upload
     let currentFile = null;
+    // Promise of the downscaled file that is actually uploaded
+    let currentUpload = null;
     // Current story and analysis text
     let currentStory = '';
     let currentAnalysis = '';
@@ -92,6 +95,8 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         currentFile = file;
+        // Start downscaling right away, so the upload is usually ready by the time it is needed
+        currentUpload = downscaleImage(file);
         
         // Show preview
         const reader = new FileReader();
@@ -109,6 +114,100 @@ document.addEventListener('DOMContentLoaded', function() {
         reader.readAsDataURL(file);
     }
     
+    // ===== Client-side downscaling =====
+    
+    // The server's encoding policy for the vision model
+    const imageMaxSize = parseInt(fileInput.dataset.maxSize, 10) || 1024;
+    const imageQuality = (parseInt(fileInput.dataset.quality, 10) || 85) / 100;
+    const imageFormat = fileInput.dataset.format || 'image/jpeg';
+    const imageMaxTiles = parseInt(fileInput.dataset.maxTiles, 10) || 0;
+    const tileSize = parseInt(fileInput.dataset.tileSize, 10) || 768;
+    
+    // Size the server scales an image to: within the maximum size, and covering
+    // at most the policy's number of billing tiles (the same as EncodingPolicy.target_size)
+    function targetSize(width, height) {
+        let scale = Math.min(1, imageMaxSize / Math.max(width, height));
+        const tiles = Math.ceil(width * scale / tileSize) * Math.ceil(height * scale / tileSize);
+        if (imageMaxTiles && tiles > imageMaxTiles) {
+            let tiledScale = 0;
+            for (let columns = 1; columns <= imageMaxTiles; columns++) {
+                const rows = Math.floor(imageMaxTiles / columns);
+                tiledScale = Math.max(tiledScale, Math.min(columns * tileSize / width, rows * tileSize / height));
+            }
+            scale = Math.min(scale, tiledScale);
+        }
+        return [Math.max(1, Math.floor(width * scale)), Math.max(1, Math.floor(height * scale))];
+    }
+    
+    // Encode a canvas in the server's format, falling back to JPEG where the browser cannot
+    function encodeCanvas(canvas) {
+        return new Promise(resolve => {
+            canvas.toBlob(blob => {
+                if (blob && blob.type === imageFormat) {
+                    resolve(blob);
+                } else {
+                    canvas.toBlob(resolve, 'image/jpeg', imageQuality);
+                }
+            }, imageFormat, imageQuality);
+        });
+    }
+    
+    // Decode an image with its EXIF orientation applied
+    function decodeImage(file) {
+        if (window.createImageBitmap) {
+            return createImageBitmap(file, { imageOrientation: 'from-image' });
+        }
+        // Browsers also apply EXIF orientation to <img> elements
+        return new Promise((resolve, reject) => {
+            const url = URL.createObjectURL(file);
+            const img = new Image();
+            img.onload = () => {
+                URL.revokeObjectURL(url);
+                resolve(img);
+            };
+            img.onerror = () => {
+                URL.revokeObjectURL(url);
+                reject(new Error('Could not decode image'));
+            };
+            img.src = url;
+        });
+    }
+    
+    // Downscale a photo to the server's size and encode it in its format before uploading,
+    // so phones send a few hundred kilobytes instead of several megabytes.
+    // Resolves to the original file when that is smaller or the browser cannot do it.
+    function downscaleImage(file) {
+        // GIFs are left to the server, which picks the frame to describe
+        if (file.type === 'image/gif' || !HTMLCanvasElement.prototype.toBlob) {
+            return Promise.resolve(file);
+        }
+        
+        return decodeImage(file).then(image => {
+            const canvas = document.createElement('canvas');
+            [canvas.width, canvas.height] = targetSize(image.width, image.height);
+            
+            const context = canvas.getContext('2d');
+            context.imageSmoothingEnabled = true;
+            context.imageSmoothingQuality = 'high';
+            context.drawImage(image, 0, 0, canvas.width, canvas.height);
+            if (image.close) {
+                image.close();
+            }
+            
+            return encodeCanvas(canvas).then(blob => {
+                if (!blob || blob.size >= file.size) {
+                    return file;
+                }
+                const extension = blob.type === 'image/webp' ? '.webp' : '.jpg';
+                const name = file.name.replace(/\.[^.]*$/, '') + extension;
+                return new File([blob], name, { type: blob.type });
+            });
+        }).catch(error => {
+            console.warn('Uploading the original image:', error);
+            return file;
+        });
+    }
+    
     // ===== Story Generation =====
     
     // Generate story button
@@ -131,6 +230,9 @@ document.addEventListener('DOMContentLoaded', function() {
         regenerateStory(promptInput.value);
     });
     
+    // Whether the browser can read a streamed response body
+    const supportsStreaming = !!(window.ReadableStream && window.TextDecoder);
+    
     // Generate story from uploaded image
     function generateStory() {
         // Show loading state
@@ -139,48 +241,181 @@ document.addEventListener('DOMContentLoaded', function() {
         storyContainer.classList.add('d-none');
         errorContainer.classList.add('d-none');
         
+        (currentUpload || Promise.resolve(currentFile)).then(sendImage);
+    }
+    
+    // Upload an image and show the story generated from it
+    function sendImage(upload) {
         // Create form data
         const formData = new FormData();
-        formData.append('image', currentFile);
+        formData.append('image', upload, upload.name);
         
-        // Send request to server
-        fetch('/upload', {
+        // Queue the upload and follow the job until the story is ready. No request is held
+        // open while the story is written, and any instance can report the job's progress.
+        fetch('/upload/async', {
             method: 'POST',
             body: formData
         })
         .then(response => response.json())
         .then(data => {
+            if (!data.success) {
+                throw new Error(data.error || 'An error occurred while generating the story');
+            }
+            return waitForJob(data.statusUrl);
+        })
+        .then(result => {
             loadingElement.classList.add('d-none');
+            loadingStage.textContent = '';
             
-            if (data.success) {
-                // Store current story and analysis
-                currentStory = data.story;
-                currentAnalysis = data.imageAnalysis;
-                currentStoryId = data.storyId;
-                
-                // Display the results
-                storyContent.innerHTML = formatStoryText(data.story);
-                analysisContent.textContent = data.imageAnalysis;
-                storyContainer.classList.remove('d-none');
-                
-                // Add a link to view the saved story
-                const viewStoryLink = document.createElement('div');
-                viewStoryLink.className = 'mt-3 text-center';
-                viewStoryLink.innerHTML = `<a href="/stories/${currentStoryId}" class="btn btn-sm btn-outline-info" target="_blank">
-                    <i class="fas fa-external-link-alt me-2"></i>View Saved Story
-                </a>`;
-                storyContent.appendChild(viewStoryLink);
-            } else {
-                showError(data.error || 'An error occurred while generating the story');
+            // Store current story and analysis
+            currentStory = result.story;
+            currentAnalysis = result.imageAnalysis;
+            currentStoryId = result.storyId;
+            
+            // Display the results
+            storyContent.innerHTML = formatStoryText(result.story);
+            analysisContent.textContent = result.imageAnalysis;
+            storyContainer.classList.remove('d-none');
+            appendViewStoryLink();
+        })
+        .catch(error => {
+            loadingElement.classList.add('d-none');
+            loadingStage.textContent = '';
+            showError(error.message || 'Network error. Please try again later.');
+            console.error('Error:', error);
+        });
+    }
+    
+    // Poll a background job until it finishes, showing the current stage.
+    // Polling keeps no connection open between checks, which suits sync workers.
+    function waitForJob(statusUrl) {
+        return new Promise((resolve, reject) => {
+            function poll() {
+                fetch(statusUrl)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        reject(new Error(data.error || 'An error occurred while generating the story'));
+                        return;
+                    }
+                    
+                    const job = data.job;
+                    if (job.status === 'completed') {
+                        resolve(job.result);
+                    } else if (job.status === 'failed') {
+                        reject(new Error(job.error || 'An error occurred while generating the story'));
+                    } else {
+                        loadingStage.textContent = stageLabel(job.stage);
+                        setTimeout(poll, 1000);
+                    }
+                })
+                .catch(() => reject(new Error('Network error. Please try again later.')));
             }
+            poll();
+        });
+    }
+    
+    // Human readable label for a job stage
+    function stageLabel(stage) {
+        const labels = document.documentElement.lang === 'zh' ? {
+            process: '正在处理图像...',
+            analyze: '正在分析图像...',
+            story: '正在创作故事...',
+            save: '正在保存故事...'
+        } : {
+            process: 'Processing image...',
+            analyze: 'Analyzing image...',
+            story: 'Writing story...',
+            save: 'Saving story...'
+        };
+        return labels[stage] || '';
+    }
+    
+    // Request a streamed story and render it token by token
+    function streamStory(url, options, defaultError) {
+        let story = '';
+        currentStory = '';
+        
+        fetch(url, options)
+        .then(response => {
+            if (!response.ok) {
+                // Validation errors are returned as plain JSON before streaming starts
+                return response.json().then(data => {
+                    throw new Error(data.error || defaultError);
+                });
+            }
+            
+            return readEventStream(response, (event, data) => {
+                if (event === 'analysis') {
+                    currentAnalysis = data.text;
+                    analysisContent.textContent = data.text;
+                } else if (event === 'token') {
+                    if (!story) {
+                        loadingElement.classList.add('d-none');
+                        storyContainer.classList.remove('d-none');
+                    }
+                    story += data.text;
+                    storyContent.innerHTML = formatStoryText(story);
+                } else if (event === 'done') {
+                    currentStory = story;
+                    currentStoryId = data.storyId;
+                    appendViewStoryLink();
+                } else if (event === 'error') {
+                    throw new Error(data.error || defaultError);
+                }
+            });
         })
         .catch(error => {
             loadingElement.classList.add('d-none');
-            showError('Network error. Please try again later.');
+            storyContainer.classList.add('d-none');
+            showError(error.message || 'Network error. Please try again later.');
             console.error('Error:', error);
         });
     }
     
+    // Read a text/event-stream response body, calling onEvent(event, data) for each event
+    function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        function dispatch(block) {
+            let event = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    dataLines.push(line.slice(5).trim());
+                }
+            });
+            if (dataLines.length) {
+                onEvent(event, JSON.parse(dataLines.join('\n')));
+            }
+        }
+        
+        function read() {
+            return reader.read().then(({done, value}) => {
+                if (done) {
+                    if (buffer.trim()) {
+                        dispatch(buffer);
+                    }
+                    return;
+                }
+                
+                buffer += decoder.decode(value, {stream: true});
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    dispatch(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+                return read();
+            });
+        }
+        
+        return read();
+    }
+    
     // Regenerate story with optional custom prompt
     function regenerateStory(customPrompt = '') {
         // Show loading state
@@ -188,8 +423,7 @@ document.addEventListener('DOMContentLoaded', function() {
         storyContainer.classList.add('d-none');
         errorContainer.classList.add('d-none');
         
-        // Send request to server
-        fetch('/regenerate', {
+        const requestOptions = {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -197,7 +431,15 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({
                 prompt: customPrompt
             })
-        })
+        };
+        
+        if (supportsStreaming) {
+            streamStory('/regenerate/stream', requestOptions, 'An error occurred while regenerating the story');
+            return;
+        }
+        
+        // Send request to server
+        fetch('/regenerate', requestOptions)
         .then(response => response.json())
         .then(data => {
             loadingElement.classList.add('d-none');
@@ -210,14 +452,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Display the results
                 storyContent.innerHTML = formatStoryText(data.story);
                 storyContainer.classList.remove('d-none');
-                
-                // Add a link to view the saved story
-                const viewStoryLink = document.createElement('div');
-                viewStoryLink.className = 'mt-3 text-center';
-                viewStoryLink.innerHTML = `<a href="/stories/${currentStoryId}" class="btn btn-sm btn-outline-info" target="_blank">
-                    <i class="fas fa-external-link-alt me-2"></i>View Saved Story
-                </a>`;
-                storyContent.appendChild(viewStoryLink);
+                appendViewStoryLink();
             } else {
                 showError(data.error || 'An error occurred while regenerating the story');
             }
@@ -231,6 +466,16 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // ===== Utility Functions =====
     
+    // Add a link to view the saved story
+    function appendViewStoryLink() {
+        const viewStoryLink = document.createElement('div');
+        viewStoryLink.className = 'mt-3 text-center';
+        viewStoryLink.innerHTML = `<a href="/stories/${currentStoryId}" class="btn btn-sm btn-outline-info" target="_blank">
+            <i class="fas fa-external-link-alt me-2"></i>View Saved Story
+        </a>`;
+        storyContent.appendChild(viewStoryLink);
+    }
+    
     // Format story text with paragraphs
     function formatStoryText(text) {
         // Replace newlines with HTML paragraphs
@@ -251,6 +496,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // Reset file selection
         fileInput.value = '';
         currentFile = null;
+        currentUpload = null;
         
         // Reset UI elements
         dropzone.classList.remove('d-none');
@@ -339,7 +585,8 @@ document.addEventListener('DOMContentLoaded', function() {
             },
             body: JSON.stringify({
                 text: currentStory,
-                storyId: currentStoryId
+                storyId: currentStoryId,
+                stream: true
             })
         })
         .then(response => response.json())
@@ -348,9 +595,10 @@ document.addEventListener('DOMContentLoaded', function() {
             narrateBtn.disabled = false;
             
             if (data.success) {
-                // Set audio source and show player
+                // Set audio source and show player. While the narration is still being
+                // synthesized, play the progressive stream; the file is used for downloads.
                 currentAudioUrl = `/static/${data.audioPath}`;
-                audioPlayer.src = currentAudioUrl;
+                audioPlayer.src = data.streamUrl || currentAudioUrl;
                 audioContainer.classList.remove('d-none');
                 
                 // Play the audio
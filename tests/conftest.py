@@ -0,0 +1,85 @@
+"""
+Shared fixtures for the behavioural tests.
+
+The app runs against a temporary SQLite database, with its images, audio
+and caches in a temporary directory configured before any test module is
+imported. The Gemini API is replaced by a FakeTransport and gTTS by a
+stub, so the tests run offline.
+"""
+import io
+import os
+import sys
+import shutil
+import tempfile
+import itertools
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def pytest_configure(config):
+    # Test modules import the app at collection, which reads its settings from the environment
+    config.workdir = tempfile.mkdtemp(prefix='imagetostory-tests-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(config.workdir, 'test.db')}",
+        'IMAGE_STORE_DIR': os.path.join(config.workdir, 'images'),
+        'LEGACY_IMAGE_DIR': os.path.join(config.workdir, 'legacy'),
+        'AUDIO_DIR': os.path.join(config.workdir, 'audio'),
+        'IMAGE_GC_INTERVAL': '0',
+    })
+    os.environ.setdefault('SESSION_SECRET', 'test')
+
+def pytest_unconfigure(config):
+    shutil.rmtree(config.workdir, ignore_errors=True)
+
+from PIL import Image
+
+_colors = itertools.count(1)
+
+def fake_segment(text, lang='en', slow=False):
+    """Stand-in for gTTS: a fake MP3 frame header followed by the text."""
+    return b'\xff\xfb' + text.encode('utf-8')
+
+@pytest.fixture(scope='session')
+def app():
+    from services import tts_service
+    from services.gemini_client import set_transport, FakeTransport
+    set_transport(FakeTransport())
+    tts_service.synthesize_segment = fake_segment
+
+    import main
+    main.migrate()
+    main.app.config['TESTING'] = True
+    return main.app
+
+@pytest.fixture
+def transport(app):
+    """A fresh FakeTransport for the test."""
+    from services.gemini_client import set_transport, FakeTransport
+    transport = FakeTransport()
+    set_transport(transport)
+    return transport
+
+@pytest.fixture
+def client(app, transport):
+    return app.test_client()
+
+@pytest.fixture
+def make_image():
+    """Build a JPEG no other test uses, so no cached analysis is shared between tests."""
+    def make(size=(800, 600)):
+        index = next(_colors)
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (index * 37 % 256, index * 59 % 256, index * 83 % 256)).save(buffer, 'JPEG')
+        return buffer.getvalue()
+    return make
+
+@pytest.fixture
+def upload(client, make_image):
+    """Upload a new image through /upload and return the JSON response."""
+    def upload(path='/upload', **form):
+        form['image'] = (io.BytesIO(make_image()), 'photo.jpg')
+        response = client.post(path, data=form, content_type='multipart/form-data')
+        return response.get_json()
+    return upload
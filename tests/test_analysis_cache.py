@@ -0,0 +1,21 @@
+from services.ai_service import IMAGE_MODEL
+from services.cache_service import StoredAnalysisBackend, make_image_analysis_key
+from services.gemini_client import FakeTransport
+
+def test_stored_analyses_are_shared_without_touching_the_callers_session(app, upload):
+    from app import db
+    from models import Story
+    from services.db_service import flush_writes
+
+    image_id = upload()['imageId']
+    with app.app_context():
+        flush_writes()
+        pending = Story(content="Never committed")
+        db.session.add(pending)
+
+        backend = StoredAnalysisBackend()
+        assert backend.get(make_image_analysis_key(image_id, 'en', IMAGE_MODEL)) == FakeTransport.ANALYSIS
+        assert backend.get(make_image_analysis_key(image_id, 'zh', IMAGE_MODEL)) is None
+
+        db.session.rollback()
+        assert db.session.scalars(db.select(Story).where(Story.content == "Never committed")).first() is None
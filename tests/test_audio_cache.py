@@ -0,0 +1,38 @@
+import os
+
+from services.tts_service import AudioCache, get_audio_cache
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=10)
+    for name in ('a.mp3', 'b.mp3', 'c.mp3'):
+        (tmp_path / name).write_bytes(b'x' * 4)
+        cache.add(name)
+        if name == 'b.mp3':
+            assert cache.lookup('a.mp3')
+    assert (tmp_path / 'a.mp3').exists()
+    assert not (tmp_path / 'b.mp3').exists()
+    assert cache.lookup('c.mp3')
+
+def test_evicted_audio_is_cleared_from_its_story(app, client, upload, monkeypatch):
+    from app import db
+    from models import Story
+    from services.db_service import flush_writes
+
+    data = upload()
+    audio_path = client.post('/generate-speech', json={'text': data['story'], 'storyId': data['storyId']}
+                             ).get_json()['audioPath']
+    with app.app_context():
+        flush_writes()
+    assert 'id="generateAudio"' not in client.get(f"/stories/{data['storyId']}").get_data(as_text=True)
+
+    # Writing another file over a one-byte budget evicts the story's narration
+    cache = get_audio_cache()
+    monkeypatch.setattr(cache, 'max_bytes', 1)
+    with open(os.path.join(cache.directory, 'other.mp3'), 'wb') as f:
+        f.write(b'\xff\xfb')
+    cache.add('other.mp3')
+
+    assert not os.path.exists(os.path.join(cache.directory, os.path.basename(audio_path)))
+    with app.app_context():
+        assert db.session.get(Story, data['storyId']).audio_path is None
+    assert 'id="generateAudio"' in client.get(f"/stories/{data['storyId']}").get_data(as_text=True)
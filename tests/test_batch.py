@@ -0,0 +1,65 @@
+import io
+import time
+import zipfile
+
+import pytest
+
+from services import batch_service
+from services.batch_service import collect_batch_items, BatchError
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+def test_zip_members_are_expanded():
+    archive = make_zip({'a.jpg': b'a' * 10, 'notes.txt': b'text', '__MACOSX/a.jpg': b'x', 'b.png': b'b'})
+    items = collect_batch_items([('photos.zip', archive), ('c.gif', io.BytesIO(b'c'))])
+    assert [(item['filename'], item['data']) for item in items] == [('a.jpg', b'a' * 10), ('b.png', b'b'),
+                                                                    ('c.gif', b'c')]
+
+def test_oversized_image_is_reported_without_failing_the_batch(monkeypatch):
+    monkeypatch.setattr(batch_service, 'BATCH_MAX_ITEM_BYTES', 4)
+    items = collect_batch_items([('big.jpg', io.BytesIO(b'x' * 5)), ('small.jpg', io.BytesIO(b'x'))])
+    assert items[0] == {'filename': 'big.jpg', 'error': 'Image is too large'}
+    assert items[1]['data'] == b'x'
+
+def test_total_batch_size_is_capped():
+    with pytest.raises(BatchError):
+        collect_batch_items([('a.jpg', io.BytesIO(b'x' * 6)), ('b.jpg', io.BytesIO(b'x' * 6))], max_bytes=10)
+
+def test_empty_batch_is_rejected():
+    with pytest.raises(BatchError):
+        collect_batch_items([])
+
+def test_oversized_request_is_rejected(app, client):
+    limit = app.config['MAX_CONTENT_LENGTH']
+    app.config['MAX_CONTENT_LENGTH'] = 1024
+    try:
+        response = client.post('/upload/batch', data={'images': (io.BytesIO(b'x' * 4096), 'a.jpg')},
+                               content_type='multipart/form-data')
+    finally:
+        app.config['MAX_CONTENT_LENGTH'] = limit
+    assert response.status_code == 413
+    assert response.get_json()['success'] is False
+
+def test_batch_upload_creates_stories(client, make_image):
+    archive = make_zip({'one.jpg': make_image(), 'two.jpg': make_image()})
+    response = client.post('/upload/batch', data={'images': [(archive, 'photos.zip')]},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    status_url = response.get_json()['statusUrl']
+
+    # The first batch starts the image processing worker processes
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        job = client.get(status_url).get_json()['job']
+        if job['status'] in ('completed', 'failed'):
+            break
+        time.sleep(0.1)
+    assert job['status'] == 'completed', job['error']
+    assert job['result']['succeeded'] == 2
+    assert batch_service._process_pool._mp_context.get_start_method() == 'spawn'
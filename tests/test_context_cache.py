@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from services import context_cache_service
+from services.ai_service import generate_story, generate_story_async
+from services.gemini_client import FakeTransport
+
+LONG_ANALYSIS = FakeTransport.ANALYSIS + " The grass is dotted with yellow flowers." * 40
+
+@pytest.fixture(autouse=True)
+def contexts(monkeypatch):
+    monkeypatch.setattr(context_cache_service, '_contexts', {})
+    monkeypatch.setattr(context_cache_service, 'CONTEXT_CACHE_MIN_TOKENS', 256)
+
+def cached_calls(transport):
+    return [call['cached_content'] for call in transport.calls]
+
+def test_small_contexts_are_sent_in_full(transport):
+    assert generate_story(FakeTransport.ANALYSIS) == FakeTransport.STORY
+    assert transport.cached_contents == {}
+    assert cached_calls(transport) == [None]
+
+def test_regenerations_share_a_cached_context(transport):
+    transport.min_cache_tokens = 256
+    generate_story(LONG_ANALYSIS)
+    generate_story(LONG_ANALYSIS, "Make it rhyme")
+    assert asyncio.run(generate_story_async(LONG_ANALYSIS, "Make it short")) == FakeTransport.STORY
+
+    assert len(transport.cached_contents) == 1
+    name = next(iter(transport.cached_contents))
+    assert cached_calls(transport) == [name, name, name]
+    # Only the custom instructions are sent with the cached context
+    assert 'Make it rhyme' in transport.calls[1]['contents']
+    assert LONG_ANALYSIS not in transport.calls[1]['contents']
+
+def test_lost_context_falls_back_to_the_full_prompt(transport):
+    generate_story(LONG_ANALYSIS)
+    transport.cached_contents.clear()
+
+    assert generate_story(LONG_ANALYSIS) == FakeTransport.STORY
+    assert cached_calls(transport)[-1] is None
+    assert context_cache_service._contexts == {}
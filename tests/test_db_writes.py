@@ -0,0 +1,45 @@
+from services import db_service
+
+def story_audio(app, story_id):
+    from app import db
+    from models import Story
+    with app.app_context():
+        db_service.flush_writes()
+        return db.session.get(Story, story_id).audio_path
+
+def test_audio_update_is_committed_when_it_returns(app, upload):
+    from app import db
+    from models import Story
+    story_id = upload()['storyId']
+    assert db_service.get_write_behind() is not None
+    with app.app_context():
+        assert db_service.update_story_audio(str(story_id), 'audio/committed.mp3') is True
+        # Read in a fresh session, without flushing the queue first
+        db.session.remove()
+        assert db.session.get(Story, story_id).audio_path == 'audio/committed.mp3'
+
+def test_unknown_story_is_reported(app):
+    with app.app_context():
+        assert db_service.update_story_audio(99999, 'audio/missing.mp3') is False
+        assert db_service.update_story_audio('not-a-number', 'audio/missing.mp3') is False
+
+def test_speech_for_unknown_story_does_not_fail_other_writes(app, client, upload):
+    story_id = upload()['storyId']
+    response = client.post('/generate-speech', json={'text': 'Hello there', 'storyId': 99999})
+    assert response.status_code == 200
+
+    response = client.post('/generate-speech', json={'text': 'Hello again', 'storyId': story_id})
+    assert story_audio(app, story_id) == response.get_json()['audioPath']
+
+def test_batched_audio_update_skips_deleted_story(app, upload):
+    kept = upload()['storyId']
+    deleted = upload()['storyId']
+    with app.app_context():
+        db_service.flush_writes()
+        assert db_service.delete_story(deleted)
+
+    # Both updates land in one batch; the missing story must not roll back the other
+    writer = db_service.get_write_behind()
+    futures = [writer.submit('audio', (deleted, 'audio/gone.mp3')), writer.submit('audio', (kept, 'audio/kept.mp3'))]
+    assert [future.result(5) for future in futures] == [False, True]
+    assert story_audio(app, kept) == 'audio/kept.mp3'
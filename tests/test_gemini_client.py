@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from services import gemini_client
+from services.gemini_client import GeminiClient, FakeTransport, TransientError
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_client, 'backoff_delay', lambda attempt: 0)
+
+def test_transient_failures_are_retried():
+    transport = FakeTransport(failures=2)
+    client = GeminiClient(transport, max_retries=3)
+    assert client.generate('model', 'Write a story') == FakeTransport.STORY
+    assert len(transport.calls) == 3
+
+def test_retries_give_up_after_max_retries():
+    transport = FakeTransport(failures=5)
+    client = GeminiClient(transport, max_retries=2)
+    with pytest.raises(TransientError):
+        client.generate('model', 'Write a story')
+    assert len(transport.calls) == 3
+
+def test_other_errors_are_not_retried():
+    def responder(*args):
+        raise ValueError("Bad request")
+
+    transport = FakeTransport(responder=responder)
+    client = GeminiClient(transport, max_retries=3)
+    with pytest.raises(ValueError):
+        client.generate('model', 'Write a story')
+    assert len(transport.calls) == 1
+
+def test_async_requests_are_retried():
+    transport = FakeTransport(failures=1)
+    client = GeminiClient(transport, max_retries=3)
+    assert asyncio.run(client.generate_async('model', 'Write a story')) == FakeTransport.STORY
+    assert len(transport.calls) == 2
+
+def test_stream_is_retried_before_the_first_chunk():
+    transport = FakeTransport(failures=1, chunk_size=2)
+    client = GeminiClient(transport, max_retries=3)
+    chunks = list(client.generate_stream('model', 'Write a story'))
+    assert len(chunks) > 1
+    assert ''.join(chunks) == FakeTransport.STORY
+    assert len(transport.calls) == 2
+
+def test_image_requests_get_the_analysis():
+    client = GeminiClient(FakeTransport())
+    image_part = {'mime_type': 'image/jpeg', 'data': b'...'}
+    assert client.generate('model', ['Describe this image', image_part]) == FakeTransport.ANALYSIS
+
+def test_cached_content_is_prepended_until_it_expires():
+    seen = []
+
+    def responder(model_name, contents, system_instruction, generation_config=None):
+        seen.append((contents, system_instruction))
+        return 'ok'
+
+    transport = FakeTransport(responder=responder)
+    client = GeminiClient(transport)
+    name = client.create_cached_content('model', 'Be brief.', ['Context'], ttl=60)
+    assert client.generate('model', 'Question', cached_content=name) == 'ok'
+    assert seen[-1] == (['Context', 'Question'], 'Be brief.')
+
+    client.update_cached_content(name, ttl=-1)
+    with pytest.raises(TransientError) as error:
+        client.generate('model', 'Question', cached_content=name)
+    assert error.value.code == 404
@@ -0,0 +1,51 @@
+import pytest
+
+from services.storage_service import (S3ImageStore, InMemoryS3Client, get_image_store, set_image_store,
+                                      collect_garbage)
+
+@pytest.fixture
+def s3_store(app):
+    """Store images in an in-memory S3 stand-in for the test."""
+    previous = get_image_store()
+    store = S3ImageStore('images', client=InMemoryS3Client())
+    set_image_store(store)
+    yield store
+    set_image_store(previous)
+
+def collect(app):
+    with app.app_context():
+        from services.db_service import flush_writes
+        flush_writes()
+        # A negative TTL makes every stored image old enough to collect
+        return collect_garbage(ttl=-60)
+
+def test_referenced_images_are_kept(app, s3_store, upload):
+    image_id = upload()['imageId']
+    assert collect(app) == 0
+    assert s3_store.exists(image_id)
+
+def test_gc_after_delete_removes_the_image_and_its_records(app, client, s3_store, upload):
+    from app import db
+    from models import Image, ImageAnalysis
+    from services.db_service import delete_story
+
+    data = upload()
+    image_id = data['imageId']
+    with app.app_context():
+        assert delete_story(data['storyId'])
+
+    assert collect(app) == 1
+    assert not s3_store.exists(image_id)
+    with app.app_context():
+        assert db.session.get(Image, image_id) is None
+        assert ImageAnalysis.query.filter_by(image_id=image_id).count() == 0
+
+    # The session still points at the image, which is gone for good
+    response = client.post('/regenerate', json={})
+    assert response.status_code == 500
+    assert response.get_json()['error'].startswith('Error loading image')
+
+def test_unrecorded_images_are_collected(app, s3_store):
+    s3_store.put('ab' * 32, b'orphan')
+    assert collect(app) == 1
+    assert not s3_store.exists('ab' * 32)
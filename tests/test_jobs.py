@@ -0,0 +1,97 @@
+import io
+import time
+
+from services import job_service
+from services.job_service import LocalJobQueue, DatabaseJobQueue, JobQueueFull, COMPLETED, FAILED
+
+def wait_until_finished(queue, job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        queue.wait_for_update(job.id, job.version, timeout=0.1)
+    return job.to_dict()
+
+def test_job_reports_stages_and_result():
+    queue = LocalJobQueue(max_workers=1)
+
+    def work(job, value):
+        job.start_stage('double')
+        job.finish_stage('double')
+        return value * 2
+
+    job = queue.submit(work, 21, stages=('double',))
+    snapshot = wait_until_finished(queue, job)
+    assert snapshot['status'] == COMPLETED
+    assert snapshot['result'] == 42
+    assert snapshot['stages'] == [{'name': 'double', 'status': COMPLETED}]
+    queue.shutdown()
+
+def test_failed_job_marks_its_stage():
+    queue = LocalJobQueue(max_workers=1)
+
+    def work(job):
+        job.start_stage('explode')
+        raise ValueError("boom")
+
+    job = queue.submit(work, stages=('explode',))
+    snapshot = wait_until_finished(queue, job)
+    assert snapshot['status'] == FAILED
+    assert snapshot['error'] == 'boom'
+    assert snapshot['stages'][0]['status'] == FAILED
+    queue.shutdown()
+
+def test_full_queue_rejects_jobs():
+    queue = LocalJobQueue(max_workers=1, max_pending=1)
+    queue.submit(lambda job: time.sleep(0.2))
+    try:
+        queue.submit(lambda job: None)
+    except JobQueueFull:
+        pass
+    else:
+        raise AssertionError("JobQueueFull was not raised")
+    queue.shutdown()
+
+def test_async_upload_completes(client, make_image):
+    response = client.post('/upload/async', data={'image': (io.BytesIO(make_image()), 'photo.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    status_url = response.get_json()['statusUrl']
+
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = client.get(status_url).get_json()['job']
+        if job['status'] in (COMPLETED, FAILED):
+            break
+        time.sleep(0.05)
+    assert job['status'] == COMPLETED
+    assert job['result']['storyId']
+
+def test_jobs_are_reported_by_other_instances(app, client, make_image, monkeypatch):
+    queue = DatabaseJobQueue(app)
+    monkeypatch.setattr(job_service, '_job_queue', queue)
+    response = client.post('/upload/async', data={'image': (io.BytesIO(make_image()), 'photo.jpg')},
+                           content_type='multipart/form-data')
+    status_url = response.get_json()['statusUrl']
+
+    # Another worker only knows the job from the database
+    other = DatabaseJobQueue(app, poll_interval=0.01)
+    monkeypatch.setattr(job_service, '_job_queue', other)
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        job = client.get(status_url).get_json()['job']
+        if job['status'] in (COMPLETED, FAILED):
+            break
+        other.wait_for_update(job['id'], job['version'], timeout=0.5)
+    assert job['status'] == COMPLETED
+    assert job['result']['storyId']
+    assert [stage['status'] for stage in job['stages']] == [COMPLETED] * len(job['stages'])
+    queue.shutdown()
+
+def test_unknown_job_is_not_found(client):
+    response = client.get('/jobs/missing')
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+def test_sync_upload_returns_the_story(upload):
+    data = upload()
+    assert data['success'] is True
+    assert data['story'] and data['imageAnalysis'] and data['storyId']
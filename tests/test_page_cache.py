@@ -0,0 +1,34 @@
+from sqlalchemy import text
+
+from services.search_service import SEARCH_TABLE
+
+def change_elsewhere(app, *statements, **params):
+    # Another worker's change: this process's page cache is not told about it
+    with app.app_context():
+        from app import db
+        from services.db_service import flush_writes
+        flush_writes()
+        for statement in statements:
+            db.session.execute(text(statement), params)
+        db.session.commit()
+
+def test_cached_page_is_revalidated_against_the_database(app, client, upload):
+    story_id = upload()['storyId']
+    first = client.get(f"/stories/{story_id}")
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get(f"/stories/{story_id}", headers={'If-None-Match': etag}).status_code == 304
+
+    change_elsewhere(app, "UPDATE story SET audio_path = 'audio/elsewhere.mp3' WHERE id = :id", id=story_id)
+    response = client.get(f"/stories/{story_id}", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'audio/elsewhere.mp3' in response.get_data(as_text=True)
+
+def test_page_of_a_story_deleted_elsewhere_is_not_served(app, client, upload):
+    story_id = upload()['storyId']
+    assert client.get(f"/stories/{story_id}").status_code == 200
+
+    change_elsewhere(app, f"DELETE FROM {SEARCH_TABLE} WHERE rowid = :id", "DELETE FROM story WHERE id = :id",
+                     id=story_id)
+    assert client.get(f"/stories/{story_id}").status_code == 404
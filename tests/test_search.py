@@ -0,0 +1,66 @@
+from sqlalchemy import text
+
+from services.gemini_client import FakeTransport
+from services.search_service import search_stories, IMAGE_SEARCH_TABLE, SEARCH_MAX_PAGE_SIZE
+
+def found(app, query):
+    with app.app_context():
+        from services.db_service import flush_writes
+        flush_writes()
+        stories, _ = search_stories(query, limit=SEARCH_MAX_PAGE_SIZE)
+        return {story.id for story in stories}
+
+def test_stories_share_one_indexed_analysis(app, client, upload):
+    from app import db
+    from models import Story
+
+    first = upload()
+    second = client.post('/regenerate', json={'prompt': 'Make it rhyme'}).get_json()
+    assert second['imageId'] == first['imageId']
+
+    with app.app_context():
+        for story_id in (first['storyId'], second['storyId']):
+            story = db.session.get(Story, story_id)
+            assert story.image_analysis is None
+            assert story.analysis == FakeTransport.ANALYSIS
+            assert story.to_dict()['image_analysis'] == FakeTransport.ANALYSIS
+        first_story, second_story = (db.session.get(Story, story_id)
+                                     for story_id in (first['storyId'], second['storyId']))
+        assert first_story.analysis_id == second_story.analysis_id
+        indexed = db.session.execute(text(f"SELECT COUNT(*) FROM {IMAGE_SEARCH_TABLE} WHERE rowid = :id"),
+                                     {'id': first_story.analysis_id}).scalar()
+        assert indexed == 1
+
+    # 'sunny' only appears in the analysis
+    assert {first['storyId'], second['storyId']} <= found(app, 'sunny')
+    assert second['storyId'] in found(app, 'rhyme')
+
+def test_refreshed_analysis_leaves_older_stories_alone(app, client, transport, upload):
+    from app import db
+    from models import Story
+
+    first = upload()
+
+    def responder(model_name, contents, system_instruction, generation_config=None):
+        if isinstance(contents, list) and any(isinstance(part, dict) for part in contents):
+            return "A stormy harbour with fishing boats."
+        return FakeTransport.default_responder(model_name, contents, system_instruction, generation_config)
+
+    transport.responder = responder
+    second = client.post('/regenerate', json={'refreshAnalysis': True}).get_json()
+    assert second['imageAnalysis'] == "A stormy harbour with fishing boats."
+
+    with app.app_context():
+        assert db.session.get(Story, first['storyId']).analysis == FakeTransport.ANALYSIS
+        assert db.session.get(Story, second['storyId']).analysis == "A stormy harbour with fishing boats."
+    assert client.get(f"/stories/{first['storyId']}").get_data(as_text=True).count("stormy") == 0
+
+    assert first['storyId'] in found(app, 'sunny')
+    assert second['storyId'] not in found(app, 'sunny')
+    assert second['storyId'] in found(app, 'stormy')
+    assert first['storyId'] not in found(app, 'stormy')
+
+def test_story_page_shows_the_image_analysis(client, upload):
+    data = upload()
+    page = client.get(f"/stories/{data['storyId']}").get_data(as_text=True)
+    assert FakeTransport.ANALYSIS in page
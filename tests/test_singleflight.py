@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.concurrency_utils import SingleFlight, InterruptedCall, fcntl
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight('test')
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return len(calls)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', work))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1, 1, 1, 1]
+    assert len(calls) == 1
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight('test')
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2
+    # A later call runs again
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+def test_async_calls_share_one_result():
+    flight = SingleFlight('test')
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'story'
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async('key', work) for _ in range(3)))
+
+    assert asyncio.run(main()) == ['story'] * 3
+    assert len(calls) == 1
+
+@pytest.mark.skipif(fcntl is None, reason="file locks are not supported here")
+def test_lock_dir_shares_results_between_flights(tmp_path):
+    # Two flights stand in for two worker processes sharing the lock directory
+    first, second = SingleFlight('test', lock_dir=str(tmp_path)), SingleFlight('test', lock_dir=str(tmp_path))
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.3)
+        return {'storyId': 1}
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(first.do('key', slow)))
+    thread.start()
+    started.wait()
+    results.append(second.do('key', lambda: calls.append(1) or {'storyId': 2}))
+    thread.join()
+    assert results == [{'storyId': 1}, {'storyId': 1}]
+    assert len(calls) == 1
+
+def test_cancelled_leader_releases_its_waiters():
+    flight = SingleFlight('test')
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async('key', slow))
+        await asyncio.sleep(0.05)
+        follower = asyncio.create_task(flight.do_async('key', slow))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        with pytest.raises(InterruptedCall):
+            await asyncio.wait_for(follower, 2)
+        # The key is free again for the next caller
+        return await asyncio.wait_for(flight.do_async('key', lambda: asyncio.sleep(0, 'ok')), 2)
+
+    assert asyncio.run(main()) == 'ok'
+
+def test_interrupted_leader_releases_its_waiters():
+    flight = SingleFlight('test')
+    started = threading.Event()
+    errors = []
+
+    def interrupted():
+        started.set()
+        time.sleep(0.1)
+        raise KeyboardInterrupt
+
+    def lead():
+        try:
+            flight.do('key', interrupted)
+        except KeyboardInterrupt:
+            pass
+
+    def follow():
+        try:
+            flight.do('key', lambda: 'follower ran')
+        except InterruptedCall as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=follow)
+    follower.start()
+    leader.join()
+    follower.join(2)
+    assert not follower.is_alive()
+    assert len(errors) == 1
+    assert flight.do('key', lambda: 'ok') == 'ok'
@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importing_the_app_starts_no_threads(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'import.db'}", IMAGE_GC_INTERVAL='60')
+    script = "import threading, main; print(sorted(thread.name for thread in threading.enumerate()))"
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True).stdout
+    assert 'db-writer' not in output and 'image-gc' not in output
+    # Nor does it touch the database
+    assert not (tmp_path / 'import.db').exists()
+
+def test_migrate_command_can_run_again(app):
+    result = app.test_cli_runner().invoke(args=['migrate'])
+    assert result.exit_code == 0, result.output
+    assert "Database is up to date" in result.output
+
+def test_background_services_start_once(app, client):
+    import main
+    from services.db_service import get_write_behind
+
+    client.get('/')
+    writer = get_write_behind()
+    assert writer is not None
+    main.start_background_services()
+    assert get_write_behind() is writer
@@ -0,0 +1,112 @@
+import io
+import asyncio
+import threading
+
+from werkzeug.test import EnvironBuilder
+
+import asgi
+from services.gemini_client import FakeTransport
+
+def asgi_post(path, **kwargs):
+    """Run a request through the ASGI dispatcher and return the Flask response."""
+    environ = EnvironBuilder(path=path, method='POST', **kwargs).get_environ()
+    return asyncio.run(asgi._dispatch(environ))
+
+def test_upload_returns_story_and_image(upload, transport):
+    data = upload(fused='false')
+    assert data['success']
+    assert data['story'] == FakeTransport.STORY
+    assert data['imageAnalysis'] == FakeTransport.ANALYSIS
+    assert data['imageUrl'] == f"/images/{data['imageId']}.jpg"
+    assert len(transport.calls) == 2
+
+def test_fused_upload_makes_one_call(upload, transport):
+    data = upload(fused='true')
+    assert data['success']
+    assert data['story'] == FakeTransport.STORY
+    assert len(transport.calls) == 1
+
+def test_asgi_upload_with_fused(app, transport, make_image):
+    response = asgi_post('/upload', data={'image': (io.BytesIO(make_image()), 'photo.jpg'), 'fused': 'true'})
+    data = response.get_json()
+    assert response.status_code == 200, data
+    assert data['story'] == FakeTransport.STORY
+    assert data['imageUrl'] == f"/images/{data['imageId']}.jpg"
+    assert len(transport.calls) == 1
+
+def test_asgi_upload_reports_the_failed_step(transport, make_image):
+    transport.responder = lambda *args, **kwargs: 1 / 0
+    response = asgi_post('/upload', data={'image': (io.BytesIO(make_image()), 'photo.jpg')})
+    assert response.status_code == 500
+    assert response.get_json()['error'].startswith('Error generating story')
+
+def test_regenerate_reuses_the_stored_analysis(client, upload, transport):
+    first = upload()
+    calls = len(transport.calls)
+
+    data = client.post('/regenerate', json={'prompt': 'Make it rhyme'}).get_json()
+    assert data['success']
+    assert data['imageId'] == first['imageId']
+    assert data['storyId'] != first['storyId']
+    assert data['imageAnalysis'] == FakeTransport.ANALYSIS
+    # Only the story is written again
+    assert len(transport.calls) == calls + 1
+
+def _story_count(app, image_id):
+    from models import Story
+    with app.app_context():
+        from services.db_service import flush_writes
+        flush_writes()
+        return Story.query.filter_by(image_id=image_id).count()
+
+def test_double_regenerate_saves_one_story(app, upload, transport):
+    from services.story_service import regenerate_from_image
+    image_id = upload()['imageId']
+    transport.latency = 0.3
+    results = []
+
+    def regenerate():
+        with app.app_context():
+            results.append(regenerate_from_image(image_id, custom_prompt='Twice'))
+
+    threads = [threading.Thread(target=regenerate) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results[0]['storyId'] == results[1]['storyId']
+    assert _story_count(app, image_id) == 2
+
+def test_double_regenerate_async_saves_one_story(app, upload, transport):
+    from services.story_service import regenerate_from_image_async
+    image_id = upload()['imageId']
+    transport.latency = 0.3
+
+    async def regenerate_twice():
+        with app.app_context():
+            return await asyncio.gather(regenerate_from_image_async(image_id, custom_prompt='Twice'),
+                                        regenerate_from_image_async(image_id, custom_prompt='Twice'))
+
+    first, second = asyncio.run(regenerate_twice())
+    assert first['storyId'] == second['storyId']
+    assert _story_count(app, image_id) == 2
+
+def test_asgi_rejects_oversized_body_while_reading(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAX_CONTENT_LENGTH', 1000)
+    received = []
+    sent = []
+
+    async def receive():
+        received.append(1)
+        return {'type': 'http.request', 'body': b'x' * 600, 'more_body': True}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/upload', 'headers': [(b'content-type', b'image/jpeg')]}
+    asyncio.run(asgi.app(scope, receive, send))
+    assert sent[0]['status'] == 413
+    assert b'too large' in sent[1]['body']
+    # Reading stopped at the chunk that crossed the limit
+    assert len(received) == 2
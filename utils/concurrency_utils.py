@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from services.metrics_service import record_cache_lookup
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Directory for the file locks that coalesce identical calls across worker processes; empty disables it
+SINGLEFLIGHT_LOCK_DIR = os.environ.get("SINGLEFLIGHT_LOCK_DIR", "")
+# Seconds a shared result file is kept for workers that waited on its lock
+SINGLEFLIGHT_RESULT_TTL = int(os.environ.get("SINGLEFLIGHT_RESULT_TTL", 60))
+
+class InterruptedCall(RuntimeError):
+    """Raised to callers waiting on a call whose caller was cancelled or interrupted."""
+
+class _Call:
+    """One in-flight call whose outcome is shared with every caller that asked for it."""
+
+    def __init__(self):
+        self.done = False
+        self.result = None
+        self.error = None
+        self._callbacks = []
+        self._condition = threading.Condition()
+
+    def finish(self, result=None, error=None):
+        with self._condition:
+            self.result = result
+            self.error = error
+            self.done = True
+            callbacks, self._callbacks = self._callbacks, []
+            self._condition.notify_all()
+        for callback in callbacks:
+            callback()
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def wait(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.done)
+        return self.outcome()
+
+    async def wait_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            if not self.done:
+                # Called from whichever thread finishes the call
+                self._callbacks.append(
+                    lambda: loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None)))
+            else:
+                future.set_result(None)
+        await future
+        return self.outcome()
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls into one.
+
+    The first caller for a key runs the function; callers that ask for the
+    same key while it is running wait for it and get its result (or its
+    exception) instead of making their own call. Threads and coroutines of
+    one worker share calls in memory.
+
+    With a lock directory, the call is also made under an exclusive file
+    lock, and its JSON-serializable result is written next to the lock, so
+    a call in another worker process that was waiting on the lock reuses
+    the result. Calls that finish before another starts are not shared.
+    """
+
+    def __init__(self, name, lock_dir=SINGLEFLIGHT_LOCK_DIR, result_ttl=SINGLEFLIGHT_RESULT_TTL):
+        self.name = name
+        self.lock_dir = lock_dir if fcntl is not None else ""
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        if lock_dir and fcntl is None:
+            logger.warning("File locks are not supported here; %s calls are only shared within a worker", name)
+
+    def _join(self, key):
+        # Returns (call, True) for the caller that has to make the call
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                record_cache_lookup(f"singleflight_{self.name}", True)
+                return call, False
+            call = self._calls[key] = _Call()
+        record_cache_lookup(f"singleflight_{self.name}", False)
+        return call, True
+
+    def _leave(self, key, call, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.finish(result, error)
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs), or wait for an identical call already in flight.
+
+        Args:
+            key: Hashable key identifying identical calls
+            fn: The function to call
+
+        Returns:
+            The result of the call
+        """
+        call, leader = self._join(key)
+        if not leader:
+            logger.debug("Waiting for in-flight %s call", self.name)
+            return call.wait()
+
+        try:
+            if self.lock_dir:
+                result = self._call_locked(key, fn, *args, **kwargs)
+            else:
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            self._leave(key, call, error=e)
+            raise
+        except BaseException as e:
+            # Cancelled or interrupted: release the waiting callers, which did not ask to be cancelled
+            self._leave(key, call, error=InterruptedCall(f"In-flight {self.name} call was interrupted: {e!r}"))
+            raise
+        self._leave(key, call, result)
+        return result
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        Await fn(*args, **kwargs), or wait for an identical call already in flight.
+
+        Args:
+            key: Hashable key identifying identical calls
+            fn: The coroutine function to call
+
+        Returns:
+            The result of the call
+        """
+        call, leader = self._join(key)
+        if not leader:
+            logger.debug("Waiting for in-flight %s call", self.name)
+            return await call.wait_async()
+
+        try:
+            if self.lock_dir:
+                result = await self._call_locked_async(key, fn, *args, **kwargs)
+            else:
+                result = await fn(*args, **kwargs)
+        except Exception as e:
+            self._leave(key, call, error=e)
+            raise
+        except BaseException as e:
+            # Cancelled or interrupted: release the waiting callers, which did not ask to be cancelled
+            self._leave(key, call, error=InterruptedCall(f"In-flight {self.name} call was interrupted: {e!r}"))
+            raise
+        self._leave(key, call, result)
+        return result
+
+    def _paths(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        path = os.path.join(self.lock_dir, f"{self.name}-{digest}")
+        return f"{path}.lock", f"{path}.json"
+
+    def _lock_file(self, lock_path):
+        os.makedirs(self.lock_dir, exist_ok=True)
+        lock_file = open(lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _read_shared(self, result_path, since):
+        # A result written after this caller started waiting came from the call it was waiting for
+        try:
+            if os.path.getmtime(result_path) < since:
+                return False, None
+            with open(result_path) as f:
+                return True, json.load(f)
+        except (OSError, ValueError):
+            return False, None
+
+    def _write_shared(self, result_path, result):
+        try:
+            partial_path = f"{result_path}.{os.getpid()}.part"
+            with open(partial_path, 'w') as f:
+                json.dump(result, f)
+            os.replace(partial_path, result_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not share %s result: %s", self.name, e)
+        self._sweep()
+
+    def _sweep(self):
+        # Results are only useful to callers that were already waiting, so old ones can go.
+        # Removing a lock someone is about to take at worst lets one duplicate call through.
+        cutoff = time.time() - self.result_ttl
+        try:
+            for entry in os.scandir(self.lock_dir):
+                if entry.name.startswith(f"{self.name}-") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+    def _call_locked(self, key, fn, *args, **kwargs):
+        lock_path, result_path = self._paths(key)
+        started = time.time()
+        lock_file = self._lock_file(lock_path)
+        try:
+            shared, result = self._read_shared(result_path, started)
+            if shared:
+                logger.debug("Reusing %s result from another worker", self.name)
+                return result
+            result = fn(*args, **kwargs)
+            self._write_shared(result_path, result)
+            return result
+        finally:
+            lock_file.close()
+
+    async def _call_locked_async(self, key, fn, *args, **kwargs):
+        lock_path, result_path = self._paths(key)
+        started = time.time()
+        lock_file = await asyncio.to_thread(self._lock_file, lock_path)
+        try:
+            shared, result = self._read_shared(result_path, started)
+            if shared:
+                logger.debug("Reusing %s result from another worker", self.name)
+                return result
+            result = await fn(*args, **kwargs)
+            await asyncio.to_thread(self._write_shared, result_path, result)
+            return result
+        finally:
+            lock_file.close()
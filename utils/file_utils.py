@@ -1,122 +1,67 @@
-import os
-import uuid
+import hashlib
 import logging
-import base64
-from werkzeug.utils import secure_filename
+from services.metrics_service import timed_stage
+from services.storage_service import get_image_store
 
 logger = logging.getLogger(__name__)
 
-def save_temp_file(file_obj):
+def get_image_url_path(file_id):
     """
-    Save an uploaded file to a temporary location.
+    Get the site-relative path an image is served from, as stored on Story.image_path.
 
     Args:
-        file_obj: The file object from the request
+        file_id: The ID of the image
 
     Returns:
-        Path to the saved temporary file
+        Path relative to the site root
     """
-    try:
-        # Create a unique filename
-        original_filename = secure_filename(file_obj.filename)
-        # Get the file extension
-        ext = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-        # Create a unique filename with the original extension
-        unique_filename = f"{uuid.uuid4().hex}.{ext}"
-
-        # Ensure the temporary directory exists
-        os.makedirs('tmp', exist_ok=True)
-
-        # Create the full path
-        temp_path = os.path.join('tmp', unique_filename)
-
-        # Save the file
-        file_obj.save(temp_path)
-
-        return temp_path
+    return f"images/{file_id}.jpg"
 
-    except Exception as e:
-        logger.error(f"Error saving temporary file: {str(e)}")
-        raise Exception(f"Failed to save the uploaded file: {str(e)}")
-
-def remove_temp_file(file_path):
+@timed_stage('save_image')
+def save_image(image_bytes):
     """
-    Remove a temporary file.
+    Save encoded image bytes to the image store under a content-addressed ID.
 
-    Args:
-        file_path: Path to the file to be removed
-    """
-    try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except Exception as e:
-        logger.error(f"Error removing temporary file {file_path}: {str(e)}")
-        # We don't raise an exception here as this is a cleanup operation
-        # and shouldn't prevent the rest of the application from working
-
-def save_base64_image(base64_data, prefix="img_"):
-    """
-    Save a base64 encoded image to a file.
+    The ID is the SHA-256 hash of the bytes, so saving the same image
+    twice reuses the stored copy.
 
     Args:
-        base64_data: Base64 encoded image data
-        prefix: Prefix for the filename
+        image_bytes: Encoded (JPEG or WebP) image data
 
     Returns:
-        Tuple of (file_id, file_path)
+        Tuple of (file_id, location in the image store)
     """
     try:
-        # Create a unique ID and filename
-        file_id = uuid.uuid4().hex
-        filename = f"{prefix}{file_id}.jpg"
-
-        # Ensure the temporary directory exists
-        os.makedirs('tmp', exist_ok=True)
-
-        # Create the full path
-        file_path = os.path.join('tmp', filename)
-
-        # Decode and save the image
-        with open(file_path, 'wb') as f:
-            f.write(base64.b64decode(base64_data))
-
-        logger.info(f"Saved base64 image to {file_path}")
-        return file_id, file_path
+        # Derive the ID from the image content
+        file_id = hashlib.sha256(image_bytes).hexdigest()
+        location = get_image_store().put(file_id, image_bytes)
+        logger.info("Saved image to %s", location)
+        return file_id, location
 
     except Exception as e:
-        logger.error(f"Error saving base64 image: {str(e)}")
-        raise Exception(f"Failed to save the base64 image: {str(e)}")
+        logger.error("Error saving image: %s", e)
+        raise Exception(f"Failed to save the image: {str(e)}")
 
-def get_base64_image(file_id, prefix="img_"):
+@timed_stage('load_image')
+def load_image(file_id):
     """
-    Read a file and return its contents as base64.
+    Read an image from the image store.
 
     Args:
-        file_id: The ID of the file to read
-        prefix: Prefix used when saving the file
+        file_id: The ID of the image to read
 
     Returns:
-        Base64 encoded image data
+        Encoded image bytes
     """
     try:
-        # Construct the filename
-        filename = f"{prefix}{file_id}.jpg"
-        file_path = os.path.join('tmp', filename)
-
-        # Check if the file exists
-        if not os.path.exists(file_path):
-            logger.error(f"Image file not found: {file_path}")
-            raise FileNotFoundError(f"Image file not found: {file_path}")
-
-        # Read and encode the file
-        with open(file_path, 'rb') as f:
-            image_data = f.read()
+        image_bytes = get_image_store().get(file_id)
+        if image_bytes is None:
+            logger.error("Image not found: %s", file_id)
+            raise FileNotFoundError(f"Image not found: {file_id}")
 
-        # Convert to base64
-        base64_data = base64.b64encode(image_data).decode('utf-8')
-        logger.info(f"Read image from {file_path}")
-        return base64_data
+        logger.info("Read image %s", file_id)
+        return image_bytes
 
     except Exception as e:
-        logger.error(f"Error reading image file: {str(e)}")
+        logger.error("Error reading image file: %s", e)
         raise Exception(f"Failed to read the image file: {str(e)}")
@@ -0,0 +1,79 @@
+import os
+import gzip
+import logging
+
+try:
+    import brotli
+except ImportError:  # Optional; responses are gzipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+# Mimetypes worth compressing
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json', 'text/plain', 'text/css', 'text/javascript',
+                          'application/javascript'}
+
+def _encode(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the content encoding to use for a client.
+
+    Args:
+        accept_encodings: The request's parsed Accept-Encoding header
+
+    Returns:
+        'br', 'gzip' or None
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def compress_response(response, accept_encodings):
+    """
+    Compress a buffered text response if the client accepts it.
+
+    Streamed responses (server-sent events, progressive audio) and files
+    sent from disk are left alone, as are responses that are already
+    encoded or too small to be worth it. A compressed response's ETag is
+    made weak, since its bytes differ from the identity encoding; weak
+    ETags still validate conditional GETs.
+
+    Args:
+        response: The Flask response
+        accept_encodings: The request's parsed Accept-Encoding header
+
+    Returns:
+        The response, compressed in place if it was worth it
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.status_code < 200
+            or response.status_code in (204, 206, 304) or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+
+    # Whatever is decided here, caches must key on the client's encodings
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(_encode(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
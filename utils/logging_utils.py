@@ -0,0 +1,82 @@
+import os
+import json
+import logging
+
+# Logging configuration
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")  # 'text' or 'json'
+REQUEST_LOG = os.environ.get("REQUEST_LOG", "true").lower() in ("1", "true", "yes")
+
+# Logger for the one-line-per-request summary; stays at INFO whatever LOG_LEVEL is
+REQUEST_LOGGER_NAME = "imagetostory.requests"
+
+request_logger = logging.getLogger(REQUEST_LOGGER_NAME)
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as a single JSON object, including any structured `fields`."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, request_log=REQUEST_LOG):
+    """
+    Configure the root logger and the per-request summary logger.
+
+    For production, LOG_LEVEL=WARNING and LOG_FORMAT=json keep the hot
+    path quiet while still writing one structured line per request.
+
+    Args:
+        level: Root log level name, e.g. 'DEBUG' or 'WARNING'
+        log_format: 'text' for the classic format, 'json' for one JSON object per line
+        request_log: Whether to write the per-request summary line
+    """
+    handler = logging.StreamHandler()
+    if log_format == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    request_logger.setLevel(logging.INFO if request_log else logging.CRITICAL + 1)
+
+def log_request(method, path, endpoint, status, duration, stages=None, response_bytes=None):
+    """
+    Write the structured summary line for a handled request.
+
+    Args:
+        method: HTTP method
+        path: Request path
+        endpoint: Flask endpoint name
+        status: Response status code
+        duration: Seconds spent handling the request
+        stages: Dict of stage name to seconds, from metrics_service.begin_request_stages
+        response_bytes: Response body size, if known
+    """
+    if not request_logger.isEnabledFor(logging.INFO):
+        return
+
+    fields = {
+        'method': method,
+        'path': path,
+        'endpoint': endpoint,
+        'status': status,
+        'duration_ms': round(duration * 1000, 2),
+        'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in (stages or {}).items()},
+    }
+    if response_bytes is not None:
+        fields['response_bytes'] = response_bytes
+    request_logger.info("%s %s %s %.1fms", method, path, status, fields['duration_ms'], extra={'fields': fields})
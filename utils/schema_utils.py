@@ -0,0 +1,62 @@
+import logging
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+def upgrade_schema(db):
+    """
+    Bring existing tables up to date with the models.
+
+    db.create_all() only creates missing tables, so this adds any columns
+    and indexes that were introduced after a table was first created.
+    Columns are added as nullable; callers backfill their values.
+
+    Args:
+        db: The Flask-SQLAlchemy extension
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                logger.info("Adding column %s.%s (%s)", table.name, column.name, column_type)
+                connection.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                ))
+
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    logger.info("Creating index %s", index.name)
+                    index.create(connection)
+
+# Tables of earlier versions that nothing reads any more
+OBSOLETE_TABLES = (
+    'analysis_cache_entry',  # Analysis cache rows duplicating the analyses stored with images
+)
+
+def drop_obsolete_tables(db):
+    """
+    Drop tables that earlier versions created and nothing uses any more.
+
+    Args:
+        db: The Flask-SQLAlchemy extension
+    """
+    engine = db.engine
+    existing_tables = set(inspect(engine).get_table_names())
+
+    with engine.begin() as connection:
+        for name in OBSOLETE_TABLES:
+            if name in existing_tables:
+                logger.info("Dropping obsolete table %s", name)
+                connection.execute(text(f'DROP TABLE "{name}"'))